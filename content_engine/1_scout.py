@@ -1,15 +1,22 @@
 import os
 import json
-import google.generativeai as genai
+import argparse
 from dotenv import load_dotenv
+import llm_cache
+import metrics
+import corpus_stats
+from topic_index import TopicIndex
+from topic_queue import open_queue
 
 # Cargar claves
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 LOG_FILE = "covered_topics.txt"
-QUEUE_FILE = "queue.json"
 BATCH_SIZE = 10  # ¿Cuántos quieres generar de golpe?
+# El scout busca variedad: solo reutilizamos su respuesta si se relanza poco después (p. ej. tras un fallo)
+SCOUT_CACHE_TTL = 3600
+PROMPT_RECENT_TITLES = 30   # Cola del historial que enseñamos siempre al modelo
+PROMPT_SIMILAR_TITLES = 5   # Temas parecidos que enseñamos por cada candidato descartado
 
 def get_local_titles():
     if not os.path.exists(LOG_FILE):
@@ -22,45 +29,64 @@ def save_titles_to_log(titles_list):
         for title in titles_list:
             f.write(f"{title}\n")
 
-def clean_json_response(text):
-    text = text.strip()
-    if text.startswith("```json"): text = text[7:]
-    if text.startswith("```"): text = text[3:]
-    if text.endswith("```"): text = text[:-3]
-    return text
-
-def filter_duplicates(new_topics, existing_titles):
-    """Filtra temas duplicados comparando sin distinción de mayúsculas/minúsculas."""
-    # Normalizar títulos existentes para comparación
-    existing_normalized = {title.lower().strip() for title in existing_titles}
+def filter_duplicates(new_topics, existing_titles, index=None):
+    """Filtra temas casi duplicados (sin acentos, mayúsculas ni reformulaciones menores)."""
+    if index is None:
+        index = TopicIndex(existing_titles)
     
     unique_topics = []
     duplicates = []
     
     for topic in new_topics:
-        topic_normalized = topic.lower().strip()
-        if topic_normalized not in existing_normalized:
+        match = index.find_duplicate(topic)
+        if match is None:
             unique_topics.append(topic)
-            existing_normalized.add(topic_normalized)  # Evitar duplicados dentro del mismo batch
+            index.add(topic)  # Evitar duplicados dentro del mismo batch
         else:
             duplicates.append(topic)
+            print(f"   ♻️  '{topic}' ≈ '{match[1]}' ({match[0]:.2f})")
     
     if duplicates:
         print(f"⚠️  Se descartaron {len(duplicates)} duplicados: {duplicates}")
     
     return unique_topics
 
-def suggest_batch_topics(existing_titles):
+def similar_past_topics(index, rejected, per_topic=PROMPT_SIMILAR_TITLES):
+    """Temas ya cubiertos más parecidos a los candidatos descartados (para el prompt)."""
+    similar = []
+    for topic in rejected:
+        for _, title in index.most_similar(topic, k=per_topic):
+            if title not in similar:
+                similar.append(title)
+    return similar
+
+@metrics.timed("suggest_batch_topics", items=len)
+def suggest_batch_topics(existing_titles, avoid_titles=None, batch_size=BATCH_SIZE, plan=None):
+    """Candidatos {"title", "category", "year", "tags"}; con plan, el prompt pide lo que le falta al corpus."""
     print(f"📚 Consultando registro: {len(existing_titles)} temas ya cubiertos.")
     
     # TODO: TEMPORAL - Volver a 'gemini-2.5-flash' cuando termine el periodo de pruebas
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
+    model_name = 'gemini-2.5-flash-lite'
     
-    # Si hay muchos temas, solo le pasamos los últimos 50 para no saturar el prompt innecesariamente
-    lista_texto = ", ".join(existing_titles[-50:]) if existing_titles else "Ninguno."
+    # Si hay muchos temas, solo le pasamos los últimos para no saturar el prompt innecesariamente,
+    # más los temas cubiertos que se parecen a lo que ya nos propuso y tuvimos que descartar
+    # (en esta ronda o en las anteriores)
+    prompt_titles = list(avoid_titles or [])
+    prompt_titles += [t for t in existing_titles[-PROMPT_RECENT_TITLES:] if t not in prompt_titles]
+    lista_texto = ", ".join(prompt_titles) if prompt_titles else "Ninguno."
+
+    cuotas = ""
+    if plan:
+        cuotas = f"""
+    PRIORIDADES (el archivo va escaso en esto, dales preferencia):
+    - Categorías: {", ".join(f"{k} ({v})" for k, v in plan['categories'].items()) or "cualquiera"}
+    - Épocas: {", ".join(f"{k} ({v})" for k, v in plan['eras'].items()) or "cualquiera"}"""
+        if plan['avoidTags']:
+            cuotas += f"""
+    - Ya hay demasiados temas de: {", ".join(plan['avoidTags'])}"""
     
     prompt = f"""
-    Actúa como Curador de museo. Necesito una lista de {BATCH_SIZE} temas NUEVOS para artículos.
+    Actúa como Curador de museo. Necesito una lista de {batch_size} temas NUEVOS para artículos.
     
     TEMAS YA CUBIERTOS (EVITAR REPETIR):
     [{lista_texto}]
@@ -69,58 +95,88 @@ def suggest_batch_topics(existing_titles):
     1. Busca "Joyas Ocultas" o curiosidades históricas/científicas fascinantes.
     2. Variedad: Mezcla épocas y categorías (Ciencia, Historia, Arte, Espacio).
     3. Títulos atractivos pero rigurosos.
-    
+    {cuotas}
     FORMATO DE SALIDA:
-    Responde ÚNICAMENTE con un Array JSON de strings.
-    Ejemplo: ["La Guerra del Emú", "El Gran Incendio de Londres", "La invención del cero"]
+    Responde ÚNICAMENTE con un Array JSON de objetos con el título, la categoría (una de
+    {", ".join(corpus_stats.ALLOWED_CATEGORIES)}), el año principal (negativo si es a. C.) y 2-3 tags.
+    Ejemplo: [{{"title": "La Guerra del Emú", "category": "History", "year": 1932, "tags": ["Australia", "Animales"]}}]
     """
 
-    response = model.generate_content(prompt)
     try:
-        clean_text = clean_json_response(response.text)
-        return json.loads(clean_text)
+        topics = llm_cache.generate_json(model_name, prompt, ttl=SCOUT_CACHE_TTL)
     except Exception as e:
         print(f"❌ Error al parsear JSON de Gemini: {e}")
         return []
+    if not isinstance(topics, list):
+        return []
+    return [c for c in map(corpus_stats.normalize_candidate, topics) if c]
+
+def scout_new_topics(queue=None):
+    """Una ronda completa del curador: sugiere, filtra duplicados, encola y registra. Devuelve los temas nuevos."""
+    # 1. Leer historial, estadísticas del corpus y cuotas del lote
+    titulos = get_local_titles()
+    queue = queue or open_queue()
+    stats = corpus_stats.open_stats()
+    stats.sync_published()
+    plan = stats.plan(BATCH_SIZE, queue.pending_topics())
+    
+    # 2. Índice de similitud sobre TODO el historial, antes de la primera llamada: el prompt ya
+    #    incluye los temas cubiertos más parecidos a lo que el modelo propuso y descartamos en rondas anteriores
+    indice = TopicIndex(titulos)
+    evitar = similar_past_topics(indice, stats.recent_rejections())
+
+    # 3. Generar Batch: más candidatos de los necesarios, para elegir aquí sin otra llamada
+    candidatos = suggest_batch_topics(titulos, avoid_titles=evitar, batch_size=corpus_stats.overgenerate(BATCH_SIZE), plan=plan)
+    
+    # 4. Validar duplicados
+    unicos = set(filter_duplicates([c['title'] for c in candidatos], titulos, index=indice))
+    validos = [c for c in candidatos if c['title'] in unicos]
+
+    # 4b. Si no llegan, una segunda ronda enseñando los temas cubiertos más parecidos a los descartados
+    descartados = [c['title'] for c in candidatos if c['title'] not in unicos]
+    faltan = BATCH_SIZE - len(validos)
+    if descartados and faltan > 0:
+        print(f"🔁 Pidiendo {faltan} temas más (evitando {len(descartados)} temas repetidos)...")
+        evitar = list(dict.fromkeys(evitar + similar_past_topics(indice, descartados)))
+        extra = suggest_batch_topics(titulos + [c['title'] for c in validos], avoid_titles=evitar,
+                                     batch_size=corpus_stats.overgenerate(faltan), plan=plan)
+        unicos = set(filter_duplicates([c['title'] for c in extra], titulos, index=indice))
+        validos += [c for c in extra if c['title'] in unicos]
+        descartados += [c['title'] for c in extra if c['title'] not in unicos]
+    stats.remember_rejections(descartados)
+
+    # 5. Los que mejor cubren las cuotas (el resto no se registra: puede volver a salir otro día)
+    elegidos = corpus_stats.rank_candidates(validos, plan, BATCH_SIZE)
+    nuevos_temas = [c['title'] for c in elegidos]
+    
+    if nuevos_temas:
+        print(f"💎 ¡Éxito! Se han encontrado {len(nuevos_temas)} temas únicos:")
+        for c in elegidos:
+            print(f"   - {c['title']} ({c['category'] or '?'}, {c['year'] if c['year'] is not None else '?'})")
+        
+        # 6. Guardar en la COLA (queue.db; importa queue.json si aún existe) y en las estadísticas
+        queue.enqueue(nuevos_temas)
+        stats.record_topics(elegidos)
+        
+        # 7. Registrar en historial permanente
+        save_titles_to_log(nuevos_temas)
+        print(f"\n✅ Guardados en la cola ({queue.count()} pendientes) y registrados en '{LOG_FILE}'.")
+    else:
+        print("⚠️ No se generaron temas.")
+    return nuevos_temas
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sugiere temas nuevos y los añade a la cola.")
+    parser.add_argument("--no-cache", action="store_true", help="Ignora la caché de respuestas LLM.")
+    if parser.parse_args().no_cache:
+        llm_cache.set_bypass()
+
     print(f"🧠 El Curador está buscando {BATCH_SIZE} temas nuevos...")
     
     try:
-        # 1. Leer historial
-        titulos = get_local_titles()
-        
-        # 2. Generar Batch
-        nuevos_temas_raw = suggest_batch_topics(titulos)
-        
-        # 3. Validar duplicados
-        nuevos_temas = filter_duplicates(nuevos_temas_raw, titulos)
-        
-        if nuevos_temas:
-            print(f"💎 ¡Éxito! Se han encontrado {len(nuevos_temas)} temas únicos:")
-            for t in nuevos_temas:
-                print(f"   - {t}")
-            
-            # 4. Guardar en la COLA (queue.json)
-            # Si ya había cosas en la cola, las mantenemos y añadimos las nuevas
-            current_queue = []
-            if os.path.exists(QUEUE_FILE):
-                with open(QUEUE_FILE, "r", encoding="utf-8") as f:
-                    try:
-                        current_queue = json.load(f)
-                    except:
-                        current_queue = []
-            
-            current_queue.extend(nuevos_temas)
-            
-            with open(QUEUE_FILE, "w", encoding="utf-8") as f:
-                json.dump(current_queue, f, indent=2, ensure_ascii=False)
-            
-            # 5. Registrar en historial permanente
-            save_titles_to_log(nuevos_temas)
-            print(f"\n✅ Guardados en '{QUEUE_FILE}' y registrados en '{LOG_FILE}'.")
-        else:
-            print("⚠️ No se generaron temas.")
+        scout_new_topics()
+        llm_cache.print_stats()
+        metrics.summary()
             
     except Exception as e:
         print(f"❌ Error fatal: {e}")
\ No newline at end of file
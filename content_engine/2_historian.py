@@ -1,68 +1,63 @@
 import os
 import json
-import time  # Importamos time para la pausa
 import re
-import google.generativeai as genai
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import llm_cache
+import metrics
+from llm_json import validate_draft
+from topic_queue import open_queue, MAX_ATTEMPTS
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-QUEUE_FILE = "queue.json"
 DRAFTS_DIR = "drafts"  # 📂 Nueva carpeta de destino
+DEFAULT_WORKERS = 4    # Peticiones simultáneas a Gemini en modo lote
+
+# Cola compartida (SQLite). Se abre (e importa queue.json) la primera vez que se usa, no al importar
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = open_queue()
+        return _queue
 
 def get_next_topic_from_queue():
-    if not os.path.exists(QUEUE_FILE):
-        print("❌ Error: No existe 'queue.json'.")
-        exit()
-        
-    with open(QUEUE_FILE, "r", encoding="utf-8") as f:
-        try:
-            queue = json.load(f)
-        except:
-            queue = []
-            
-    if not queue:
+    """Reserva el siguiente tema. Devuelve (id, topic) o None si la cola está vacía."""
+    leased = get_queue().lease(1)
+    if not leased:
         print("📭 La cola está vacía.")
         return None
 
-    return queue[0]  # Retornamos el tema SIN eliminarlo de la cola
+    topic_id, topic, attempts = leased[0]
+    if attempts > 1:
+        print(f"🔁 Reintento {attempts}/{MAX_ATTEMPTS} de '{topic}'.")
+    return topic_id, topic
 
-def remove_topic_from_queue(topic):
-    """Elimina un tema de la cola solo si fue procesado exitosamente."""
-    if not os.path.exists(QUEUE_FILE):
-        return
-        
-    with open(QUEUE_FILE, "r", encoding="utf-8") as f:
-        try:
-            queue = json.load(f)
-        except:
-            return
-    
-    if topic in queue:
-        queue.remove(topic)
-        with open(QUEUE_FILE, "w", encoding="utf-8") as f:
-            json.dump(queue, f, indent=2, ensure_ascii=False)
-
-def clean_json_response(text):
-    text = text.strip()
-    if text.startswith("```json"): text = text[7:]
-    if text.startswith("```"): text = text[3:]
-    if text.endswith("```"): text = text[:-3]
-    return text
+def remove_topic_from_queue(topic_id):
+    """Confirma un tema en la cola solo si fue procesado exitosamente."""
+    get_queue().ack(topic_id)
 
-def generate_history(topic):
-    print(f"✍️  Investigando y escribiendo sobre: '{topic}'...")
-    
-    # TODO: TEMPORAL - Volver a 'gemini-2.5-flash' cuando termine el periodo de pruebas
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
-    
-    # --- PROMPT AVANZADO DE ESCRITURA ---
-    prompt = f"""
-    Actúa como un historiador riguroso y un narrador experto (estilo 'Narrative Non-fiction').
-    
-    OBJETIVO: Escribir un artículo premium sobre: "{topic}".
-    
+def release_topic(topic_id, error=None):
+    """Devuelve el tema a la cola (o a 'dead' si ya agotó sus intentos)."""
+    get_queue().nack(topic_id, error)
+
+def count_queue():
+    return get_queue().count()
+
+# TODO: TEMPORAL - Volver a 'gemini-2.5-flash' cuando termine el periodo de pruebas
+MODEL_NAME = 'gemini-2.5-flash-lite'
+
+# Modo multi-tema: K artículos por petición, limitado por el máximo de tokens de salida del modelo
+MAX_OUTPUT_TOKENS = int(os.getenv("CHRONOS_MAX_OUTPUT_TOKENS", 65536))
+OUTPUT_TOKEN_MARGIN = 0.8      # No apuramos el límite: un artículo largo no debe cortar el último
+article_tokens_estimate = 2500 # Tokens por artículo; se ajusta con lo observado en cada lote
+
+WRITING_INSTRUCTIONS = """
     INSTRUCCIONES DE ESTILO Y RIGOR:
     1. **Narrativa:** No escribas como una enciclopedia aburrida. Usa un tono humano, atrapante, que cuente una historia con principio, nudo y desenlace. Evita frases robóticas como "En conclusión" o "Cabe destacar".
     2. **Rigor:** Verifica mentalmente los datos. Prioriza la precisión histórica sobre el dramatismo excesivo.
@@ -74,12 +69,13 @@ def generate_history(topic):
        - Nombres de personas clave.
        - Nombres de operaciones militares o tratados.
        - Términos técnicos o en otros idiomas.
-    
-    SALIDA JSON OBLIGATORIA:
-    {{
+"""
+
+def article_schema(title, extra_fields=""):
+    return f"""{{{extra_fields}
       "date": "YYYY-MM-DD", (Fecha precisa del evento)
       "year": "AAAA", (Año del evento principal) (Si no es un año único, usa el más representativo)
-      "title": "{topic}", (Puedes mejorarlo para que sea más 'clicky' pero fiel)
+      "title": "{title}", (Puedes mejorarlo para que sea más 'clicky' pero fiel)
       "description": "Descripción para redes sociales (max 140 caracteres).",
       "category": "History", (Elige la mejor: History, Science, Art, Technology, Space, Mystery)
       "story": "El artículo completo en Markdown...",
@@ -89,19 +85,132 @@ def generate_history(topic):
         {{ "term": "Palabra/Nombre", "definition": "Contexto breve de quién o qué es." }}
       ],
       "imagePrompt": "Descripción detallada en INGLÉS para generar una imagen fotorrealista (cinematic lighting, 8k, highly detailed)."
-    }}
+    }}"""
+
+@metrics.timed("generate_history")
+def generate_history(topic):
+    print(f"✍️  Investigando y escribiendo sobre: '{topic}'...")
+    
+    # --- PROMPT AVANZADO DE ESCRITURA ---
+    prompt = f"""
+    Actúa como un historiador riguroso y un narrador experto (estilo 'Narrative Non-fiction').
+    
+    OBJETIVO: Escribir un artículo premium sobre: "{topic}".
+    {WRITING_INSTRUCTIONS}
+    SALIDA JSON OBLIGATORIA:
+    {article_schema(topic)}
     """
 
     try:
-        response = model.generate_content(prompt)
-        # Pausa de seguridad para respetar el Rate Limit de la API
-        time.sleep(2) 
-        return json.loads(clean_json_response(response.text))
-        
+        data = llm_cache.generate_json(MODEL_NAME, prompt)
     except Exception as e:
+        # generate_json ya descarta de la caché las respuestas irreparables
         print(f"❌ Error generando contenido: {e}")
         return None
 
+    draft = complete_draft(topic, data)
+    if draft is None:
+        # Parseó pero no sirve: fuera de la caché, o los reintentos recibirían la misma respuesta
+        llm_cache.invalidate(MODEL_NAME, prompt)
+    return draft
+
+def complete_missing_fields(topic, data, missing):
+    """Pide al modelo SOLO los campos que faltan, en lugar de regenerar el artículo entero."""
+    print(f"🩹 Completando campos que faltan en '{topic}': {', '.join(missing)}")
+    contexto = {k: v for k, v in data.items() if k in ("title", "date", "year", "story")}
+    prompt = f"""
+    Actúa como un historiador riguroso. Este es un artículo casi terminado sobre "{topic}":
+    {json.dumps(contexto, ensure_ascii=False)}
+    {WRITING_INSTRUCTIONS}
+    Devuelve ÚNICAMENTE un objeto JSON con estos campos: {", ".join(missing)}.
+    Usa el mismo formato que este esquema:
+    {article_schema(topic)}
+    """
+    try:
+        patch = llm_cache.generate_json(MODEL_NAME, prompt)
+    except Exception as e:
+        print(f"❌ Error completando campos: {e}")
+        return data
+    if isinstance(patch, dict):
+        data.update({k: v for k, v in patch.items() if k in missing})
+    if set(validate_draft(data)) & set(missing):
+        # Parche incompleto: fuera de la caché, o cada reintento recibiría el mismo parche
+        llm_cache.invalidate(MODEL_NAME, prompt)
+    return data
+
+def complete_draft(topic, data):
+    """Valida el borrador contra el esquema; si falta algo lo pide aparte. Devuelve el borrador o None."""
+    if not isinstance(data, dict):
+        print("❌ Error generando contenido: la respuesta no es un objeto JSON.")
+        return None
+    missing = validate_draft(data)
+    # Sin historia no hay nada que completar: mejor regenerar
+    if missing and "story" not in missing:
+        data = complete_missing_fields(topic, data, missing)
+        missing = validate_draft(data)
+    if missing:
+        print(f"❌ El borrador sigue incompleto: {', '.join(missing)}")
+        return None
+    return data
+
+def batch_size_for(requested):
+    """K efectivo: lo pedido, sin superar lo que cabe en la salida del modelo."""
+    fits = int(MAX_OUTPUT_TOKENS * OUTPUT_TOKEN_MARGIN // article_tokens_estimate)
+    return max(1, min(requested, fits))
+
+@metrics.timed("generate_history_batch", items=len)
+def generate_history_batch(topics):
+    """Redacta varios temas en UNA petición. Devuelve {tema: artículo} solo con los que llegaron bien."""
+    global article_tokens_estimate
+    print(f"✍️  Investigando y escribiendo {len(topics)} temas en una sola petición...")
+
+    lista = "\n".join(f"    - {json.dumps(t, ensure_ascii=False)}" for t in topics)
+    prompt = f"""
+    Actúa como un historiador riguroso y un narrador experto (estilo 'Narrative Non-fiction').
+    
+    OBJETIVO: Escribir un artículo premium sobre CADA UNO de estos {len(topics)} temas:
+{lista}
+    {WRITING_INSTRUCTIONS}
+    SALIDA JSON OBLIGATORIA:
+    Un Array JSON con un objeto por tema, en el mismo orden. Cada objeto:
+    {article_schema("Título del tema", extra_fields=chr(10) + '      "topic": "El tema EXACTO tal y como aparece en la lista",')}
+    """
+
+    try:
+        articles = llm_cache.generate_json(MODEL_NAME, prompt)
+    except Exception as e:
+        print(f"❌ Error generando contenido: {e}")
+        # Probablemente la salida se cortó: la próxima vez pedimos menos temas por petición
+        article_tokens_estimate = int(article_tokens_estimate * 1.5)
+        return {}
+
+    if not isinstance(articles, list):
+        articles = [articles]
+    if articles:
+        # Ajustamos K con el tamaño real de los artículos (~4 caracteres por token)
+        observed = len(json.dumps(articles, ensure_ascii=False)) // 4 // len(articles)
+        article_tokens_estimate = max(article_tokens_estimate // 2, observed)
+    if len(articles) < len(topics):
+        # El parser recuperó una salida truncada: el lote era demasiado grande
+        article_tokens_estimate = int(article_tokens_estimate * 1.5)
+
+    results = {}
+    for i, article in enumerate(articles):
+        if not isinstance(article, dict):
+            continue
+        topic = article.pop("topic", None)
+        # Si el modelo cambió el texto del tema, usamos la posición en la lista
+        if topic not in topics and i < len(topics):
+            topic = topics[i]
+        if topic in topics and topic not in results:
+            article = complete_draft(topic, article)
+            if article:
+                results[topic] = article
+    if len(results) < len(topics):
+        # Respuesta truncada (reparada) o con artículos inválidos: que no se repita desde la caché
+        llm_cache.invalidate(MODEL_NAME, prompt)
+    return results
+
 def generate_history_with_retries(topic, max_retries=2):
     """Envuelve generate_history con reintentos automáticos."""
     for attempt in range(max_retries + 1):  # 0, 1, 2 (3 intentos totales)
@@ -112,12 +221,9 @@ def generate_history_with_retries(topic, max_retries=2):
             print(f"✅ Contenido generado exitosamente en intento {attempt + 1}.")
             return data
         
-        if attempt < max_retries:
-            wait_time = 2 ** (attempt + 1)  # 2s, 4s, 8s
-            print(f"⏸️  Esperando {wait_time}s antes del siguiente intento...")
-            time.sleep(wait_time)
-        else:
-            print(f"❌ Se agotaron los {max_retries + 1} intentos. Tema permanece en queue.json.")
+        # El ritmo entre intentos (y los 429) lo gestiona rate_governor
+        if attempt == max_retries:
+            print(f"❌ Se agotaron los {max_retries + 1} intentos. Tema permanece en la cola.")
     
     return None
 
@@ -137,21 +243,131 @@ def save_draft(data):
     
     return filename
 
+def process_topic(topic_id, topic):
+    """Genera, guarda y confirma un único tema. Devuelve el nombre del borrador o None."""
+    try:
+        data = generate_history_with_retries(topic, max_retries=2)  # 3 intentos totales
+    except Exception as e:
+        release_topic(topic_id, str(e))
+        raise
+
+    if not data:
+        release_topic(topic_id, "generation failed")
+        return None
+
+    saved_file = save_draft(data)
+    # Solo confirmar en la cola si fue exitoso
+    remove_topic_from_queue(topic_id)
+    return saved_file
+
+def process_topic_batch(leased):
+    """Redacta varios temas reservados en una sola petición. Devuelve [(topic, borrador o None)]."""
+    articles = generate_history_batch([topic for _, topic, _ in leased])
+    outcome = []
+    for topic_id, topic, _ in leased:
+        data = articles.get(topic)
+        if data:
+            outcome.append((topic, save_draft(data)))
+            remove_topic_from_queue(topic_id)
+        else:
+            # Fallo parcial: solo este tema vuelve a la cola
+            release_topic(topic_id, "missing from batch response")
+            outcome.append((topic, None))
+    return outcome
+
+def run_batch(workers, max_topics=None, per_request=1):
+    """Redacta temas en paralelo con como máximo `workers` peticiones en vuelo.
+
+    Cada hilo reserva tema(s), los procesa y pide más hasta vaciar la cola
+    (o hasta llegar a `max_topics`). Con per_request > 1 cada petición lleva varios temas.
+    """
+    print(f"🚀 Modo lote: {workers} hilos simultáneos ({count_queue()} temas pendientes).")
+    counters = {"claimed": 0, "ok": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            k = batch_size_for(per_request)
+            with lock:
+                if max_topics is not None:
+                    k = min(k, max_topics - counters["claimed"])
+                if k <= 0:
+                    return
+                counters["claimed"] += k
+            leased = get_queue().lease(k)
+            if not leased:
+                return
+            try:
+                if len(leased) == 1:
+                    topic_id, topic, _ = leased[0]
+                    outcome = [(topic, process_topic(topic_id, topic))]
+                else:
+                    outcome = process_topic_batch(leased)
+            except Exception as e:
+                print(f"❌ Error inesperado: {e}")
+                outcome = [(topic, None) for _, topic, _ in leased]
+
+            # Cada borrador se escribe en cuanto termina su hilo
+            with lock:
+                for topic, saved_file in outcome:
+                    if saved_file:
+                        counters["ok"] += 1
+                        print(f"✅ [{counters['ok']}] Borrador guardado: {saved_file}")
+                    else:
+                        counters["failed"] += 1
+                        print(f"⏳ '{topic}' permanece en la cola para reintentar después.")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(workers):
+            pool.submit(worker)
+
+    print(f"\n📊 Lote terminado: {counters['ok']} generados, {counters['failed']} fallidos.")
+    print(f"📉 Quedan {count_queue()} temas en la cola.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Redacta borradores a partir de la cola de temas.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Redacta varios temas en paralelo con N peticiones simultáneas.")
+    parser.add_argument("--all", action="store_true",
+                        help="Procesa toda la cola (por defecto con %d hilos)." % DEFAULT_WORKERS)
+    parser.add_argument("--batch", type=int, default=1,
+                        help="Temas por petición al modelo (se reduce si no caben en la salida).")
+    parser.add_argument("--no-cache", action="store_true", help="Ignora la caché de respuestas LLM.")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    topic = get_next_topic_from_queue()
+    args = parse_args()
+    if args.no_cache:
+        llm_cache.set_bypass()
+
+    if args.all or args.workers or args.batch > 1:
+        if not count_queue():
+            print("📭 La cola está vacía.")
+            exit()
+
+        workers = max(1, args.workers or DEFAULT_WORKERS)
+        # Sin --all, se procesa una sola ronda (N hilos x K temas por petición)
+        max_topics = None if args.all else workers * max(1, args.batch)
+        run_batch(workers, max_topics=max_topics, per_request=max(1, args.batch))
+        llm_cache.print_stats()
+        metrics.summary()
+        exit()
+
+    leased = get_next_topic_from_queue()
     
-    if topic:
+    if leased:
+        topic_id, topic = leased
         data = generate_history_with_retries(topic, max_retries=2)  # 3 intentos totales
         
         if data:
             saved_file = save_draft(data)
-            # Solo eliminar de la cola si fue exitoso
-            remove_topic_from_queue(topic)
+            # Solo confirmar en la cola si fue exitoso
+            remove_topic_from_queue(topic_id)
             
-            remaining = len(json.load(open(QUEUE_FILE)))
+            remaining = count_queue()
             print(f"✅ Artículo generado: '{data['title']}'")
             print(f"📉 Quedan {remaining} temas en la cola.")
         else:
-            # No eliminamos de la cola si falló
+            # No eliminamos de la cola si falló (tras MAX_ATTEMPTS pasa a 'dead')
+            release_topic(topic_id, "generation failed")
             print(f"⏳ '{topic}' permanece en la cola para reintentar después.")
-            print("⏳ Pausa de seguridad aplicada.")
\ No newline at end of file
@@ -1,31 +1,36 @@
 import os
 import json
-import shutil
+import argparse
 import time
+import threading
 import warnings
-import requests # Necesario para llamar a la API
-import psycopg2
-import google.generativeai as genai
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
+import llm_cache
+import metrics
+import publisher
+import commons_client
+import quality_gate
+import checkpoint
+import archive_store
+import image_derivatives
+from llm_json import DRAFT_SCHEMA
+from image_scoring import pick_best, AUTO_THRESHOLD
 
 # Silenciar avisos
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 load_dotenv()
 
-# Configuración
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
 # CARPETAS DEL SISTEMA DE COLAS
 DRAFTS_DIR = "drafts"    # 📥 Bandeja de entrada
-ARCHIVE_DIR = "archive"  # 🗄️ Archivo procesado
+ARCHIVE_DIR = archive_store.ARCHIVE_DIR  # 🗄️ Archivo procesado (segmentos comprimidos, ver archive_store)
 INPUT_FILE = None        # Se asigna dinámicamente desde drafts
-
-# Cabecera para Wikipedia
-HEADERS = {
-    "User-Agent": "ProjectChronos/1.0 (marcos@example.com)" 
-}
+REVIEW_FILE = "review_list.json"  # 👀 Borradores que el modo --auto no se atrevió a publicar
+SESSION_PREFETCH = 3     # Borradores que se preparan en segundo plano en modo --session
+REVIEW_LOCK = threading.Lock()
 
 # --- 1. GESTIÓN DE COLAS (NUEVO) ---
 def get_next_draft_file():
@@ -41,16 +46,11 @@ def get_next_draft_file():
     return os.path.join(DRAFTS_DIR, files[0])
 
 # --- 1.5 GENERADOR DE TÉRMINO DE BÚSQUEDA (IA) ---
-def generate_search_term(full_title):
-    """Usa IA para extraer el término de búsqueda más efectivo para Wikimedia Commons."""
-    # TODO: TEMPORAL - Volver a 'gemini-2.5-flash' cuando termine el periodo de pruebas
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
-    
-    prompt = f"""Genera el MEJOR término de búsqueda para Wikimedia Commons capturando el tema principal del título.
-
-ENTRADA: "{full_title}"
+# TODO: TEMPORAL - Volver a 'gemini-2.5-flash' cuando termine el periodo de pruebas
+SEARCH_TERM_MODEL = 'gemini-2.5-flash-lite'
+MAX_SEARCH_TERMS_PER_REQUEST = 50  # Cada término ocupa pocos tokens: el límite real es la longitud del prompt
 
-INSTRUCCIONES CLAVE:
+SEARCH_TERM_RULES = """INSTRUCCIONES CLAVE:
 1) Identifica el sujeto central (persona, lugar, evento o invento) y usa ese núcleo como búsqueda.
 2) Usa 1-3 palabras MÁX.; prioriza nombres propios o conceptos específicos que existan en Commons.
 3) Evita relleno: sin artículos, preposiciones ni adjetivos genéricos; nada de frases largas.
@@ -63,117 +63,134 @@ EJEMPLOS:
 - "El Descubrimiento de la Penicilina por Fleming" → "Penicillin Fleming"
 - "La Revolución Industrial en Inglaterra" → "Industrial Revolution"
 - "El Imperio Mexica y Tenochtitlán" → "Tenochtitlan"
+"""
+
+def search_term_prompt(full_title):
+    return f"""Genera el MEJOR término de búsqueda para Wikimedia Commons capturando el tema principal del título.
+
+ENTRADA: "{full_title}"
 
+{SEARCH_TERM_RULES}
 SALIDA: SOLO el término de búsqueda (sin comillas, sin explicación), 1-3 palabras.
 """
-    
+
+@metrics.timed("generate_search_term")
+def generate_search_term(full_title):
+    """Usa IA para extraer el término de búsqueda más efectivo para Wikimedia Commons."""
     try:
-        response = model.generate_content(prompt)
-        time.sleep(0.5)
-        search_term = response.text.strip()
+        response_text = llm_cache.generate_text(SEARCH_TERM_MODEL, search_term_prompt(full_title))
+        search_term = response_text.strip()
         return search_term
     except:
         # Fallback: simplemente las primeras 2 palabras
         words = full_title.split()
         return " ".join(words[:2]) if len(words) > 1 else words[0]
 
-# --- 2. BUSCADOR WIKIMEDIA COMMONS (CORREGIDO) ---
-def search_commons_files(query, limit=5):
-    # Generar término de búsqueda óptimo con IA
-    optimized_query = generate_search_term(query)
-    
-    print(f"   🏛️  Buscando en Wikimedia Commons: '{optimized_query}'...")
-    
-    url = "https://commons.wikimedia.org/w/api.php"
-    candidates = []
-    
-    try:
-        # Intento 1: Búsqueda específica de imágenes
-        search_params = {
-            "action": "query",
-            "format": "json",
-            "list": "search",
-            "srsearch": f"{optimized_query} filetype:bitmap", # Solo mapas de bits (fotos)
-            "srnamespace": 6, # Espacio de nombres 'File:'
-            "srlimit": limit
-        }
-        
-        r = requests.get(url, params=search_params, headers=HEADERS, timeout=10)
-        data = r.json()
-        
-        # Si falla, imprimimos para depurar
-        if "error" in data:
-            print(f"      ⚠️ Error API Commons: {data['error'].get('info')}")
-            return []
+@metrics.timed("generate_search_terms_batch", items=len)
+def generate_search_terms_batch(titles):
+    """Obtiene el término de búsqueda de varios títulos en UNA petición. Devuelve {título: término}.
 
-        search_results = data.get('query', {}).get('search', [])
-        
-        # Si no hay resultados, probamos sin el filtro 'filetype' (Intento 2)
-        if not search_results:
-            print("      ⚠️ Filtro estricto sin resultados. Probando búsqueda general...")
-            search_params['srsearch'] = optimized_query
-            r = requests.get(url, params=search_params, headers=HEADERS, timeout=10)
-            search_results = r.json().get('query', {}).get('search', [])
-
-        if not search_results:
-            print("      ❌ Commons no encontró NADA. (Revisa el término de búsqueda)")
-            return []
+    El resultado se pasa a find_image_candidates / search_commons_files_many (parámetro terms);
+    además se guarda en la caché con la clave de generate_search_term para otras ejecuciones.
+    Los títulos que ya estaban en caché no se piden (ni se devuelven): saldrán de la caché.
+    """
+    pending = [t for t in dict.fromkeys(titles) if not llm_cache.is_cached(SEARCH_TERM_MODEL, search_term_prompt(t))]
+    terms = {}
+    for i in range(0, len(pending), MAX_SEARCH_TERMS_PER_REQUEST):
+        chunk = pending[i:i + MAX_SEARCH_TERMS_PER_REQUEST]
+        lista = "\n".join(f"- {json.dumps(t, ensure_ascii=False)}" for t in chunk)
+        prompt = f"""Genera el MEJOR término de búsqueda para Wikimedia Commons para CADA título, capturando su tema principal.
 
-        # Obtener URLs reales
-        titles = "|".join([item['title'] for item in search_results])
-        params_info = {
-            "action": "query",
-            "format": "json",
-            "titles": titles,
-            "prop": "imageinfo",
-            "iiprop": "url|user|extmetadata"
-        }
-        
-        r_info = requests.get(url, params=params_info, headers=HEADERS, timeout=10)
-        pages = r_info.json().get('query', {}).get('pages', {})
-        
-        for _, page in pages.items():
-            if 'imageinfo' in page:
-                info = page['imageinfo'][0]
-                # Filtrar iconos pequeños o banderas irrelevantes si es posible
-                if info.get('url', '').endswith('.svg'): continue 
-
-                author = info.get('user', 'Wikimedia Commons')
-                try:
-                    meta = info.get('extmetadata', {})
-                    if 'Artist' in meta:
-                        author = meta['Artist']['value'].replace('<', ' <').split('<')[0].strip()
-                except: pass
-
-                candidates.append({
-                    "source": "Commons",
-                    "title": page['title'].replace("File:", ""),
-                    "url": info['url'],
-                    "credit": f"Fuente: Commons ({author})"
-                })
+ENTRADAS:
+{lista}
 
-    except Exception as e:
-        print(f"      ⚠️ Error conexión: {e}")
+{SEARCH_TERM_RULES}
+SALIDA: SOLO un objeto JSON {{"título exacto": "término"}} con una entrada por título, sin explicación.
+"""
+        try:
+            response = llm_cache.generate_json(SEARCH_TERM_MODEL, prompt)
+        except Exception as e:
+            print(f"⚠️ Fallo generando términos en lote ({e}). Se generarán uno a uno.")
+            continue
+
+        for title in chunk:
+            term = response.get(title) if isinstance(response, dict) else None
+            if not isinstance(term, str) or not term.strip():
+                continue  # Fallo parcial: este título se resolverá con generate_search_term
+            term = term.strip()
+            terms[title] = term
+            llm_cache.store(SEARCH_TERM_MODEL, search_term_prompt(title), term)
+            # search_commons_files vuelve a optimizar el término ya corto: es su propio mejor término
+            llm_cache.store(SEARCH_TERM_MODEL, search_term_prompt(term), term)
+    return terms
+
+def search_term_for(title, terms=None):
+    """Término del lote (terms) si lo hay; si no, una llamada individual (o la caché)."""
+    return (terms or {}).get(title) or generate_search_term(title)
+
+def prefetch_search_terms():
+    """Calcula en una sola petición los términos de todos los borradores pendientes. Devuelve {título: término}."""
+    if not os.path.exists(DRAFTS_DIR):
+        return {}
+    titles = []
+    for name in os.listdir(DRAFTS_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(DRAFTS_DIR, name), "r", encoding="utf-8") as f:
+                titles.append(json.load(f)['title'])
+        except Exception:
+            pass
+    return generate_search_terms_batch(titles) if len(titles) > 1 else {}
+
+# --- 2. BUSCADOR WIKIMEDIA COMMONS (CORREGIDO) ---
+@metrics.timed("search_commons_files", items=len)
+def search_commons_files(query, limit=5, optimize=True):
+    # Generar término de búsqueda óptimo con IA (salvo que query ya sea el término)
+    optimized_query = generate_search_term(query) if optimize else query
     
+    print(f"   🏛️  Buscando en Wikimedia Commons: '{optimized_query}'...")
+    candidates = commons_client.get_client().search_candidates(optimized_query, limit)
+    if candidates is None:
+        # Fallo de red/API: que el borrador quede pendiente en vez de ir a revisión por "sin imagen"
+        raise RuntimeError(f"Commons no respondió para '{optimized_query}'")
     return candidates
 
+@metrics.timed("search_commons_files_many", items=lambda found: sum(1 for c in found.values() if c))
+def search_commons_files_many(queries, limit=5, terms=None):
+    """Como search_commons_files para varios borradores: una sola ronda de imageinfo para todos.
+
+    terms: {query: término} ya conocidos (p. ej. de generate_search_terms_batch); el resto se genera.
+    Una query cuya búsqueda falló (red/API) vale None, no [].
+    """
+    optimized = {q: search_term_for(q, terms) for q in queries}
+    print(f"   🏛️  Buscando en Wikimedia Commons {len(set(optimized.values()))} términos a la vez...")
+    results = commons_client.get_client().search_candidates_many(list(set(optimized.values())), limit)
+    return {q: results[term] for q, term in optimized.items()}
+
 # --- 3. SELECCIÓN ---
-def select_best_image(event_data):
+def find_image_candidates(event_data, ckpt=None, terms=None):
+    """Genera el término de búsqueda y devuelve (término, candidatos de Commons).
+
+    terms: {título: término} precalculados en lote; solo los títulos que falten llaman a la IA.
+    """
+    ckpt = ckpt or checkpoint.Checkpoint()
     # Por defecto generamos el término con IA (mejor rendimiento que usar el que venga en el borrador)
-    search_term = generate_search_term(event_data.get('title', ''))
+    search_term = ckpt.step("searchTerm", lambda: search_term_for(event_data.get('title', ''), terms))
     event_data['imageSearchTerm'] = search_term  # guardamos el que la IA propone
-    
+    return search_term, ckpt.step("candidates", lambda: search_commons_files(search_term, limit=5, optimize=False))
+
+def select_best_image(event_data, ckpt=None, terms=None):
+    ckpt = ckpt or checkpoint.Checkpoint()
+    search_term, options = find_image_candidates(event_data, ckpt, terms)
+    return ckpt.step("image", lambda: choose_image_interactive(search_term, options))
+
+def choose_image_interactive(search_term, options):
     print("\n" + "="*60)
     print(f"🖼️  SELECTOR DE IMÁGENES")
     print(f"🔍 Término usado: '{search_term}'")
     print("="*60)
     
-    options = []
-    
-    # 1. Commons
-    # 1. Commons
-    options.extend(search_commons_files(search_term, limit=5))
-    
     # MOSTRAR
     print("\nOPCIONES ENCONTRADAS:")
     if not options: print("   (Sin resultados automáticos. Usa manual)")
@@ -202,108 +219,303 @@ def select_best_image(event_data):
 
 # --- RESTO DEL SCRIPT (AUDITORIA, DB, ETC) ---
 
-def clean_json_response(text):
-    text = text.strip()
-    if text.startswith("```json"): text = text[7:]
-    elif text.startswith("```"): text = text[3:]
-    if text.endswith("```"): text = text[:-3]
-    return text.strip()
+# Lo que el editor reescribe siempre: el resto del borrador solo viaja si el control de calidad lo señala
+EDITABLE_FIELDS = ("story", "funFact")
 
-def review_and_fix_content(event_data):
+@metrics.timed("review_and_fix_content")
+def review_and_fix_content(event_data, issues=()):
     print(f"🧐 Editor IA revisando borrador...")
     # TODO: TEMPORAL - Volver a 'gemini-2.5-flash' cuando termine el periodo de pruebas
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
-    
-    # Prompt enfocado en mantener campos críticos y mejorar narrativa
+    model_name = 'gemini-2.5-flash-lite'
+
+    fields = list(EDITABLE_FIELDS) + [f for f in quality_gate.issue_fields(issues) if f not in EDITABLE_FIELDS]
+    editable = {k: event_data[k] for k in fields if event_data.get(k) not in (None, "", [])}
+    if not editable:
+        return event_data
+
+    problemas = ""
+    if issues:
+        problemas = f"""
+    PROBLEMAS DETECTADOS (corrígelos):
+{quality_gate.format_issues(issues)}
+    """
+
+    # Solo enviamos (y recibimos) los campos a editar; lo demás no se toca
     prompt = f"""
-    Actúa como Editor. Revisa este JSON: {json.dumps(event_data, ensure_ascii=False)}. 
-    
+    Actúa como Editor. Revisa estos campos del artículo "{event_data.get('title', '')}": {json.dumps(editable, ensure_ascii=False)}
+    {problemas}
     TAREAS:
     1. Mejora el estilo narrativo de 'story' y 'funFact'.
-    2. NO elimines ni cambies los campos 'year' ni 'date'.
-    3. IMPORTANTE: Elimina cualquier título de markdown (líneas que comiencen con # ## ### etc) del campo 'story'. El título ya se mostrará en la web, no debe estar dentro del contenido.
-    (El término de búsqueda de imagen lo gestiona otra función, no lo modifiques aquí.)
+    2. IMPORTANTE: Elimina cualquier título de markdown (líneas que comiencen con # ## ### etc) del campo 'story'. El título ya se mostrará en la web, no debe estar dentro del contenido.
+    3. Cada término del glosario debe aparecer literalmente en 'story'. 'description' no supera {quality_gate.MAX_DESCRIPTION} caracteres. 'category' es una de: {", ".join(quality_gate.ALLOWED_CATEGORIES)}. Entre {quality_gate.MIN_TAGS} y {quality_gate.MAX_TAGS} tags. 'year' coincide con el año de 'date' (YYYY-MM-DD).
     
-    Devuelve el JSON válido completo.
+    Devuelve ÚNICAMENTE un objeto JSON con las claves {", ".join(fields)}.
     """
     try:
-        res = model.generate_content(prompt)
-        time.sleep(1)
-        text = res.text.strip()
-        if text.startswith("```"): text = text.split("\n", 1)[1].rsplit("\n", 1)[0]
-        return json.loads(text)
+        edited = llm_cache.generate_json(model_name, prompt)
     except Exception as e:
         print(f"⚠️ Fallo en la IA ({e}). Usando borrador original.")
         return event_data
 
-def get_db_connection():
-    return psycopg2.connect(os.getenv("DATABASE_URL"))
+    if not isinstance(edited, dict):
+        print("⚠️ Fallo en la IA (respuesta sin objeto JSON). Usando borrador original.")
+        return event_data
 
-def get_generated_event():
-    try:
-        with open(INPUT_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"❌ No encontré '{INPUT_FILE}'. Asegúrate de ejecutar el paso 2 primero.")
-        exit()
+    # Fusionamos en local: solo los campos enviados que llegaron bien (la salida pudo cortarse)
+    merged = dict(event_data)
+    for field in fields:
+        value = edited.get(field)
+        if isinstance(value, DRAFT_SCHEMA[field]) and value not in ("", []):
+            merged[field] = value
+    return merged
 
-def archive_file(event_title):
-    if not os.path.exists(ARCHIVE_DIR): os.makedirs(ARCHIVE_DIR)
-    safe_title = "".join([c for c in event_title if c.isalnum() or c in (' ', '-', '_')]).strip().replace(" ", "_")
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    shutil.move(INPUT_FILE, os.path.join(ARCHIVE_DIR, f"{timestamp}_{safe_title}.json"))
-    print(f"🗄️  Archivado.")
-
-def save_to_supabase(event, image_data):
-    print("🚀 Subiendo a Supabase...")
-    conn = get_db_connection()
-    cur = conn.cursor()
+@metrics.timed(metrics.PUBLISH_STAGE, items=lambda results: sum(1 for r in results if r['ok']))
+def save_batch_to_supabase(items):
+    """Publica varios (event, image_data) en una transacción con la conexión del pool."""
     try:
-        cur.execute("""
-            INSERT INTO "Event" (
-                id, date, year, title, description, category, 
-                "imageUrl", "imageCredit", "story", "funFact", 
-                "lastShownAt", "createdAt", "updatedAt"
-            ) VALUES (
-                gen_random_uuid(), %s, %s, %s, %s, %s,
-                %s, %s, %s, %s,
-                NULL, NOW(), NOW()
-            ) RETURNING id;
-        """, (
-            event['date'], event['year'], event['title'], event['description'], event['category'],
-            image_data['url'], image_data['credit'], event['story'], event['funFact']
-        ))
-        event_id = cur.fetchone()[0]
-        
-        if 'glossary' in event:
-            for term in event['glossary']:
-                cur.execute('INSERT INTO "GlossaryTerm" (id, term, definition, "eventId") VALUES (gen_random_uuid(), %s, %s, %s)', (term['term'], term['definition'], event_id))
-        
-        if 'tags' in event:
-            for tag in event['tags']:
-                cur.execute('SELECT id FROM "Tag" WHERE name = %s', (tag,))
-                if not cur.fetchone():
-                    cur.execute('INSERT INTO "Tag" (id, name) VALUES (gen_random_uuid(), %s)', (tag,))
-        
-        conn.commit()
-        print(f"✅ ¡PUBLICADO! '{event['title']}' está online.")
-        return True
+        results = publisher.publish_events(items)
     except Exception as e:
-        conn.rollback()
         print(f"❌ Error DB: {e}")
-        return False
-    finally:
-        cur.close()
-        conn.close()
-
-def archive_processed_draft(filepath, title):
-    if not os.path.exists(ARCHIVE_DIR): os.makedirs(ARCHIVE_DIR)
-    safe = "".join([c for c in title if c.isalnum() or c in (' ','_')]).strip().replace(" ","_")
-    new_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{safe}.json"
-    shutil.move(filepath, os.path.join(ARCHIVE_DIR, new_name))
+        return [{"title": ev.get('title'), "ok": False, "id": None, "duplicate": False, "error": str(e)}
+                for ev, _ in items]
+
+    for r in results:
+        if r['ok'] and r.get('duplicate'):
+            print(f"♻️  '{r['title']}' ya estaba publicado (mismo contentHash): no se duplica.")
+        elif r['ok']:
+            print(f"✅ ¡PUBLICADO! '{r['title']}' está online.")
+        else:
+            print(f"❌ Error DB ('{r['title']}'): {r['error']}")
+    return results
+
+def archive_processed_draft(filepath, data):
+    # Se archiva lo publicado (final_data), no el borrador original: mismo contentHash que el evento
+    archive_store.get_store().archive_file(filepath, data)
+    checkpoint.discard(filepath)
     print("🗄️  Borrador archivado.")
 
+def attach_derivatives(entries):
+    """Añade a cada imagen sus variantes locales (WebP/AVIF, placeholder, color, foco), todas en un lote.
+
+    Sin Pillow o si la descarga falla, la imagen se queda con la URL original de Commons.
+    """
+    todo = [(image, ckpt) for _, _, image, ckpt in entries if not image.get('derivatives')]
+    if not todo:
+        return
+    derived = image_derivatives.derive_many([image['url'] for image, _ in todo])
+    for image, ckpt in todo:
+        if derived.get(image['url']):
+            image['derivatives'] = derived[image['url']]
+            ckpt.save("image", image)
+
+def publish_and_archive(entries):
+    """entries: [(ruta, datos, imagen, checkpoint)]. Publica en lote y archiva. Devuelve las rutas publicadas.
+
+    El id publicado se guarda en el checkpoint antes de archivar: si el proceso muere entre
+    medias, la siguiente ejecución solo archiva (y aunque repitiera el INSERT, el contentHash lo evita).
+    """
+    pending = [e for e in entries if not e[3].get("published")]
+    if pending:
+        attach_derivatives(pending)
+        results = save_batch_to_supabase([(data, image) for _, data, image, _ in pending])
+        for (_, _, _, ckpt), result in zip(pending, results):
+            if result['ok']:
+                ckpt.save("published", result['id'])
+
+    published = []
+    for path, data, _, ckpt in entries:
+        if ckpt.get("published"):
+            archive_processed_draft(path, data)
+            published.append(path)
+    return published
+
+# --- 4. MODO AUTOMÁTICO (--auto) ---
+def get_all_draft_files():
+    if not os.path.exists(DRAFTS_DIR):
+        return []
+    return [os.path.join(DRAFTS_DIR, f) for f in sorted(os.listdir(DRAFTS_DIR)) if f.endswith(".json")]
+
+def edit_checked(data, issues):
+    """Borrador ya revisado por quality_gate: si no tiene problemas, el editor IA no se llama."""
+    if not issues:
+        print("✅ Control de calidad superado: se publica sin pasar por el editor IA.")
+        return data
+    print(f"🩺 {len(issues)} problemas de calidad: {', '.join(quality_gate.issue_fields(issues))}")
+    final_data, remaining = quality_gate.check_draft(review_and_fix_content(data, issues))
+    if remaining:
+        print(f"⚠️ El editor no resolvió: {', '.join(quality_gate.issue_fields(remaining))}")
+    return final_data
+
+def edit_draft(draft_data, ckpt=None):
+    """Control de calidad local y, solo si hace falta, editor IA con la lista de problemas."""
+    ckpt = ckpt or checkpoint.Checkpoint()
+    return ckpt.step("edited", lambda: edit_checked(*quality_gate.check_draft(draft_data)))
+
+def build_review_entry(path, final_data, search_term, confidence, ranked):
+    return {
+        "file": path,
+        "title": final_data.get('title'),
+        "searchTerm": search_term,
+        "confidence": confidence,
+        "candidates": [{"title": c['title'], "url": c['url'], "score": c['score']} for c in ranked[:3]],
+    }
+
+def add_to_review_list(entries):
+    with REVIEW_LOCK:
+        save_review_list(load_review_list() + entries)
+
+def load_review_list():
+    if not os.path.exists(REVIEW_FILE):
+        return []
+    with open(REVIEW_FILE, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except:
+            return []
+
+def save_review_list(entries):
+    with open(REVIEW_FILE, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=2, ensure_ascii=False)
+
+def remove_from_review_list(filepath):
+    with REVIEW_LOCK:
+        entries = load_review_list()
+        remaining = [e for e in entries if e['file'] != filepath]
+        if len(remaining) != len(entries):
+            save_review_list(remaining)
+
+def run_auto(threshold=AUTO_THRESHOLD, terms=None):
+    """Procesa todos los borradores sin intervención: elige imagen por puntuación y publica en lote.
+
+    terms: {título: término} de prefetch_search_terms (los que falten se generan uno a uno).
+    """
+    pending_review = {e['file'] for e in load_review_list()}
+    files = [f for f in get_all_draft_files() if f not in pending_review]
+    if not files:
+        print("📭 No hay borradores pendientes (o todos esperan revisión manual).")
+        return
+
+    print(f"🤖 Modo automático: {len(files)} borradores (umbral de confianza {threshold}).")
+    # Una pasada local sobre todos los borradores: solo los que fallan pagan el editor IA
+    checked = quality_gate.check_files(files)
+    failing = sum(1 for _, issues in checked.values() if issues)
+    print(f"🩺 Control de calidad: {len(checked) - failing} pasan, {failing} irán al editor IA.")
+    edited = []
+    for path, (draft_data, issues) in checked.items():
+        print(f"\n📄 {path}")
+        ckpt = checkpoint.Checkpoint(path)
+        final_data = ckpt.step("edited", lambda: edit_checked(draft_data, issues))
+        final_data['imageSearchTerm'] = ckpt.step("searchTerm", lambda: search_term_for(final_data.get('title', ''), terms))
+        edited.append((path, final_data, ckpt))
+
+    # Todas las búsquedas de Commons a la vez (imageinfo agrupado en una llamada), salvo las ya guardadas
+    missing = [data['imageSearchTerm'] for _, data, ckpt in edited if ckpt.get("candidates") is None]
+    # Los términos ya están optimizados: cada uno es su propio término de búsqueda
+    candidates = search_commons_files_many(missing, terms={t: t for t in missing}) if missing else {}
+    for _, data, ckpt in edited:
+        if candidates.get(data['imageSearchTerm']):
+            ckpt.save("candidates", candidates[data['imageSearchTerm']])
+
+    ready, review = [], []
+    for path, final_data, ckpt in edited:
+        search_term = final_data['imageSearchTerm']
+        if ckpt.get("candidates") is None and search_term in candidates and candidates[search_term] is None:
+            # Commons falló (red/API), no es una imagen mala: queda pendiente para la próxima pasada
+            print(f"   ⏳ {final_data.get('title', '')[:40]}: Commons no respondió. Queda pendiente.")
+            ckpt.save("imageError", f"Commons no respondió para '{search_term}'")
+            continue
+        best, confidence, ranked = pick_best(ckpt.get("candidates") or [], search_term, threshold)
+        image = ckpt.get("image")
+
+        if image or best:
+            if not image:
+                print(f"   ✅ {final_data.get('title', '')[:40]}: imagen elegida ({confidence:.2f}) {best['title'][:40]}")
+                image = {"url": best['url'], "credit": best['credit']}
+                ckpt.save("image", image)
+            ready.append((path, final_data, image, ckpt))
+        else:
+            print(f"   👀 {final_data.get('title', '')[:40]}: confianza baja ({confidence:.2f}). Pasa a revisión manual.")
+            review.append(build_review_entry(path, final_data, search_term, confidence, ranked))
+
+    if ready:
+        publish_and_archive(ready)
+
+    if review:
+        add_to_review_list(review)
+        print(f"\n📝 {len(review)} borradores añadidos a '{REVIEW_FILE}' para revisión manual.")
+
+# --- 5. SESIÓN INTERACTIVA CON PRECARGA (--session) ---
+def prepare_draft(path, terms=None):
+    """Todo lo que no necesita al operador: editor IA, término de búsqueda y candidatos de Commons."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            draft_data = json.load(f)
+        ckpt = checkpoint.Checkpoint(path)
+        final_data = edit_draft(draft_data, ckpt)
+        search_term, options = find_image_candidates(final_data, ckpt, terms)
+        return {"path": path, "data": final_data, "searchTerm": search_term, "options": options, "checkpoint": ckpt}
+    except Exception as e:
+        print(f"❌ Error preparando '{path}': {e}")
+        return None
+
+def run_session(prefetch=SESSION_PREFETCH, terms=None):
+    """Recorre todos los borradores. Mientras eliges imagen para uno, los siguientes se preparan en segundo plano."""
+    files = get_all_draft_files()
+    if not files:
+        print("📭 No hay borradores pendientes en la carpeta 'drafts/'.")
+        return
+
+    print(f"🎬 Sesión: {len(files)} borradores (precargando {prefetch} por delante).")
+    published = 0
+    with ThreadPoolExecutor(max_workers=prefetch) as pool:
+        futures = deque(pool.submit(prepare_draft, path, terms) for path in files[:prefetch + 1])
+        next_index = len(futures)
+
+        for n in range(len(files)):
+            prepared = futures.popleft().result()
+            # Mantenemos siempre `prefetch` borradores preparándose por delante
+            if next_index < len(files):
+                futures.append(pool.submit(prepare_draft, files[next_index], terms))
+                next_index += 1
+            if prepared is None:
+                continue
+
+            print(f"\n📄 [{n + 1}/{len(files)}] {prepared['path']}")
+            ckpt = prepared['checkpoint']
+            image_data = ckpt.step("image", lambda: choose_image_interactive(prepared['searchTerm'], prepared['options']))
+            if publish_and_archive([(prepared['path'], prepared['data'], image_data, ckpt)]):
+                remove_from_review_list(prepared['path'])
+                published += 1
+
+    print(f"\n📊 Sesión terminada: {published}/{len(files)} publicados.")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Revisa, ilustra y publica el siguiente borrador.")
+    parser.add_argument("--no-cache", action="store_true", help="Ignora la caché de respuestas LLM.")
+    parser.add_argument("--auto", action="store_true",
+                        help="Procesa todos los borradores eligiendo la imagen automáticamente.")
+    parser.add_argument("--session", action="store_true",
+                        help="Recorre todos los borradores preparando los siguientes mientras eliges imagen.")
+    parser.add_argument("--prefetch", type=int, default=SESSION_PREFETCH,
+                        help="Borradores que se preparan por delante en modo --session.")
+    parser.add_argument("--threshold", type=float, default=AUTO_THRESHOLD,
+                        help="Confianza mínima para publicar sin revisión (modo --auto).")
+    args = parser.parse_args()
+    if args.no_cache:
+        llm_cache.set_bypass()
+
+    if args.auto:
+        run_auto(args.threshold, prefetch_search_terms())
+        llm_cache.print_stats()
+        metrics.summary()
+        exit()
+
+    if args.session:
+        run_session(max(1, args.prefetch), prefetch_search_terms())
+        llm_cache.print_stats()
+        metrics.summary()
+        exit()
+
     # 1. BUSCAR BORRADOR EN LA COLA
     INPUT_FILE = get_next_draft_file()
     
@@ -317,19 +529,16 @@ if __name__ == "__main__":
         with open(INPUT_FILE, "r", encoding="utf-8") as f:
             draft_data = json.load(f)
             
-        # Pipeline normal
-        final_data = review_and_fix_content(draft_data)
-
-        # Restaurar campos críticos si la IA los omite
-        critical_fields = ['year', 'date', 'category', 'title', 'tags']
-        for key in critical_fields:
-            if key not in final_data or final_data[key] is None:
-                if key in draft_data:
-                    final_data[key] = draft_data[key]
-                    print(f"🔧 Campo recuperado del original: '{key}'")
-
-        image_data = select_best_image(final_data)
+        # Pipeline normal (cada paso queda en '<borrador>.ckpt' por si hay que reanudar)
+        ckpt = checkpoint.Checkpoint(INPUT_FILE)
+        final_data = edit_draft(draft_data, ckpt)
+
+        # Un solo borrador: su término sale de una llamada individual, sin lote para todo drafts/
+        image_data = select_best_image(final_data, ckpt)
         
-        if save_to_supabase(final_data, image_data):
-            # IMPORTANTE: Pasamos la ruta del archivo original para moverlo
-            archive_processed_draft(INPUT_FILE, final_data['title'])
\ No newline at end of file
+        print("🚀 Publicando...")
+        if publish_and_archive([(INPUT_FILE, final_data, image_data, ckpt)]):
+            remove_from_review_list(INPUT_FILE)
+
+        llm_cache.print_stats()
+        metrics.summary()
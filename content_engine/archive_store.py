@@ -0,0 +1,298 @@
+import os
+import json
+import gzip
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+import publisher
+from topic_index import fold
+
+# Archivo de borradores procesados: segmentos JSONL comprimidos + índice SQLite, en vez de un
+# JSON suelto por borrador en archive/.
+# - Cada borrador se añade como un miembro gzip independiente al segmento abierto. Los miembros
+#   concatenados siguen siendo un gzip válido (zcat segment-000001.jsonl.gz funciona), y con
+#   (offset, length) del índice se lee uno solo sin descomprimir el resto.
+# - El índice (archive/index.db, modo WAL) guarda título, contentHash y fecha de cada registro.
+# - Al pasar de SEGMENT_MAX_BYTES se abre un segmento nuevo.
+# - Añadir toma el lock de escritura de SQLite (BEGIN IMMEDIATE): seguro entre hilos y procesos.
+
+ARCHIVE_DIR = os.getenv("CHRONOS_ARCHIVE_DIR", "archive")
+SEGMENTS = "segments"
+INDEX_DB = "index.db"
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+
+def _safe_hash(data):
+    try:
+        return publisher.content_hash(data)
+    except (KeyError, AttributeError, TypeError):
+        return None   # Borrador incompleto: se archiva igual, sin hash
+
+def _legacy_timestamp(name, path):
+    # Nombres antiguos: '20260118_153012_Titulo.json'
+    try:
+        return datetime.strptime(name[:15], "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return os.path.getmtime(path)
+
+class ArchiveStore:
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.segments_dir = os.path.join(root, SEGMENTS)
+        os.makedirs(self.segments_dir, exist_ok=True)
+        self.path = os.path.join(root, INDEX_DB)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    title TEXT,
+                    title_key TEXT,
+                    content_hash TEXT,
+                    date TEXT,
+                    source TEXT,
+                    archived_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS records_title ON records(title_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS records_hash ON records(content_hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS records_date ON records(date)")
+            # JSON sueltos de archive/ ya importados (para no importarlos dos veces entre procesos)
+            conn.execute("CREATE TABLE IF NOT EXISTS legacy_imports (name TEXT PRIMARY KEY, record_id INTEGER NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación, como en topic_queue
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _next_segment(name):
+        number = int(name.split("-")[1].split(".")[0]) + 1
+        return f"segment-{number:06d}.jsonl.gz"
+
+    def _current_segment(self, conn):
+        row = conn.execute("SELECT segment FROM records ORDER BY id DESC LIMIT 1").fetchone()
+        return row[0] if row else "segment-000001.jsonl.gz"
+
+    def _append(self, conn, entries):
+        """Escribe los registros con el lock de escritura (conn en BEGIN IMMEDIATE) ya tomado."""
+        if not entries:
+            return []
+        members = []
+        for data, source, archived_at in entries:
+            line = json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n"
+            members.append((data, source, archived_at or time.time(), gzip.compress(line.encode("utf-8"))))
+
+        ids = []
+        segment = self._current_segment(conn)
+        f = open(os.path.join(self.segments_dir, segment), "ab")
+        try:
+            offset = f.seek(0, os.SEEK_END)
+            for data, source, archived_at, blob in members:
+                if offset and offset + len(blob) > SEGMENT_MAX_BYTES:
+                    os.fsync(f.fileno())
+                    f.close()
+                    segment = self._next_segment(segment)
+                    f = open(os.path.join(self.segments_dir, segment), "ab")
+                    offset = f.seek(0, os.SEEK_END)
+                f.write(blob)
+                title = data.get('title') if isinstance(data, dict) else None
+                date = data.get('date') if isinstance(data, dict) else None
+                cur = conn.execute(
+                    "INSERT INTO records (segment, offset, length, title, title_key, content_hash, date, source, archived_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (segment, offset, len(blob), title, fold(title).strip() if title else None,
+                     _safe_hash(data) if isinstance(data, dict) else None,
+                     str(date) if date else None, source, archived_at))
+                ids.append(cur.lastrowid)
+                offset += len(blob)
+            # Los bytes en disco antes que el índice: un registro indexado siempre se puede leer
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        return ids
+
+    def append_many(self, entries):
+        """entries: [(datos, origen, archivado_en o None)]. Devuelve los ids de registro, en orden."""
+        if not entries:
+            return []
+        with self._connect() as conn:
+            return self._append(conn, entries)
+
+    def append(self, data, source=None):
+        return self.append_many([(data, source, None)])[0]
+
+    def archive_file(self, path, data=None):
+        """Archiva un borrador y borra su fichero. Devuelve el id de registro.
+
+        data: lo que se publicó de verdad (tras el editor); así content_hash coincide con
+        Event.contentHash. Sin data se archiva el fichero tal cual.
+        """
+        if data is None:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        record_id = self.append(data, source=os.path.basename(path))
+        os.remove(path)
+        return record_id
+
+    # --- Lectura ---
+    def _read(self, segment, offset, length):
+        with open(os.path.join(self.segments_dir, segment), "rb") as f:
+            f.seek(offset)
+            return json.loads(gzip.decompress(f.read(length)))
+
+    def _query(self, where="", params=()):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            return conn.execute(
+                f"SELECT id, segment, offset, length, title, content_hash, date, source, archived_at FROM records {where}",
+                params).fetchall()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _record(row, data):
+        record_id, _, _, _, title, content_hash, date, source, archived_at = row
+        return {"id": record_id, "title": title, "contentHash": content_hash, "date": date,
+                "source": source, "archivedAt": archived_at, "data": data}
+
+    def _load(self, rows):
+        return [self._record(row, self._read(row[1], row[2], row[3])) for row in rows]
+
+    def get(self, record_id):
+        rows = self._load(self._query("WHERE id = ?", (record_id,)))
+        return rows[0] if rows else None
+
+    def get_by_hash(self, content_hash):
+        rows = self._load(self._query("WHERE content_hash = ? ORDER BY id", (content_hash,)))
+        return rows[0] if rows else None
+
+    def find_title(self, title):
+        """Registros con ese título (sin distinguir mayúsculas ni acentos)."""
+        return self._load(self._query("WHERE title_key = ? ORDER BY id", (fold(title).strip(),)))
+
+    def find_date(self, date):
+        return self._load(self._query("WHERE date = ? ORDER BY id", (date,)))
+
+    def count(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        finally:
+            conn.close()
+
+    def __iter__(self):
+        """Todo el histórico en orden de archivo, leyendo cada segmento de principio a fin una vez."""
+        handle, current = None, None
+        try:
+            for row in self._query("ORDER BY segment, offset"):
+                if row[1] != current:
+                    if handle:
+                        handle.close()
+                    current = row[1]
+                    handle = open(os.path.join(self.segments_dir, current), "rb")
+                handle.seek(row[2])
+                yield self._record(row, json.loads(gzip.decompress(handle.read(row[3]))))
+        finally:
+            if handle:
+                handle.close()
+
+    # --- Migración desde el archive/ de ficheros sueltos ---
+    def import_legacy_archive(self, folder=None):
+        """Mete en el archivo los JSON sueltos que haya en archive/ (y los borra). Devuelve cuántos.
+
+        Todo va con el lock de escritura del índice y cada fichero importado queda en legacy_imports:
+        si varios procesos abren el archivo a la vez, cada JSON se importa una sola vez.
+        """
+        folder = folder or self.root
+        names = sorted(n for n in os.listdir(folder) if n.endswith(".json")) if os.path.isdir(folder) else []
+        if not names:
+            return 0
+        entries, imported, done = [], [], []
+        with self._connect() as conn:
+            known = {row[0] for row in conn.execute("SELECT name FROM legacy_imports")}
+            for name in names:
+                path = os.path.join(folder, name)
+                if name in known:
+                    done.append(path)   # Importado por otro proceso que aún no lo había borrado
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        entries.append((json.load(f), name, _legacy_timestamp(name, path)))
+                    imported.append(name)
+                except FileNotFoundError:
+                    continue            # Ya importado y borrado por otro proceso
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ No se pudo importar '{path}': {e}")
+            ids = self._append(conn, entries)
+            conn.executemany("INSERT INTO legacy_imports (name, record_id) VALUES (?, ?)", list(zip(imported, ids)))
+        # Borrar después del COMMIT: si el proceso muere antes, legacy_imports evita duplicarlos
+        for path in done + [os.path.join(folder, name) for name in imported]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if imported:
+            print(f"📦 Importados {len(imported)} borradores archivados a '{self.segments_dir}'.")
+        return len(imported)
+
+def open_store(root=ARCHIVE_DIR):
+    """Abre el archivo e importa los JSON sueltos de archive/ si todavía quedan."""
+    store = ArchiveStore(root)
+    store.import_legacy_archive()
+    return store
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Archivo compartido por todo el proceso (se abre, e importa lo antiguo, la primera vez)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = open_store()
+        return _store
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consulta el archivo de borradores procesados.")
+    parser.add_argument("--title", help="Busca por título.")
+    parser.add_argument("--hash", help="Busca por contentHash.")
+    parser.add_argument("--date", help="Busca por fecha del evento (YYYY-MM-DD).")
+    parser.add_argument("--dump", action="store_true", help="Vuelca todo el histórico como JSONL por la salida estándar.")
+    args = parser.parse_args()
+
+    store = open_store()
+    if args.dump:
+        for record in store:
+            print(json.dumps(record, ensure_ascii=False))
+    elif args.title or args.hash or args.date:
+        if args.hash:
+            found = [r for r in [store.get_by_hash(args.hash)] if r]
+        elif args.title:
+            found = store.find_title(args.title)
+        else:
+            found = store.find_date(args.date)
+        for record in found:
+            print(json.dumps(record, indent=2, ensure_ascii=False))
+        if not found:
+            print("🔍 Nada en el archivo con ese criterio.")
+    else:
+        print(f"🗄️  {store.count()} borradores en el archivo.")
@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import argparse
+import importlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import publisher
+import quality_gate
+import glossary_index
+import image_derivatives
+from image_scoring import pick_best, AUTO_THRESHOLD
+
+# Reprocesado masivo de eventos ya publicados (p. ej. tras cambiar el prompt del editor o la
+# lógica del término de búsqueda), sin devolverlos uno a uno al flujo de 3_artist.py.
+# - Los eventos se leen de Postgres con un cursor con nombre (del lado del servidor), por lotes y en orden de id.
+# - Cada lote pasa por las etapas elegidas con concurrencia acotada y se escribe en UNA transacción
+#   (un UPDATE multi-fila, más glosario y tags si cambiaron).
+# - Tras cada lote confirmado se guarda el último id en '.backfill_<etapas>.json': si el proceso se
+#   corta, la siguiente ejecución sigue desde ahí sin repetir lo ya hecho.
+# El contentHash no se toca: sigue identificando al borrador original, así que volver a publicarlo no duplica.
+#
+# Etapas (se ejecutan en este orden):
+#   edit      -> control de calidad + editor IA (review_and_fix_content) sobre el texto publicado
+#   image     -> término de búsqueda nuevo, Commons y pick_best; cambia la imagen si hay una segura y distinta
+#   glossary  -> recalcula glossaryIndex (también se hace solo si 'edit' cambió el texto o el glosario)
+#   tags      -> vuelve a enlazar los tags a su Tag canónico (el más antiguo con ese nombre)
+
+STAGES = ("edit", "image", "glossary", "tags")
+DEFAULT_BATCH = 100
+DEFAULT_WORKERS = 4
+
+EVENT_COLUMNS = ("id", "date", "year", "title", "description", "category",
+                 "imageUrl", "imageCredit", "imagePosition", "imageVariants", "imagePlaceholder", "imageColor",
+                 "story", "funFact", "glossaryIndex")
+JSON_COLUMNS = {"imageVariants", "glossaryIndex"}
+EDIT_FIELDS = ("date", "year", "description", "category", "story", "funFact", "tags", "glossary")
+IMAGE_COLUMNS = ("imageUrl", "imageCredit", "imagePosition", "imageVariants", "imagePlaceholder", "imageColor")
+
+def progress_path(stages):
+    return f".backfill_{'-'.join(stages)}.json"
+
+class Progress:
+    """Cursor de progreso en disco: último id confirmado y contadores."""
+
+    def __init__(self, path, stages, restart=False):
+        self.path = path
+        self.state = {"stages": list(stages), "lastId": None, "processed": 0, "updated": 0,
+                      "startedAt": datetime.now().isoformat(timespec="seconds"), "finishedAt": None}
+        if not restart and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if not saved.get("finishedAt"):
+                self.state = saved
+
+    def advance(self, last_id, processed, updated):
+        self.state["lastId"] = last_id
+        self.state["processed"] += processed
+        self.state["updated"] += updated
+        self.save()
+
+    def finish(self):
+        self.state["finishedAt"] = datetime.now().isoformat(timespec="seconds")
+        self.save()
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path)
+
+# --- Lectura ---
+def read_batches(conn, after_id, batch_size):
+    """Genera lotes de eventos (dicts) con id > after_id, con un cursor del lado del servidor."""
+    columns = ", ".join(f'"{c}"' for c in EVENT_COLUMNS)
+    with conn.cursor(name="chronos_backfill") as cur:
+        cur.itersize = batch_size
+        if after_id:
+            cur.execute(f'SELECT {columns} FROM "Event" WHERE id > %s ORDER BY id', (after_id,))
+        else:
+            cur.execute(f'SELECT {columns} FROM "Event" ORDER BY id')
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [dict(zip(EVENT_COLUMNS, row)) for row in rows]
+
+def attach_relations(cur, events):
+    """Añade 'glossary' y 'tags' a cada evento del lote (dos consultas por lote)."""
+    by_id = {e['id']: e for e in events}
+    for e in events:
+        e['glossary'], e['tags'] = [], []
+    ids = list(by_id)
+    cur.execute('SELECT "eventId", term, definition FROM "GlossaryTerm" WHERE "eventId" = ANY(%s) ORDER BY id', (ids,))
+    for event_id, term, definition in cur.fetchall():
+        by_id[event_id]['glossary'].append({"term": term, "definition": definition})
+    cur.execute('SELECT et."A", t.name FROM "_EventToTag" et JOIN "Tag" t ON t.id = et."B" WHERE et."A" = ANY(%s) ORDER BY t.name',
+                (ids,))
+    for event_id, name in cur.fetchall():
+        by_id[event_id]['tags'].append(name)
+
+# --- Etapas ---
+def edit_event(artist, event):
+    """Devuelve {campo: valor nuevo} con lo que el editor cambió (vacío si nada)."""
+    draft = {k: event[k] for k in EDIT_FIELDS} | {"title": event['title']}
+    # imagePrompt no se guarda en la BD: su ausencia no es un problema del evento publicado
+    _, issues = quality_gate.check_draft(draft)
+    issues = [(field, message) for field, message in issues if field in draft]
+    fixed, _ = quality_gate.check_draft(artist.review_and_fix_content(draft, issues))
+
+    changes = {}
+    for field in EDIT_FIELDS:
+        value = fixed.get(field)
+        if field == "year":
+            try:
+                value = int(str(value).strip())
+            except (TypeError, ValueError):
+                continue
+        if value not in (None, "", []) and value != event[field]:
+            changes[field] = value
+    return changes
+
+def run_edit(artist, events, workers):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda e: edit_event(artist, e), events))
+    for event, changes in zip(events, results):
+        event.update(changes)
+        event['_changed'].update(changes)
+
+def same_image(event, url):
+    # Eventos publicados antes de que imageUrl volviera a ser siempre el original: ruta local
+    local = f"{image_derivatives.PUBLIC_PREFIX}/{image_derivatives.url_hash(url)}/"
+    return event['imageUrl'] == url or event['imageUrl'].startswith(local)
+
+def run_image(artist, events, threshold):
+    titles = [e['title'] for e in events]
+    batch = artist.generate_search_terms_batch(titles)  # Una petición para todo el lote
+    # Los que no vinieron en el lote (en caché o fallo parcial) se resuelven una sola vez aquí
+    terms = {t: artist.search_term_for(t, batch) for t in dict.fromkeys(titles)}
+    found = artist.search_commons_files_many(titles, terms=terms)   # Una ronda de imageinfo para todo el lote
+
+    chosen = {}
+    for event in events:
+        best, _, _ = pick_best(found.get(event['title']) or [], terms[event['title']], threshold)
+        if best and not same_image(event, best['url']):
+            chosen[event['id']] = {"url": best['url'], "credit": best['credit']}
+
+    derived = image_derivatives.derive_many([image['url'] for image in chosen.values()]) if chosen else {}
+    for event in events:
+        image = chosen.get(event['id'])
+        if not image:
+            continue
+        if derived.get(image['url']):
+            image['derivatives'] = derived[image['url']]
+        values = publisher.image_columns(image)
+        event.update(zip(IMAGE_COLUMNS, values))
+        event['_changed'].update(IMAGE_COLUMNS)
+
+def run_glossary(cur, events, force):
+    pending = [e for e in events if force or e['_changed'] & {"story", "funFact", "glossary"}]
+    if not pending:
+        return
+    indexes = glossary_index.build_indexes(pending, glossary_index.get_dictionary(cur))
+    for event, index in zip(pending, indexes):
+        if index != event['glossaryIndex']:
+            event['glossaryIndex'] = index
+            event['_changed'].add("glossaryIndex")
+
+# --- Escritura ---
+def _json_value(value):
+    return value if value is None or isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+def write_batch(cur, events, relink_tags):
+    """Escribe en la transacción abierta los eventos cambiados. Devuelve cuántos se actualizaron."""
+    from psycopg2.extras import execute_values
+    changed = [e for e in events if e['_changed'] or relink_tags]
+    columns = [c for c in EVENT_COLUMNS if c != "id"]
+    rows = [e for e in changed if e['_changed'] - {"tags", "glossary"}]
+    if rows:
+        casts = {"year": "::int", **{c: "::jsonb" for c in JSON_COLUMNS}}
+        template = "(" + ", ".join(["%s"] + [f"%s{casts.get(c, '')}" for c in columns]) + ")"
+        execute_values(cur, f"""
+            UPDATE "Event" AS e SET {", ".join(f'"{c}" = v."{c}"' for c in columns)}, "updatedAt" = NOW()
+            FROM (VALUES %s) AS v(id, {", ".join(f'"{c}"' for c in columns)})
+            WHERE e.id = v.id
+        """, [(e['id'], *[_json_value(e[c]) if c in JSON_COLUMNS else e[c] for c in columns]) for e in rows],
+            template=template)
+
+    glossary = [(e['id'], e) for e in changed if "glossary" in e['_changed']]
+    if glossary:
+        cur.execute('DELETE FROM "GlossaryTerm" WHERE "eventId" = ANY(%s)', ([i for i, _ in glossary],))
+        publisher.insert_glossary(cur, glossary)
+
+    tags = [(e['id'], e) for e in changed if relink_tags or "tags" in e['_changed']]
+    if tags:
+        cur.execute('DELETE FROM "_EventToTag" WHERE "A" = ANY(%s)', ([i for i, _ in tags],))
+        publisher.link_tags(cur, tags)
+    return len(changed)
+
+@metrics.timed("backfill_batch", items=lambda updated: updated)
+def process_batch(artist, cur, events, stages, workers, threshold):
+    for event in events:
+        event['_changed'] = set()
+    attach_relations(cur, events)
+    if "edit" in stages:
+        run_edit(artist, events, workers)
+    if "image" in stages:
+        run_image(artist, events, threshold)
+    run_glossary(cur, events, force="glossary" in stages)
+    return write_batch(cur, events, relink_tags="tags" in stages)
+
+def run_backfill(stages, batch_size=DEFAULT_BATCH, workers=DEFAULT_WORKERS, threshold=None,
+                 limit=None, restart=False, dry_run=False):
+    stages = [s for s in STAGES if s in stages]
+    # Las etapas con IA necesitan el artista (editor, términos de búsqueda); el resto no
+    artist = importlib.import_module("3_artist") if {"edit", "image"} & set(stages) else None
+    threshold = AUTO_THRESHOLD if threshold is None else threshold
+    progress = Progress(progress_path(stages), stages, restart=restart)
+    if progress.state["lastId"]:
+        print(f"⏩ Retomando después de {progress.state['lastId']} ({progress.state['processed']} ya procesados).")
+
+    db_pool = publisher.get_pool()
+    reader = db_pool.getconn()   # Mantiene abierto el cursor con nombre (su propia transacción)
+    writer = db_pool.getconn()   # Confirma un lote cada vez
+    started, done = time.time(), 0
+    batches = read_batches(reader, progress.state["lastId"], batch_size)
+    try:
+        for events in batches:
+            if limit is not None:
+                events = events[:max(0, limit - done)]
+                if not events:
+                    break
+            with writer.cursor() as cur:
+                try:
+                    updated = process_batch(artist, cur, events, stages, workers, threshold)
+                except Exception:
+                    writer.rollback()
+                    raise
+            if dry_run:
+                writer.rollback()
+                print(f"   🧪 Lote de {len(events)}: {updated} cambiarían (simulación, nada guardado).")
+            else:
+                writer.commit()
+                # Los términos nuevos pasan al diccionario en memoria solo cuando el lote está confirmado
+                glossary_index.remember([e for e in events if "glossary" in e['_changed']])
+                progress.advance(events[-1]['id'], len(events), updated)
+                print(f"   ✅ Lote de {len(events)}: {updated} actualizados "
+                      f"({progress.state['processed']} procesados en total).")
+            done += len(events)
+        else:
+            if not dry_run and limit is None:
+                progress.finish()
+    except KeyboardInterrupt:
+        print(f"\n⏸️  Interrumpido. La próxima ejecución seguirá después de {progress.state['lastId']}.")
+    finally:
+        batches.close()      # Cierra el cursor con nombre antes de terminar su transacción
+        reader.rollback()
+        writer.rollback()    # Un lote a medias (Ctrl+C) no se confirma
+        db_pool.putconn(reader)
+        db_pool.putconn(writer)
+
+    elapsed = time.time() - started
+    print(f"📊 Backfill {'+'.join(stages)}: {done} eventos en {elapsed:.1f}s "
+          f"({done / elapsed if elapsed else 0:.1f}/s).")
+    return done
+
+def add_arguments(parser):
+    parser.add_argument("--stages", default="glossary",
+                        help=f"Etapas separadas por comas: {', '.join(STAGES)}.")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="Eventos por lote (y por transacción).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Llamadas al editor IA en paralelo.")
+    parser.add_argument("--threshold", type=float, default=None, help="Confianza mínima para cambiar una imagen.")
+    parser.add_argument("--limit", type=int, default=None, help="Procesa como mucho N eventos en esta ejecución.")
+    parser.add_argument("--restart", action="store_true", help="Ignora el progreso guardado y empieza desde el principio.")
+    parser.add_argument("--dry-run", action="store_true", help="Calcula los cambios sin guardarlos.")
+
+def parse_stages(value):
+    stages = [s.strip() for s in value.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown or not stages:
+        raise SystemExit(f"❌ Etapas desconocidas: {', '.join(unknown) or '(ninguna)'}. Usa: {', '.join(STAGES)}.")
+    return stages
+
+def run_from_args(args):
+    run_backfill(parse_stages(args.stages), batch_size=max(1, args.batch), workers=max(1, args.workers),
+                 threshold=args.threshold, limit=args.limit, restart=args.restart, dry_run=args.dry_run)
+    metrics.summary()
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Reprocesa en bloque los eventos ya publicados (reanudable).")
+    add_arguments(parser)
+    run_from_args(parser.parse_args())
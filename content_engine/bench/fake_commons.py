@@ -0,0 +1,117 @@
+import io
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote
+
+# Servidor HTTP local que imita las dos llamadas de api.php que hace commons_client:
+#   list=search      -> títulos 'File:<término> N.jpg'
+#   prop=imageinfo   -> url, autor, tamaño, mime y licencia de cada fichero
+# y sirve los propios ficheros en /files/ (un JPEG de 2400x1600 generado con Pillow, para
+# que image_derivatives tenga trabajo real; sin Pillow no hay derivados y no se piden).
+# Las imágenes son grandes, JPEG, CC BY-SA y con un título parecido al término, así que
+# image_scoring las acepta y el benchmark mide el camino de publicación automática.
+
+RESULTS_PER_SEARCH = 5
+IMAGE_SIZE = (2400, 1600)
+
+def make_image():
+    """JPEG sintético con degradado y una figura descentrada (da algo de detalle al punto focal)."""
+    from PIL import Image, ImageDraw
+    w, h = IMAGE_SIZE
+    img = Image.linear_gradient("L").resize(IMAGE_SIZE).convert("RGB")
+    ImageDraw.Draw(img).ellipse((w * 0.55, h * 0.2, w * 0.85, h * 0.6), fill=(180, 120, 40), outline=(0, 0, 0), width=12)
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+class FakeCommonsServer:
+    def __init__(self, latency=0.03, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.requests = 0
+        self._image = None
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.count_request()
+                time.sleep(server.latency)
+                if self.path.startswith("/files/"):
+                    return self.send_file()
+                params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                body = json.dumps(server.respond(params)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_file(self):
+                body = server.image()
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Sin una línea por petición en la salida del benchmark
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.base = f"http://{host}:{self.httpd.server_address[1]}"
+        self.url = f"{self.base}/w/api.php"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def image(self):
+        with self._lock:
+            if self._image is None:
+                self._image = make_image()
+            return self._image
+
+    def respond(self, params):
+        if params.get("list") == "search":
+            term = params.get("srsearch", "").replace("filetype:bitmap", "").strip()
+            limit = int(params.get("srlimit", RESULTS_PER_SEARCH))
+            return {"query": {"search": [{"title": f"File:{term} {i + 1}.jpg"} for i in range(limit)]}}
+
+        if params.get("prop") == "imageinfo":
+            pages = {}
+            for i, title in enumerate(params.get("titles", "").split("|")):
+                pages[str(-(i + 1))] = {
+                    "title": title,
+                    "imageinfo": [{
+                        "url": f"{self.base}/files/{quote(title[5:].replace(' ', '_'))}",
+                        "user": "Bench",
+                        "width": 2400,
+                        "height": 1600,
+                        "mime": "image/jpeg",
+                        "extmetadata": {
+                            "Artist": {"value": "Bench Photographer"},
+                            "LicenseShortName": {"value": "CC BY-SA 4.0"},
+                        },
+                    }],
+                }
+            return {"query": {"pages": pages}}
+
+        return {"error": {"code": "badparams", "info": "Petición no soportada por el servidor de pruebas"}}
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="fake-commons", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def install(server, cache_path):
+    """Apunta commons_client al servidor local con una caché vacía propia."""
+    import commons_client
+    commons_client.API_URL = server.url
+    with commons_client._client_lock:
+        commons_client._client = commons_client.CommonsClient(cache_path=cache_path)
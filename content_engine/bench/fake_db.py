@@ -0,0 +1,35 @@
+import time
+import uuid
+import threading
+
+# Sustituto de publisher.publish_events para medir sin Postgres.
+# Simula lo que cuesta de verdad un lote: un número fijo de viajes a la BD por transacción
+# (ver publisher._insert_batch) más un pequeño coste por fila.
+# Con --database-url el benchmark usa el publicador real contra esa base de datos.
+
+ROUND_TRIPS_PER_BATCH = 6   # INSERT Event, INSERT GlossaryTerm, SELECT Tag, INSERT Tag, INSERT _EventToTag, COMMIT
+
+class FakePublisher:
+    def __init__(self, round_trip=0.002, per_row=0.0002):
+        self.round_trip = round_trip
+        self.per_row = per_row
+        self.events = []
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def publish_events(self, items):
+        if not items:
+            return []
+        time.sleep(self.round_trip * ROUND_TRIPS_PER_BATCH + self.per_row * len(items))
+        results = []
+        with self._lock:
+            self.batches += 1
+            for event, image_data in items:
+                event_id = str(uuid.uuid4())
+                self.events.append((event_id, event['title'], image_data.get('url')))
+                results.append({"title": event['title'], "ok": True, "id": event_id, "duplicate": False, "error": None})
+        return results
+
+def install(fake):
+    import publisher
+    publisher.publish_events = fake.publish_events
@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+# Sustituto local de google.generativeai para los benchmarks.
+# Reconoce el prompt de cada etapa (curador, historiador, editor, términos de búsqueda) y
+# devuelve JSON de fixtures con una latencia configurable: base + tokens de salida / velocidad.
+# Se instala en llm_cache (install), así que el resto del código no sabe que no es Gemini.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+STORY_REPEAT = 3            # La historia de la fixture x3 ≈ el tamaño de un artículo real
+CHUNK_CHARS = 400           # Tamaño de cada trozo en streaming
+
+_JSON_STRING = r'"(?:[^"\\]|\\.)*"'   # Un literal de string JSON completo
+
+_SYLLABLES = ["ba", "ce", "di", "fo", "gu", "la", "me", "ni", "po", "ru", "sa", "te", "vi", "zo",
+              "cor", "dan", "fel", "gor", "lin", "mar", "nor", "pel", "ros", "tal", "ver"]
+_CATEGORIES = ["History", "Science", "Art", "Technology", "Space", "Mystery"]
+_TAGS = ["Roma", "Egipto", "Inventos", "Guerras", "Astronomía", "Pintura", "Medicina", "Exploración"]
+
+def load_article():
+    with open(os.path.join(FIXTURES_DIR, "article.json"), "r", encoding="utf-8") as f:
+        article = json.load(f)
+    article["story"] = "\n\n".join([article["story"]] * STORY_REPEAT)
+    return article
+
+def search_term_for(title):
+    """El término que el falso Gemini propone para un título (sus dos primeras palabras)."""
+    return " ".join(title.split()[:2])
+
+class TopicFactory:
+    """Títulos sintéticos distintos entre sí (el índice de duplicados del scout no los descarta)."""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.seen = set()
+        self._lock = threading.Lock()
+
+    def _word(self):
+        return "".join(self.rng.choice(_SYLLABLES) for _ in range(self.rng.randint(2, 4))).capitalize()
+
+    def make(self, n):
+        titles = []
+        with self._lock:
+            while len(titles) < n:
+                title = " ".join(self._word() for _ in range(3))
+                if title not in self.seen:
+                    self.seen.add(title)
+                    titles.append(title)
+        return titles
+
+    def make_candidates(self, n):
+        """Como make(), con la categoría, año y tags que el scout pide para equilibrar el corpus."""
+        titles = self.make(n)
+        with self._lock:
+            return [{"title": t, "category": self.rng.choice(_CATEGORIES), "year": self.rng.randint(-2500, 2020),
+                     "tags": [self.rng.choice(_TAGS) for _ in range(2)]} for t in titles]
+
+class FakeResponse:
+    def __init__(self, text, prompt):
+        self.text = text
+        self._chunks = [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)] or [""]
+        prompt_tokens = max(1, len(prompt) // 4)
+        response_tokens = max(1, len(text) // 4)
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=response_tokens,
+            total_token_count=prompt_tokens + response_tokens,
+        )
+
+    def __iter__(self):
+        return (SimpleNamespace(text=chunk) for chunk in self._chunks)
+
+class FakeModel:
+    def __init__(self, genai, model_name):
+        self.genai = genai
+        self.model_name = model_name
+
+    def generate_content(self, prompt, stream=False):
+        text = self.genai.respond(prompt)
+        time.sleep(self.genai.latency_for(text))
+        self.genai.count_call()
+        return FakeResponse(text, prompt)
+
+class FakeGenAI:
+    """Imita la parte de google.generativeai que usa llm_cache: configure() y GenerativeModel()."""
+
+    def __init__(self, latency=0.05, tokens_per_second=2000, jitter=0.2, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.topics = TopicFactory(seed)
+        self.article = load_article()
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def configure(self, **kwargs):
+        pass
+
+    def GenerativeModel(self, model_name):
+        return FakeModel(self, model_name)
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def latency_for(self, text):
+        with self._lock:
+            factor = self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+        seconds = self.latency + (len(text) / 4) / self.tokens_per_second if self.tokens_per_second else self.latency
+        return seconds * factor
+
+    # --- Respuestas por etapa ---
+    def make_article(self, topic):
+        article = dict(self.article)
+        article["title"] = topic
+        return article
+
+    def respond(self, prompt):
+        if "Actúa como Curador" in prompt:
+            n = int(re.search(r"lista de (\d+) temas", prompt).group(1))
+            return json.dumps(self.topics.make_candidates(n), ensure_ascii=False)
+
+        if "CADA UNO de estos" in prompt:
+            topics = [json.loads(t) for t in re.findall(rf'^\s*- ({_JSON_STRING})$', prompt, re.M)]
+            return json.dumps([{"topic": t, **self.make_article(t)} for t in topics], ensure_ascii=False)
+
+        if "Actúa como un historiador" in prompt:
+            match = re.search(r'sobre:? "(.+?)"', prompt)
+            return json.dumps(self.make_article(match.group(1) if match else "Tema"), ensure_ascii=False)
+
+        if "Actúa como Editor" in prompt:
+            edited = {"story": self.article["story"], "funFact": self.article["funFact"]}
+            return json.dumps(edited, ensure_ascii=False)
+
+        if "para CADA título" in prompt:
+            titles = [json.loads(t) for t in re.findall(rf'^- ({_JSON_STRING})$', prompt, re.M)]
+            return json.dumps({t: search_term_for(t) for t in titles}, ensure_ascii=False)
+
+        match = re.search(r'ENTRADA: "(.+)"', prompt)
+        if match:
+            return search_term_for(match.group(1))
+        return "{}"
+
+def install(fake):
+    """Hace que llm_cache use el falso Gemini (sin importar google.generativeai)."""
+    import llm_cache
+    with llm_cache._genai_lock:
+        llm_cache._genai = fake
+        llm_cache._models.clear()
@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import contextlib
+import subprocess
+from datetime import datetime
+
+# Benchmark del content engine sin gastar cuota:
+#   cd content_engine && python -m bench.run --sizes 10,100,1000
+#
+# Gemini, Commons y Postgres se sustituyen por fakes locales (bench/fake_*.py) y cada escenario
+# corre en un directorio temporal propio, así que queue.db, drafts/, archive/ y las cachés reales
+# no se tocan. Cada ejecución se guarda en bench/results/ y se compara con la anterior.
+# Sin --database-url la publicación es SINTÉTICA (fake_db sustituye a publisher.publish_events):
+# sus tiempos son una estimación y el informe los marca así. Con --database-url corre el publicador real.
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ENGINE_DIR, "bench", "results")
+STAGES = ("scout", "historian", "artist", "full")
+PUBLISH_STAGES = ("artist", "full")   # Escenarios cuyos tiempos incluyen la publicación
+DEFAULT_SIZES = "10,100,1000"
+DEFAULT_TOLERANCE = 0.10    # Más de un 10% peor en items/s o p99 = regresión
+
+def configure_environment(args):
+    """Variables que los módulos leen al importarse: hay que fijarlas ANTES de cargarlos."""
+    os.environ["CHRONOS_GEMINI_RPM"] = str(args.rpm)
+    os.environ["CHRONOS_GEMINI_TPM"] = str(args.tpm)
+    os.environ["CHRONOS_METRICS"] = "on"
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    if ENGINE_DIR not in sys.path:
+        sys.path.insert(0, ENGINE_DIR)
+
+def percentile(values, q):
+    """Percentil por rango más cercano."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+def stage_latencies(events_path):
+    """p50/p99 de cada etapa instrumentada (@metrics.timed) a partir del log JSON del escenario."""
+    samples = {}
+    if os.path.exists(events_path):
+        with open(events_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("event") == "stage":
+                    samples.setdefault(record["stage"], []).append(record["seconds"])
+    return {stage: {"count": len(values), "p50": round(percentile(values, 0.50), 4),
+                    "p99": round(percentile(values, 0.99), 4)}
+            for stage, values in sorted(samples.items())}
+
+class Bench:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.scout = importlib.import_module("1_scout")
+        self.historian = importlib.import_module("2_historian")
+        self.artist = importlib.import_module("3_artist")
+        self.chronos = importlib.import_module("chronos")
+        self.topic_queue = importlib.import_module("topic_queue")
+        self.llm_cache = importlib.import_module("llm_cache")
+        self.image_derivatives = importlib.import_module("image_derivatives")
+        self.archive_store = importlib.import_module("archive_store")
+        self.rate_governor = importlib.import_module("rate_governor")
+        self.fake_gemini = importlib.import_module("bench.fake_gemini")
+        self.fake_commons = importlib.import_module("bench.fake_commons")
+        self.fake_db = importlib.import_module("bench.fake_db")
+
+        self.gemini = self.fake_gemini.FakeGenAI(latency=args.gemini_latency, tokens_per_second=args.gemini_tps)
+        self.fake_gemini.install(self.gemini)
+        self.commons = self.fake_commons.FakeCommonsServer(latency=args.commons_latency).start()
+        self.db = None
+        if not args.database_url:
+            self.db = self.fake_db.FakePublisher(round_trip=args.db_latency)
+            self.fake_db.install(self.db)
+
+    def close(self):
+        self.commons.stop()
+        if self.args.database_url:
+            importlib.import_module("publisher").close_pool()
+
+    # --- Preparación de cada escenario ---
+    def enter(self, name):
+        """Directorio vacío para el escenario; las rutas relativas de los scripts caen aquí."""
+        path = os.path.join(self.workdir, name)
+        os.makedirs(path)
+        os.chdir(path)
+        with self.historian._queue_lock:
+            self.historian._queue = self.topic_queue.TopicQueue(os.path.join(path, "queue.db"))
+        # Caché LLM vacía por escenario: se mide el reparto real entre llamadas y aciertos
+        with self.llm_cache._cache_lock:
+            self.llm_cache._cache = self.llm_cache.LLMCache(os.path.join(path, ".llm_cache.db"))
+        self.fake_commons.install(self.commons, os.path.join(path, ".commons_cache.db"))
+        # Derivados de imagen también por escenario (si no, el segundo tamaño saldría entero de caché)
+        self.image_derivatives.OUTPUT_DIR = os.path.join(path, "images")
+        with self.archive_store._store_lock:
+            self.archive_store._store = None   # archive/ relativo al directorio del escenario
+        with self.rate_governor._governor_lock:
+            self.rate_governor._governor = self.rate_governor.RateGovernor(os.path.join(path, ".rate_governor.db"))
+        return path
+
+    def seed_topics(self, size):
+        self.historian.get_queue().enqueue(self.gemini.topics.make(size))
+
+    def seed_drafts(self, size):
+        os.makedirs(self.artist.DRAFTS_DIR, exist_ok=True)
+        for topic in self.gemini.topics.make(size):
+            self.historian.save_draft(self.gemini.make_article(topic))
+
+    def published(self):
+        return self.archive_store.get_store().count()
+
+    # --- Escenarios: devuelven los items producidos ---
+    def run_scout(self, size):
+        rounds = 0
+        while self.historian.get_queue().count() < size and rounds < size:
+            self.scout.scout_new_topics(self.historian.get_queue())
+            rounds += 1
+        return self.historian.get_queue().count()
+
+    def run_historian(self, size):
+        self.seed_topics(size)
+        self.historian.run_batch(self.args.historians, per_request=self.args.per_request)
+        drafts = self.historian.DRAFTS_DIR
+        return len(os.listdir(drafts)) if os.path.exists(drafts) else 0
+
+    def run_artist(self, size):
+        self.seed_drafts(size)
+        self.artist.run_auto(terms=self.artist.prefetch_search_terms())
+        return self.published()
+
+    def run_full(self, size):
+        self.seed_topics(size)
+        pipeline = self.chronos.Pipeline(historians=self.args.historians, artists=self.args.artists,
+                                         include_existing_drafts=False)
+        return pipeline.run()["published"]
+
+    def scenario(self, stage, size):
+        path = self.enter(f"{stage}-{size}")
+        gemini_calls, commons_requests = self.gemini.calls, self.commons.requests
+        started = time.perf_counter()
+        # La salida de los scripts (un print por tema) no interesa aquí
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            items = getattr(self, f"run_{stage}")(size)
+        elapsed = time.perf_counter() - started
+        os.chdir(self.workdir)
+        # Un escenario roto (p. ej. todas las llamadas fallando) no puede acabar publicado como tiempos
+        if items < size:
+            raise RuntimeError(f"{stage}-{size} solo produjo {items} de {size} items (ejecuta con --keep para revisarlo)")
+        return {
+            "stage": stage,
+            "size": size,
+            "items": items,
+            "seconds": round(elapsed, 3),
+            "items_per_sec": round(items / elapsed, 3) if elapsed else 0.0,
+            "gemini_calls": self.gemini.calls - gemini_calls,
+            "commons_requests": self.commons.requests - commons_requests,
+            "latency": stage_latencies(os.path.join(path, "metrics", "events.jsonl")),
+            "synthetic_publish": self.db is not None and stage in PUBLISH_STAGES,
+        }
+
+# --- Resultados ---
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ENGINE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def save_results(report):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{report['run_id']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+def latest_results(exclude=None):
+    if not os.path.exists(RESULTS_DIR):
+        return None
+    names = sorted(n for n in os.listdir(RESULTS_DIR) if n.endswith(".json") and n != exclude)
+    return os.path.join(RESULTS_DIR, names[-1]) if names else None
+
+def print_report(report):
+    print(f"\n📊 Benchmark {report['run_id']} ({report['git'] or 'sin git'})")
+    print(f"   {'escenario':<16} {'items':>6} {'segundos':>9} {'items/s':>9}  {'gemini':>6} {'commons':>7}")
+    publish_stage = importlib.import_module("metrics").PUBLISH_STAGE
+    for r in report["results"]:
+        mark = " *" if r.get("synthetic_publish") else ""
+        print(f"   {r['stage'] + '-' + str(r['size']):<16} {r['items']:>6} {r['seconds']:>9.2f} "
+              f"{r['items_per_sec']:>9.2f}  {r['gemini_calls']:>6} {r['commons_requests']:>7}{mark}")
+        for stage, lat in r["latency"].items():
+            label = " (sintético)" if r.get("synthetic_publish") and stage == publish_stage else ""
+            print(f"      {stage:<30} n={lat['count']:<6} p50 {lat['p50']:.3f}s  p99 {lat['p99']:.3f}s{label}")
+    if any(r.get("synthetic_publish") for r in report["results"]):
+        print("   * Publicación SINTÉTICA (bench/fake_db.py, sin Postgres): usa --database-url para medir la real.")
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Imprime la diferencia con otra ejecución. Devuelve la lista de regresiones."""
+    before = {(r["stage"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n🔍 Comparando con {baseline['run_id']} ({baseline.get('git') or 'sin git'}), tolerancia {tolerance:.0%}:")
+    database = baseline["params"].get("database", "fake")
+    if database != current["params"]["database"]:
+        print(f"   ⚠️ La referencia publicó contra '{database}' y esta ejecución contra "
+              f"'{current['params']['database']}': artist/full no son comparables.")
+    for r in current["results"]:
+        key = (r["stage"], r["size"])
+        old = before.get(key)
+        if not old or not old["items_per_sec"]:
+            continue
+        change = r["items_per_sec"] / old["items_per_sec"] - 1
+        flag = ""
+        if change < -tolerance:
+            flag = "  ⚠️ regresión"
+            regressions.append(f"{key[0]}-{key[1]} items/s {change:+.0%}")
+        print(f"   {key[0] + '-' + str(key[1]):<16} items/s {old['items_per_sec']:>9.2f} → {r['items_per_sec']:>9.2f} "
+              f"({change:+.0%}){flag}")
+        for stage, lat in r["latency"].items():
+            old_lat = old["latency"].get(stage)
+            if old_lat and old_lat["p99"] and lat["p99"] / old_lat["p99"] - 1 > tolerance:
+                regressions.append(f"{key[0]}-{key[1]} {stage} p99 {old_lat['p99']:.3f}s → {lat['p99']:.3f}s")
+                print(f"      ⚠️ {stage}: p99 {old_lat['p99']:.3f}s → {lat['p99']:.3f}s")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark del content engine con Gemini, Commons y Postgres locales.")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Escenarios a medir ({', '.join(STAGES)}).")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Tamaños de la cola (temas), separados por comas.")
+    parser.add_argument("--historians", type=int, default=4, help="Hilos del historiador.")
+    parser.add_argument("--artists", type=int, default=2, help="Hilos del artista (escenario full).")
+    parser.add_argument("--per-request", type=int, default=1, help="Temas por petición del historiador.")
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="Latencia base del falso Gemini (s).")
+    parser.add_argument("--gemini-tps", type=float, default=2000, help="Tokens de salida por segundo del falso Gemini.")
+    parser.add_argument("--commons-latency", type=float, default=0.03, help="Latencia del falso Commons (s).")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Latencia por viaje a la falsa BD (s).")
+    parser.add_argument("--database-url", default=None,
+                        help="Postgres local (desechable, con las migraciones aplicadas) en lugar de la falsa BD.")
+    parser.add_argument("--rpm", type=float, default=1e6, help="Cuota RPM del limitador durante el benchmark.")
+    parser.add_argument("--tpm", type=float, default=1e12, help="Cuota TPM del limitador durante el benchmark.")
+    parser.add_argument("--baseline", default=None, help="Resultado con el que comparar (por defecto, el último).")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Margen antes de marcar regresión.")
+    parser.add_argument("--no-save", action="store_true", help="No guardar el resultado en bench/results/.")
+    parser.add_argument("--keep", action="store_true", help="Conservar el directorio temporal de los escenarios.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        sys.exit(f"❌ Escenarios desconocidos: {', '.join(unknown)}")
+
+    configure_environment(args)
+    original_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="chronos-bench-")
+    os.chdir(workdir)
+    bench = Bench(args, workdir)
+    report = {
+        "run_id": datetime.now().strftime("%Y%m%d_%H%M%S"),
+        "git": git_revision(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("baseline", "no_save", "keep", "database_url")}
+                  | {"database": "postgres" if args.database_url else "fake"},
+        "results": [],
+    }
+    try:
+        for size in sizes:
+            for stage in stages:
+                print(f"⏱️  {stage} con {size} temas...", flush=True)
+                report["results"].append(bench.scenario(stage, size))
+    finally:
+        bench.close()
+        os.chdir(original_cwd)
+        if args.keep:
+            print(f"📂 Escenarios conservados en {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    baseline_path = args.baseline or latest_results()
+    regressions = []
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+    if not args.no_save:
+        print(f"\n💾 Resultado guardado en {save_results(report)}")
+    if regressions:
+        print(f"\n⚠️ {len(regressions)} regresiones:")
+        for r in regressions:
+            print(f"   - {r}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
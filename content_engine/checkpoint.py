@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+
+# Checkpoints del artista: el resultado de cada paso (texto editado, término de búsqueda,
+# candidatos, imagen elegida, id publicado) se guarda junto al borrador en '<borrador>.ckpt'.
+# Si el proceso muere o la BD falla, la siguiente ejecución retoma desde el último paso
+# completado en vez de volver a pagar el editor, Commons o la elección manual.
+# El checkpoint lleva el hash del fichero del borrador: si alguien edita el borrador, se descarta.
+
+SUFFIX = ".ckpt"
+STEPS = ("edited", "searchTerm", "candidates", "image", "published")
+
+def checkpoint_path(draft_path):
+    return draft_path + SUFFIX
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class Checkpoint:
+    def __init__(self, draft_path=None):
+        """Sin ruta, el checkpoint vive solo en memoria (misma interfaz, nada en disco)."""
+        self.path = checkpoint_path(draft_path) if draft_path else None
+        self.draft_hash = _file_hash(draft_path) if draft_path and os.path.exists(draft_path) else None
+        self.state = self._load()
+
+    def _load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if state.get("draftHash") == self.draft_hash:
+                    return state
+                print("🔄 El borrador cambió desde el último checkpoint: se empieza de cero.")
+            except (OSError, ValueError):
+                pass
+        return {"draftHash": self.draft_hash}
+
+    def get(self, step):
+        return self.state.get(step)
+
+    def save(self, step, value):
+        self.state[step] = value
+        if not self.path:
+            return
+        # Escritura atómica: un corte a mitad nunca deja un checkpoint corrupto
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def step(self, name, compute):
+        """Devuelve el valor guardado del paso o lo calcula con compute() y lo guarda."""
+        if self.state.get(name) is not None:
+            print(f"♻️  Reanudando desde el checkpoint: '{name}'")
+            return self.state[name]
+        value = compute()
+        if value:  # Un resultado vacío (p. ej. Commons sin red) no se da por bueno: se reintentará
+            self.save(name, value)
+        return value
+
+def discard(draft_path):
+    """Borra el checkpoint de un borrador (al archivarlo)."""
+    try:
+        os.remove(checkpoint_path(draft_path))
+    except FileNotFoundError:
+        pass
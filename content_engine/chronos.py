@@ -0,0 +1,439 @@
+import os
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import importlib
+import socketserver
+import scheduler
+import backfill
+
+# Punto de entrada único del content engine.
+#
+#   python chronos.py run           -> scout → historian → artist como un pipeline en streaming
+#   python chronos.py worker        -> proceso residente: modelo, sesión HTTP y pool de BD en caliente
+#   python chronos.py queue-length  -> estado de la cola (solo SQLite, arranca en milisegundos)
+#
+# Este fichero solo importa la biblioteca estándar: los módulos pesados (google.generativeai,
+# psycopg2, requests) se cargan cuando un comando los necesita de verdad.
+#
+# Las etapas viven en el mismo proceso (un solo import de google.generativeai, un solo
+# genai.configure) y se comunican con colas en memoria acotadas: si el artista va lento,
+# los historiadores se bloquean al llenar la cola en vez de acumular borradores.
+# Se siguen escribiendo queue.db, drafts/, archive/ y review_list.json, así que los
+# scripts 1_, 2_ y 3_ pueden seguir usándose por separado.
+
+DEFAULT_HISTORIANS = 4
+DEFAULT_ARTISTS = 2
+DEFAULT_QUEUE_SIZE = 8       # Capacidad de cada cola entre etapas (backpressure)
+PUBLISH_BATCH = 10           # Eventos por transacción en el publicador
+PUBLISH_FLUSH_SECONDS = 5    # Si no llegan más eventos, publicamos lo que haya
+
+WORKER_POLL_SECONDS = 30    # Cada cuánto mira el worker la cola y drafts/ si nadie le avisa
+WORKER_BACKOFF_SECONDS = 2  # Espera tras una pasada sin avances; se dobla hasta WORKER_POLL_SECONDS
+WORKER_SOCKET = os.getenv("CHRONOS_WORKER_SOCKET", ".chronos_worker.sock")
+
+_STOP = object()             # Marca de fin de flujo
+
+def load_stages():
+    """Importa los scripts numerados como módulos (una sola vez por proceso)."""
+    return (
+        importlib.import_module("1_scout"),
+        importlib.import_module("2_historian"),
+        importlib.import_module("3_artist"),
+    )
+
+class Pipeline:
+    def __init__(self, historians=DEFAULT_HISTORIANS, artists=DEFAULT_ARTISTS, queue_size=DEFAULT_QUEUE_SIZE,
+                 scout_rounds=0, max_topics=None, threshold=None, include_existing_drafts=True):
+        self.scout, self.historian, self.artist = load_stages()
+        self.historians = historians
+        self.artists = artists
+        self.scout_rounds = scout_rounds
+        self.max_topics = max_topics
+        self.threshold = self.artist.AUTO_THRESHOLD if threshold is None else threshold
+        self.include_existing_drafts = include_existing_drafts
+
+        self.topics = queue.Queue(maxsize=queue_size)    # (topic_id, topic)
+        self.drafts = queue.Queue(maxsize=queue_size)    # (ruta del borrador, datos)
+        self.to_publish = queue.Queue(maxsize=queue_size)  # (ruta, datos, imagen, checkpoint)
+        self.stats = {"topics": 0, "drafts": 0, "failed": 0, "review": 0, "published": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    # --- Etapa 1: origen de temas (cola persistente + scout bajo demanda) ---
+    def source(self):
+        topic_queue = self.historian.get_queue()
+        rounds_left = self.scout_rounds
+        try:
+            while self.max_topics is None or self.stats["topics"] < self.max_topics:
+                leased = topic_queue.lease(1)
+                if not leased:
+                    if rounds_left <= 0:
+                        break
+                    rounds_left -= 1
+                    print("🧠 Cola vacía: el Curador busca temas nuevos...")
+                    if not self.scout.scout_new_topics(topic_queue):
+                        break
+                    continue
+                topic_id, topic, _ = leased[0]
+                self._count("topics")
+                self.topics.put((topic_id, topic))  # Bloquea si los historiadores van por detrás
+        finally:
+            for _ in range(self.historians):
+                self.topics.put(_STOP)
+
+    # --- Etapa 2: historiadores ---
+    def historian_worker(self):
+        while True:
+            item = self.topics.get()
+            if item is _STOP:
+                return
+            topic_id, topic = item
+            try:
+                data = self.historian.generate_history_with_retries(topic, max_retries=2)
+                if not data:
+                    self.historian.release_topic(topic_id, "generation failed")
+                    self._count("failed")
+                    continue
+                filename = self.historian.save_draft(data)  # drafts/ se sigue escribiendo
+                self.historian.remove_topic_from_queue(topic_id)
+                self._count("drafts")
+                self.drafts.put((os.path.join(self.historian.DRAFTS_DIR, filename), data))
+            except Exception as e:
+                print(f"❌ Historiador: error con '{topic}': {e}")
+                self.historian.release_topic(topic_id, str(e))
+                self._count("failed")
+
+    # --- Etapa 3: artistas (editor + imagen automática) ---
+    def artist_worker(self):
+        artist = self.artist
+        while True:
+            item = self.drafts.get()
+            if item is _STOP:
+                self.to_publish.put(_STOP)
+                return
+            path, draft_data = item
+            try:
+                ckpt = artist.checkpoint.Checkpoint(path)  # Reanuda lo que una ejecución anterior dejó a medias
+                final_data = artist.edit_draft(draft_data, ckpt)
+                search_term, options = artist.find_image_candidates(final_data, ckpt)
+                best, confidence, ranked = artist.pick_best(options, search_term, self.threshold)
+                image = ckpt.get("image")
+                if best and not image:
+                    image = {"url": best['url'], "credit": best['credit']}
+                    ckpt.save("image", image)
+                if image:
+                    self.to_publish.put((path, final_data, image, ckpt))
+                else:
+                    print(f"👀 '{final_data.get('title')}' a revisión manual (confianza {confidence:.2f}).")
+                    artist.add_to_review_list([artist.build_review_entry(path, final_data, search_term, confidence, ranked)])
+                    self._count("review")
+            except Exception as e:
+                print(f"❌ Artista: error con '{path}': {e}")
+                self._count("failed")
+
+    # --- Etapa 4: publicador en lote ---
+    def publisher(self):
+        pending_stops = self.artists
+        batch = []
+        while pending_stops:
+            try:
+                item = self.to_publish.get(timeout=PUBLISH_FLUSH_SECONDS)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                pending_stops -= 1
+            elif item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= PUBLISH_BATCH or not pending_stops):
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        self._count("published", len(self.artist.publish_and_archive(batch)))
+
+    def _seed_existing_drafts(self, paths):
+        """Los borradores que ya estaban en drafts/ también entran en el flujo."""
+        pending_review = {e['file'] for e in self.artist.load_review_list()}
+        for path in paths:
+            if path in pending_review:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = self.artist.json.load(f)
+            except Exception as e:
+                print(f"⚠️ No se pudo leer '{path}': {e}")
+                continue
+            self.drafts.put((path, data))
+
+    def run(self):
+        started = time.time()
+        print(f"🚂 Pipeline: {self.historians} historiadores, {self.artists} artistas.")
+        # Foto de drafts/ ANTES de arrancar, para no meter dos veces lo que escriban los historiadores
+        existing = self.artist.get_all_draft_files() if self.include_existing_drafts else []
+
+        producers = [threading.Thread(target=self.source, name="source", daemon=True)]
+        producers += [threading.Thread(target=self.historian_worker, name=f"historian-{i}", daemon=True)
+                      for i in range(self.historians)]
+        consumers = [threading.Thread(target=self.artist_worker, name=f"artist-{i}", daemon=True)
+                     for i in range(self.artists)]
+        consumers.append(threading.Thread(target=self.publisher, name="publisher", daemon=True))
+        for t in producers + consumers:
+            t.start()
+
+        # Los artistas ya están consumiendo, así que sembrar no bloquea indefinidamente
+        self._seed_existing_drafts(existing)
+        for t in producers:
+            t.join()
+        # Sin más borradores en camino: cada artista recibe su marca de fin y avisa al publicador
+        for _ in range(self.artists):
+            self.drafts.put(_STOP)
+        for t in consumers:
+            t.join()
+
+        elapsed = time.time() - started
+        s = self.stats
+        print(f"\n📊 Pipeline terminado en {elapsed:.0f}s: {s['topics']} temas, {s['drafts']} borradores, "
+              f"{s['published']} publicados, {s['review']} a revisión, {s['failed']} fallos.")
+        return s
+
+class Worker:
+    """Proceso residente: carga las etapas una vez y lanza una pasada del pipeline cuando hay trabajo.
+
+    Se despierta cada WORKER_POLL_SECONDS o al recibir una orden por el socket local
+    (una línea JSON: {"cmd": "wake" | "scout" | "status" | "stop"}).
+    """
+
+    def __init__(self, historians=DEFAULT_HISTORIANS, artists=DEFAULT_ARTISTS, queue_size=DEFAULT_QUEUE_SIZE,
+                 threshold=None, poll=WORKER_POLL_SECONDS, socket_path=WORKER_SOCKET):
+        self.options = {"historians": historians, "artists": artists, "queue_size": queue_size, "threshold": threshold}
+        self.poll = poll
+        self.socket_path = socket_path
+        self.wake = threading.Event()
+        self.stopping = False
+        self.scout_requested = False
+        self.busy = False
+        self.passes = 0
+        self.idle_passes = 0         # Pasadas seguidas sin avances (BD caída, un borrador que siempre falla...)
+        self.totals = {"topics": 0, "drafts": 0, "failed": 0, "review": 0, "published": 0}
+        self._server = None
+
+    def warm_up(self):
+        """Importa y abre todo lo caro antes de la primera tarea."""
+        started = time.time()
+        self.scout, self.historian, self.artist = load_stages()
+        llm_cache = importlib.import_module("llm_cache")
+        llm_cache.get_model(self.historian.MODEL_NAME)
+        importlib.import_module("commons_client").get_client()
+        try:
+            importlib.import_module("publisher").get_pool()
+        except Exception as e:
+            print(f"⚠️ Sin conexión a la BD por ahora ({e}). Se reintentará al publicar.")
+        print(f"🔥 Worker listo en {time.time() - started:.1f}s.")
+
+    def has_work(self):
+        if self.historian.get_queue().available():
+            return True
+        pending_review = {e['file'] for e in self.artist.load_review_list()}
+        return any(path not in pending_review for path in self.artist.get_all_draft_files())
+
+    def run_pass(self, scout_rounds):
+        self.busy = True
+        try:
+            stats = Pipeline(scout_rounds=scout_rounds, **self.options).run()
+        finally:
+            self.busy = False
+        self.passes += 1
+        for key, value in stats.items():
+            self.totals[key] += value
+        importlib.import_module("metrics").flush()  # El textfile refleja cada pasada, no solo la salida
+        return stats
+
+    def backoff(self):
+        """Segundos de espera antes de la siguiente pasada (0 si la última avanzó algo)."""
+        if not self.idle_passes:
+            return 0
+        return min(self.poll, WORKER_BACKOFF_SECONDS * 2 ** (self.idle_passes - 1))
+
+    def status(self):
+        return {"busy": self.busy, "passes": self.passes, "totals": self.totals,
+                "queue": self.historian.get_queue().stats()}
+
+    def handle(self, message):
+        cmd = message.get("cmd")
+        if cmd == "status":
+            return self.status()
+        if cmd == "scout":
+            self.scout_requested = True
+        elif cmd == "stop":
+            self.stopping = True
+        elif cmd != "wake":
+            return {"error": f"orden desconocida: {cmd}"}
+        self.wake.set()
+        return {"ok": True}
+
+    def _serve(self):
+        if not hasattr(socket, "AF_UNIX"):
+            print("ℹ️ Sin sockets Unix en este sistema: el worker solo vigila la cola.")
+            return
+        worker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    reply = worker.handle(json.loads(self.rfile.readline() or "{}"))
+                except ValueError:
+                    reply = {"error": "JSON inválido"}
+                self.wfile.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # Socket huérfano de un worker anterior
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="worker-socket", daemon=True).start()
+        print(f"🔌 Escuchando en {self.socket_path}")
+
+    def serve_forever(self):
+        self.warm_up()
+        self._serve()
+        try:
+            while not self.stopping:
+                scout_rounds = 1 if self.scout_requested else 0
+                self.scout_requested = False
+                if scout_rounds or self.has_work():
+                    stats = self.run_pass(scout_rounds)
+                    progress = stats["drafts"] + stats["review"] + stats["published"]
+                    self.idle_passes = 0 if progress else self.idle_passes + 1
+                    if not self.idle_passes:
+                        continue  # Puede haber llegado más trabajo mientras tanto
+                    # Nada avanzó: no repetimos la pasada en bucle (una orden por el socket la adelanta)
+                    print(f"⏳ Pasada sin avances; reintento en {self.backoff()}s.")
+                    self.wake.wait(self.backoff())
+                    self.wake.clear()
+                    continue
+                self.wake.wait(self.poll)
+                self.wake.clear()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self._server:
+                self._server.shutdown()
+                self._server.server_close()
+                if os.path.exists(self.socket_path):
+                    os.remove(self.socket_path)
+            importlib.import_module("publisher").close_pool()
+            print("👋 Worker detenido.")
+
+def send_to_worker(message, socket_path=WORKER_SOCKET):
+    """Envía una orden al worker residente. Devuelve su respuesta o None si no está en marcha."""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(5)
+            s.connect(socket_path)
+            s.sendall((json.dumps(message) + "\n").encode("utf-8"))
+            return json.loads(s.makefile("r", encoding="utf-8").readline())
+    except (OSError, ValueError):
+        return None
+
+def run_command(args):
+    if args.no_cache:
+        importlib.import_module("llm_cache").set_bypass()
+    pipeline = Pipeline(
+        historians=max(1, args.historians),
+        artists=max(1, args.artists),
+        queue_size=max(1, args.queue_size),
+        scout_rounds=args.scout_rounds,
+        max_topics=args.max_topics,
+        threshold=args.threshold,
+        include_existing_drafts=not args.skip_drafts,
+    )
+    pipeline.run()
+    importlib.import_module("llm_cache").print_stats()
+    importlib.import_module("metrics").summary()
+
+def worker_command(args):
+    Worker(
+        historians=max(1, args.historians),
+        artists=max(1, args.artists),
+        queue_size=max(1, args.queue_size),
+        threshold=args.threshold,
+        poll=args.poll,
+    ).serve_forever()
+
+def send_command(args):
+    reply = send_to_worker({"cmd": args.cmd})
+    if reply is None:
+        print("💤 No hay ningún worker escuchando.")
+    else:
+        print(json.dumps(reply, indent=2, ensure_ascii=False))
+
+def queue_length_command(args):
+    # Solo SQLite: nada de Gemini, psycopg2 ni requests
+    from topic_queue import open_queue
+    s = open_queue().stats()
+    print(f"📊 Cola: {s['ready']} listos, {s['leased']} en proceso, {s['done']} hechos, {s['dead']} muertos.")
+
+def schedule_command(args):
+    # Solo Postgres: el calendario de portada no necesita Gemini ni Commons
+    from dotenv import load_dotenv
+    load_dotenv()
+    scheduler.run_schedule(days=max(1, args.days), snapshot=args.snapshot, dry_run=args.dry_run)
+
+def backfill_command(args):
+    from dotenv import load_dotenv
+    load_dotenv()
+    backfill.run_from_args(args)
+
+def add_pipeline_arguments(parser):
+    parser.add_argument("--historians", type=int, default=DEFAULT_HISTORIANS, help="Hilos redactando artículos.")
+    parser.add_argument("--artists", type=int, default=DEFAULT_ARTISTS, help="Hilos editando e ilustrando.")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Capacidad de las colas entre etapas.")
+    parser.add_argument("--threshold", type=float, default=None, help="Confianza mínima para publicar sin revisión.")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Project Chronos: motor de contenido.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Ejecuta scout → historian → artist como un pipeline en streaming.")
+    add_pipeline_arguments(run)
+    run.add_argument("--scout-rounds", type=int, default=0,
+                     help="Rondas del curador a ejecutar cuando la cola de temas se vacíe.")
+    run.add_argument("--max-topics", type=int, default=None, help="Máximo de temas a procesar.")
+    run.add_argument("--skip-drafts", action="store_true", help="No incluir los borradores que ya hay en drafts/.")
+    run.add_argument("--no-cache", action="store_true", help="Ignora la caché de respuestas LLM.")
+    run.set_defaults(func=run_command)
+
+    worker = sub.add_parser("worker", help="Proceso residente que procesa la cola en cuanto hay trabajo.")
+    add_pipeline_arguments(worker)
+    worker.add_argument("--poll", type=float, default=WORKER_POLL_SECONDS, help="Segundos entre revisiones de la cola.")
+    worker.set_defaults(func=worker_command)
+
+    send = sub.add_parser("send", help="Envía una orden al worker residente.")
+    send.add_argument("cmd", choices=["wake", "scout", "status", "stop"])
+    send.set_defaults(func=send_command)
+
+    qlen = sub.add_parser("queue-length", help="Muestra el estado de la cola de temas.")
+    qlen.set_defaults(func=queue_length_command)
+
+    schedule = sub.add_parser("schedule", help="Programa el evento de portada de los próximos días.")
+    scheduler.add_arguments(schedule)
+    schedule.set_defaults(func=schedule_command)
+
+    refill = sub.add_parser("backfill", help="Reprocesa en bloque los eventos ya publicados (reanudable).")
+    backfill.add_arguments(refill)
+    refill.set_defaults(func=backfill_command)
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Cliente de Wikimedia Commons:
+# - Una sesión HTTP con keep-alive (sin handshake TLS por cada petición).
+# - Caché en disco con TTL; al caducar se revalida con ETag / Last-Modified (304 = reutilizar).
+# - Búsqueda filtrada y general en paralelo, e 'imageinfo' de muchos ficheros en una sola llamada.
+# 'requests' se importa al crear el cliente (get_client), no al importar el módulo.
+
+API_URL = "https://commons.wikimedia.org/w/api.php"
+HEADERS = {
+    "User-Agent": "ProjectChronos/1.0 (marcos@example.com)"
+}
+TIMEOUT = 10
+POOL_SIZE = 8
+MAX_TITLES_PER_REQUEST = 50    # Límite de la API para 'titles=' (usuarios no-bot)
+
+CACHE_FILE = os.getenv("CHRONOS_COMMONS_CACHE_FILE", ".commons_cache.db")
+CACHE_TTL = int(os.getenv("CHRONOS_COMMONS_CACHE_TTL", 7 * 24 * 3600))   # 7 días
+
+class CommonsClient:
+    def __init__(self, cache_path=CACHE_FILE, ttl=CACHE_TTL):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.ttl = ttl
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    # --- HTTP + caché ---
+    def _cache_key(self, params):
+        canonical = json.dumps(sorted(params.items()), ensure_ascii=False)
+        return hashlib.sha256(f"{API_URL}?{canonical}".encode("utf-8")).hexdigest()
+
+    def _cache_read(self, key):
+        with self._lock:
+            return self._db.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _cache_write(self, key, body, etag, last_modified):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, body, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, time.time()),
+            )
+            self._db.commit()
+
+    def api_get(self, params):
+        """GET a api.php con caché. Devuelve el JSON de respuesta."""
+        key = self._cache_key(params)
+        cached = self._cache_read(key)
+        if cached and time.time() - cached[3] <= self.ttl:
+            return json.loads(cached[0])
+
+        headers = {}
+        if cached:
+            if cached[1]: headers["If-None-Match"] = cached[1]
+            if cached[2]: headers["If-Modified-Since"] = cached[2]
+
+        r = self.session.get(API_URL, params=params, headers=headers, timeout=TIMEOUT)
+        if r.status_code == 304 and cached:
+            # Sin cambios: renovamos la vigencia de la copia local
+            self._cache_write(key, cached[0], cached[1], cached[2])
+            return json.loads(cached[0])
+
+        r.raise_for_status()
+        data = r.json()
+        # Los errores de la API no se guardan
+        if "error" not in data:
+            self._cache_write(key, r.text, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+        return data
+
+    # --- Búsqueda ---
+    def _search_params(self, srsearch, limit):
+        return {
+            "action": "query",
+            "format": "json",
+            "list": "search",
+            "srsearch": srsearch,
+            "srnamespace": 6, # Espacio de nombres 'File:'
+            "srlimit": limit
+        }
+
+    def search_titles(self, query, limit=5):
+        """Títulos 'File:...' para el término. Lanza las búsquedas filtrada y general a la vez."""
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            strict = pool.submit(self.api_get, self._search_params(f"{query} filetype:bitmap", limit))  # Solo fotos
+            general = pool.submit(self.api_get, self._search_params(query, limit))
+            data = strict.result()
+
+            if "error" in data:
+                raise RuntimeError(f"Error API Commons: {data['error'].get('info')}")
+
+            results = data.get('query', {}).get('search', [])
+            if not results:
+                print("      ⚠️ Filtro estricto sin resultados. Usando búsqueda general...")
+                results = general.result().get('query', {}).get('search', [])
+
+        return [item['title'] for item in results]
+
+    def fetch_imageinfo(self, titles):
+        """imageinfo de muchos ficheros con el mínimo de llamadas. Devuelve {título: página}."""
+        pages = {}
+        unique = list(dict.fromkeys(titles))
+        for i in range(0, len(unique), MAX_TITLES_PER_REQUEST):
+            chunk = unique[i:i + MAX_TITLES_PER_REQUEST]
+            data = self.api_get({
+                "action": "query",
+                "format": "json",
+                "titles": "|".join(chunk),
+                "prop": "imageinfo",
+                "iiprop": "url|user|size|mime|extmetadata"
+            })
+            for page in data.get('query', {}).get('pages', {}).values():
+                pages[page['title']] = page
+        return pages
+
+    def search_candidates(self, query, limit=5):
+        return self.search_candidates_many([query], limit)[query]
+
+    def search_candidates_many(self, queries, limit=5):
+        """Candidatos para varios términos: búsquedas en paralelo y UNA ronda de imageinfo para todos.
+
+        Un término cuya búsqueda falló (red, API) devuelve None en vez de []: no es lo mismo que
+        "sin resultados", y quien llama no debe darlo por una imagen mala.
+        """
+        results = {q: [] for q in queries}
+        titles_by_query = {}
+        with ThreadPoolExecutor(max_workers=min(POOL_SIZE, max(1, len(results)))) as pool:
+            futures = {q: pool.submit(self.search_titles, q, limit) for q in results}
+            for q, future in futures.items():
+                try:
+                    titles_by_query[q] = future.result()
+                except Exception as e:
+                    print(f"      ⚠️ Error conexión: {e}")
+                    results[q] = None
+
+        all_titles = [t for titles in titles_by_query.values() for t in titles]
+        if not all_titles:
+            return results
+        try:
+            pages = self.fetch_imageinfo(all_titles)
+        except Exception as e:
+            print(f"      ⚠️ Error conexión: {e}")
+            return {q: None if titles_by_query.get(q) else r for q, r in results.items()}
+
+        for q, titles in titles_by_query.items():
+            for title in titles:
+                candidate = build_candidate(pages.get(title, {}))
+                if candidate:
+                    results[q].append(candidate)
+        return results
+
+def build_candidate(page):
+    """Convierte una página de imageinfo en un candidato (o None si no sirve)."""
+    if 'imageinfo' not in page:
+        return None
+    info = page['imageinfo'][0]
+    # Filtrar iconos pequeños o banderas irrelevantes si es posible
+    if info.get('url', '').endswith('.svg'):
+        return None
+
+    author = info.get('user', 'Wikimedia Commons')
+    artist = None
+    license_name = None
+    try:
+        meta = info.get('extmetadata', {})
+        if 'Artist' in meta:
+            artist = meta['Artist']['value'].replace('<', ' <').split('<')[0].strip() or None
+            author = artist or author
+        license_name = meta.get('LicenseShortName', {}).get('value')
+    except: pass
+
+    return {
+        "source": "Commons",
+        "title": page['title'].replace("File:", ""),
+        "url": info['url'],
+        "credit": f"Fuente: Commons ({author})",
+        # Metadatos para el modo --auto (image_scoring)
+        "width": info.get('width'),
+        "height": info.get('height'),
+        "mime": info.get('mime'),
+        "license": license_name,
+        "author": artist,
+    }
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CommonsClient()
+        return _client
@@ -0,0 +1,336 @@
+import os
+import json
+import math
+import time
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from quality_gate import ALLOWED_CATEGORIES
+from topic_index import fold
+
+# Estadísticas del corpus para que el scout pida lo que falta y no más misterios antiguos.
+# - Cuentas por categoría, siglo del año y tag, en SQLite (modo WAL), actualizadas de forma incremental:
+#     * eventos publicados: se leen de Postgres solo los nuevos desde la última sincronización;
+#     * temas encolados por el scout: se guardan con la categoría/año/tags que propuso el modelo
+#       y cuentan mientras siguen pendientes en la cola (al publicarse ya cuentan como evento).
+# - plan(): cuotas para el siguiente lote, repartiendo los temas hacia las categorías y épocas
+#   más escasas, y la lista de tags sobrerrepresentados.
+# - rank_candidates(): el scout pide más candidatos de los que necesita y aquí se eligen los
+#   que mejor cubren las cuotas, sin más llamadas al modelo.
+
+STATS_DB = os.getenv("CHRONOS_STATS_DB", ".corpus_stats.db")
+SYNC_INTERVAL = 300           # Segundos entre lecturas de eventos nuevos en Postgres
+OVERGENERATE = 2.0            # Candidatos pedidos por cada tema que necesitamos
+TAG_OVERUSE = 2.0             # Un tag está sobrerrepresentado si pasa de TAG_OVERUSE veces la media
+MAX_AVOID_TAGS = 8
+MAX_REJECTIONS = 20           # Candidatos descartados por duplicado que se recuerdan para el siguiente prompt
+
+# Mismas épocas que el timeline de la web (src/components/history/DailyCard.tsx)
+ERAS = (
+    ("Prehistoria", None, -3000),
+    ("Antigüedad", -3000, 476),
+    ("Edad Media", 476, 1492),
+    ("Edad Moderna", 1492, 1789),
+    ("Contemporánea", 1789, None),
+)
+
+def century(year):
+    """Siglo de un año: 1518 -> 16, -44 -> -1 (a. C.). None si no hay año válido."""
+    try:
+        year = int(str(year).strip())
+    except (TypeError, ValueError):
+        return None
+    if year > 0:
+        return (year - 1) // 100 + 1
+    if year < 0:
+        return -((-year - 1) // 100 + 1)
+    return None
+
+def era_of_century(c):
+    if c is None:
+        return None
+    middle = (c - 1) * 100 + 50 if c > 0 else -((-c - 1) * 100 + 50)
+    for name, start, end in ERAS:
+        if (start is None or middle >= start) and (end is None or middle < end):
+            return name
+    return None
+
+def _roman(n):
+    numerals = ((1000, "M"), (900, "CM"), (500, "D"), (400, "CD"), (100, "C"), (90, "XC"),
+                (50, "L"), (40, "XL"), (10, "X"), (9, "IX"), (5, "V"), (4, "IV"), (1, "I"))
+    out = ""
+    for value, symbol in numerals:
+        while n >= value:
+            out += symbol
+            n -= value
+    return out
+
+def century_label(c):
+    return f"siglo {_roman(abs(c))}" + (" a. C." if c < 0 else "")
+
+def normalize_candidate(raw):
+    """Candidato del modelo -> {"title", "category", "year", "tags"} (o None si no sirve)."""
+    if isinstance(raw, str):
+        raw = {"title": raw}
+    if not isinstance(raw, dict) or not isinstance(raw.get("title"), str) or not raw["title"].strip():
+        return None
+    try:
+        year = int(str(raw.get("year")).strip())
+    except (TypeError, ValueError):
+        year = None
+    tags = raw.get("tags") if isinstance(raw.get("tags"), list) else []
+    return {
+        "title": raw["title"].strip(),
+        "category": raw.get("category") if raw.get("category") in ALLOWED_CATEGORIES else None,
+        "year": year,
+        "tags": [t.strip() for t in tags if isinstance(t, str) and t.strip()],
+    }
+
+def allocate(counts, buckets, n):
+    """Reparte n temas entre buckets para acercar el total a un reparto uniforme (restos mayores)."""
+    if n <= 0 or not buckets:
+        return {}
+    target = (sum(counts.get(b, 0) for b in buckets) + n) / len(buckets)
+    need = {b: max(0.0, target - counts.get(b, 0)) for b in buckets}
+    if not sum(need.values()):
+        need = dict.fromkeys(buckets, 1.0)
+    total_need = sum(need.values())
+    shares = {b: n * need[b] / total_need for b in buckets}
+    quotas = {b: math.floor(s) for b, s in shares.items()}
+    for b in sorted(buckets, key=lambda b: shares[b] - quotas[b], reverse=True)[:n - sum(quotas.values())]:
+        quotas[b] += 1
+    return {b: q for b, q in quotas.items() if q}
+
+def rank_candidates(candidates, plan, n):
+    """Elige hasta n candidatos que mejor cubren las cuotas del plan (en orden de elección)."""
+    categories = dict(plan["categories"])
+    eras = dict(plan["eras"])
+    avoid = {fold(t) for t in plan["avoidTags"]}
+
+    def score(candidate):
+        s = 0.0
+        if categories.get(candidate["category"], 0) > 0:
+            s += 1
+        if eras.get(era_of_century(century(candidate["year"])), 0) > 0:
+            s += 1
+        if candidate["category"] is None:
+            s -= 0.5   # Sin metadatos no sabemos si ayuda a equilibrar
+        if candidate["tags"]:
+            s -= 0.5 * sum(1 for t in candidate["tags"] if fold(t) in avoid) / len(candidate["tags"])
+        return s
+
+    pool = list(candidates)
+    picked = []
+    while pool and len(picked) < n:
+        best = max(pool, key=score)   # A igualdad, el primero (el orden del modelo)
+        pool.remove(best)
+        picked.append(best)
+        if categories.get(best["category"], 0) > 0:
+            categories[best["category"]] -= 1
+        era = era_of_century(century(best["year"]))
+        if eras.get(era, 0) > 0:
+            eras[era] -= 1
+    return picked
+
+class CorpusStats:
+    def __init__(self, path=STATS_DB):
+        self.path = path
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS counts (
+                    dimension TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    n INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (dimension, bucket)
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS seen_events (id TEXT PRIMARY KEY)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS topics (
+                    title TEXT PRIMARY KEY,
+                    category TEXT,
+                    century INTEGER,
+                    tags TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT)")
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación, como en topic_queue
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _get_state(self, conn, name, default=None):
+        row = conn.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, conn, name, value):
+        conn.execute("INSERT INTO state (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                     (name, str(value)))
+
+    # --- Eventos publicados ---
+    def record_events(self, events):
+        """events: [(id, categoría, año, [tags])]. Cada evento cuenta una sola vez. Devuelve los nuevos."""
+        added = 0
+        with self._connect() as conn:
+            for event_id, category, year, tags in events:
+                if conn.execute("INSERT OR IGNORE INTO seen_events (id) VALUES (?)", (event_id,)).rowcount == 0:
+                    continue
+                buckets = [("category", category), ("century", century(year))] + [("tag", t) for t in set(tags or [])]
+                conn.executemany(
+                    "INSERT INTO counts (dimension, bucket, n) VALUES (?, ?, 1)"
+                    " ON CONFLICT(dimension, bucket) DO UPDATE SET n = n + 1",
+                    [(d, str(b)) for d, b in buckets if b not in (None, "")])
+                added += 1
+        return added
+
+    def sync_published(self, force=False):
+        """Lee de Postgres los eventos publicados desde la última sincronización. Devuelve cuántos eran nuevos."""
+        with self._connect() as conn:
+            synced_at = float(self._get_state(conn, "synced_at", 0))
+            cursor = (self._get_state(conn, "events_created", "1970-01-01T00:00:00"), self._get_state(conn, "events_id", ""))
+        if not os.getenv("DATABASE_URL") or (not force and time.time() - synced_at < SYNC_INTERVAL):
+            return 0
+
+        import publisher
+        try:
+            db_pool = publisher.get_pool()
+            conn = db_pool.getconn()
+        except Exception as e:
+            print(f"ℹ️ Sin acceso a la BD ({e}): estadísticas con lo ya sincronizado.")
+            return 0
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT e.id, e.category, e.year, e."createdAt",
+                           COALESCE(array_agg(t.name) FILTER (WHERE t.name IS NOT NULL), '{}')
+                    FROM "Event" e
+                    LEFT JOIN "_EventToTag" et ON et."A" = e.id
+                    LEFT JOIN "Tag" t ON t.id = et."B"
+                    WHERE (e."createdAt", e.id) > (%s::timestamp, %s)
+                    GROUP BY e.id
+                    ORDER BY e."createdAt", e.id
+                """, cursor)
+                rows = cur.fetchall()
+            conn.rollback()
+        finally:
+            db_pool.putconn(conn)
+
+        added = self.record_events([(r[0], r[1], r[2], r[4]) for r in rows])
+        with self._connect() as conn:
+            if rows:
+                self._set_state(conn, "events_created", rows[-1][3].isoformat())
+                self._set_state(conn, "events_id", rows[-1][0])
+            self._set_state(conn, "synced_at", time.time())
+        return added
+
+    def rebuild(self):
+        """Borra lo contado de eventos publicados y lo vuelve a leer entero (tras un backfill, por ejemplo)."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM counts")
+            conn.execute("DELETE FROM seen_events")
+            conn.execute("DELETE FROM state")
+        return self.sync_published(force=True)
+
+    # --- Temas del scout ---
+    def record_topics(self, candidates):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO topics (title, category, century, tags, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(c["title"], c["category"], century(c["year"]), "\n".join(c["tags"]), now) for c in candidates])
+
+    def remember_rejections(self, titles):
+        """Guarda los últimos candidatos descartados por duplicado (el scout los usa en su primer prompt)."""
+        if not titles:
+            return
+        with self._connect() as conn:
+            previous = json.loads(self._get_state(conn, "scout_rejected", "[]"))
+            recent = [t for t in previous if t not in titles] + list(titles)
+            self._set_state(conn, "scout_rejected", json.dumps(recent[-MAX_REJECTIONS:], ensure_ascii=False))
+
+    def recent_rejections(self):
+        with self._connect() as conn:
+            return json.loads(self._get_state(conn, "scout_rejected", "[]"))
+
+    # --- Lectura ---
+    def totals(self, pending_titles=()):
+        """{dimensión: Counter} con lo publicado más los temas aún pendientes en la cola."""
+        totals = {"category": Counter(), "century": Counter(), "tag": Counter()}
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            for dimension, bucket, n in conn.execute("SELECT dimension, bucket, n FROM counts"):
+                totals[dimension][int(bucket) if dimension == "century" else bucket] += n
+            pending = list(pending_titles)
+            for i in range(0, len(pending), 500):
+                chunk = pending[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT category, century, tags FROM topics WHERE title IN ({','.join('?' * len(chunk))})", chunk)
+                for category, c, tags in rows:
+                    if category:
+                        totals["category"][category] += 1
+                    if c is not None:
+                        totals["century"][c] += 1
+                    for tag in filter(None, tags.split("\n")):
+                        totals["tag"][tag] += 1
+        finally:
+            conn.close()
+        return totals
+
+    def plan(self, batch_size, pending_titles=()):
+        """Cuotas por categoría y época para el próximo lote y tags a evitar."""
+        totals = self.totals(pending_titles)
+        eras = Counter()
+        for c, n in totals["century"].items():
+            eras[era_of_century(c)] += n
+        tags = totals["tag"]
+        mean = sum(tags.values()) / len(tags) if tags else 0
+        overused = [t for t, n in tags.most_common(MAX_AVOID_TAGS) if mean and n > TAG_OVERUSE * mean]
+        return {
+            "categories": allocate(totals["category"], ALLOWED_CATEGORIES, batch_size),
+            "eras": allocate(eras, [name for name, _, _ in ERAS], batch_size),
+            "avoidTags": overused,
+            "totals": totals,
+        }
+
+def open_stats(path=STATS_DB):
+    return CorpusStats(path)
+
+def overgenerate(batch_size):
+    return math.ceil(batch_size * OVERGENERATE)
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from topic_queue import open_queue
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Estadísticas del corpus y cuotas del próximo lote del scout.")
+    parser.add_argument("--rebuild", action="store_true", help="Vuelve a contar todos los eventos publicados.")
+    parser.add_argument("--batch", type=int, default=10, help="Tamaño de lote para calcular las cuotas.")
+    args = parser.parse_args()
+
+    stats = open_stats()
+    added = stats.rebuild() if args.rebuild else stats.sync_published(force=True)
+    print(f"🔄 {added} eventos publicados nuevos en las estadísticas.")
+    plan = stats.plan(args.batch, open_queue().pending_topics())
+    totals = plan["totals"]
+    print("📊 Por categoría: " + ", ".join(f"{k} {totals['category'].get(k, 0)}" for k in ALLOWED_CATEGORIES))
+    print("📊 Por siglo: " + ", ".join(f"{century_label(c)} {n}" for c, n in sorted(totals["century"].items())))
+    print("📊 Tags más vistos: " + ", ".join(f"{t} {n}" for t, n in totals["tag"].most_common(10)))
+    print(f"🎯 Cuotas para {args.batch} temas: {plan['categories']} | {plan['eras']}")
+    if plan["avoidTags"]:
+        print(f"🚫 Tags sobrerrepresentados: {', '.join(plan['avoidTags'])}")
@@ -0,0 +1,261 @@
+import time
+import json
+import unicodedata
+import threading
+from collections import deque
+
+# Índice de glosario precalculado al publicar: dónde aparece cada término en 'story' y 'funFact'.
+# - Un autómata Aho-Corasick con todos los términos (los del evento + el diccionario global de
+#   términos ya publicados) recorre cada texto una sola vez.
+# - Sin distinguir mayúsculas ni acentos, como palabra completa, y sin solapes (gana el más largo).
+# - Los offsets apuntan al texto original (con sus acentos) y van en unidades UTF-16, que es
+#   como indexa JavaScript: la web corta el texto en esas posiciones sin buscar nada.
+# Formato guardado en Event.glossaryIndex:
+#   {"terms": [{"term", "definition"}], "story": [[inicio, fin, i_term]], "funFact": [...]}
+# Los términos propios del evento se enlazan siempre; los del diccionario global, solo la primera vez.
+
+FIELDS = ("story", "funFact")
+DICTIONARY_TTL = 600     # Segundos que vale el diccionario global en memoria antes de recargarlo
+BACKFILL_BATCH = 500
+
+_folded_chars = {}
+
+def _fold_char(c):
+    folded = _folded_chars.get(c)
+    if folded is None:
+        decomposed = unicodedata.normalize("NFKD", c)
+        folded = _folded_chars[c] = "".join(x for x in decomposed if not unicodedata.combining(x)).lower()
+    return folded
+
+def fold_key(term):
+    """Clave de un término: sin acentos, minúsculas y espacios normalizados ('  Emú ' -> 'emu')."""
+    return " ".join("".join(_fold_char(c) for c in term).split())
+
+def fold_with_map(text):
+    """Texto plegado y, por cada carácter plegado, el índice del carácter original del que sale."""
+    if text.isascii():
+        return text.lower(), range(len(text))
+    folded = "".join(map(_fold_char, text))
+    if len(folded) == len(text):
+        # Lo normal: cada carácter se pliega en exactamente uno ('é' -> 'e')
+        return folded, range(len(text))
+    # Ligaduras ('ﬁ' -> 'fi') o acentos sueltos que desaparecen: hace falta el mapa completo
+    origin = []
+    for i, c in enumerate(text):
+        origin.extend([i] * len(_fold_char(c)))
+    return folded, origin
+
+def utf16_offsets(text):
+    """offsets[i] = posición UTF-16 del carácter i (con un elemento extra para el final)."""
+    if text.isascii() or max(text) <= "\uffff":
+        return range(len(text) + 1)
+    offsets = [0]
+    for c in text:
+        offsets.append(offsets[-1] + (2 if ord(c) > 0xFFFF else 1))
+    return offsets
+
+class Matcher:
+    """Aho-Corasick sobre claves plegadas. find() devuelve [(inicio, fin, clave)] en el texto plegado."""
+
+    def __init__(self, keys=()):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]    # Clave que termina en este nodo
+        self.link = [0]         # Siguiente nodo (por fallos) que tiene salida
+        self.keys = set()
+        for key in keys:
+            self._add(key)
+        self._build()
+
+    def _add(self, key):
+        if not key or key in self.keys:
+            return
+        self.keys.add(key)
+        node = 0
+        for c in key:
+            nxt = self.goto[node].get(c)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][c] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+                self.link.append(0)
+            node = nxt
+        self.output[node] = key
+
+    def _build(self):
+        pending = deque(self.goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for c, child in self.goto[node].items():
+                f = self.fail[node]
+                while f and c not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(c, 0)
+                self.fail[child] = target if target != child else 0
+                self.link[child] = target if self.output[target] else self.link[target]
+                pending.append(child)
+
+    def find(self, folded):
+        matches = []
+        node = 0
+        for end, c in enumerate(folded, 1):
+            while node and c not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(c, 0)
+            hit = node if self.output[node] else self.link[node]
+            while hit:
+                key = self.output[hit]
+                matches.append((end - len(key), end, key))
+                hit = self.link[hit]
+        return matches
+
+def _whole_word(folded, start, end):
+    return (start == 0 or not folded[start - 1].isalnum()) and (end == len(folded) or not folded[end].isalnum())
+
+def locate(matcher, text):
+    """[(inicio, fin, clave)] en unidades UTF-16 del texto original: palabras completas, sin solapes."""
+    folded, origin = fold_with_map(text)
+    candidates = [m for m in matcher.find(folded) if _whole_word(folded, m[0], m[1])]
+    candidates.sort(key=lambda m: (m[0], m[0] - m[1]))   # Más a la izquierda y, a igualdad, más largo
+    u16 = utf16_offsets(text)
+    located, last_end = [], 0
+    for start, end, key in candidates:
+        if start < last_end:
+            continue
+        located.append((u16[origin[start]], u16[origin[end - 1] + 1], key))
+        last_end = end
+    return located
+
+def build_index(event, matcher, dictionary):
+    """Índice de un evento. dictionary: {clave: (término, definición)} global; el glosario propio manda."""
+    own = {}
+    for entry in event.get('glossary') or []:
+        key = fold_key(entry['term'])
+        if key:
+            own.setdefault(key, (entry['term'], entry['definition']))
+
+    terms, positions, seen_global = [], {}, set()
+    index = {"terms": terms}
+    for field in FIELDS:
+        spans = []
+        for start, end, key in locate(matcher, event.get(field) or ""):
+            if key in own:
+                term = own[key]
+            elif key in dictionary and key not in seen_global:
+                term = dictionary[key]
+                seen_global.add(key)
+            else:
+                continue
+            if key not in positions:
+                positions[key] = len(terms)
+                terms.append({"term": term[0], "definition": term[1]})
+            spans.append([start, end, positions[key]])
+        index[field] = spans
+    return index
+
+def build_indexes(events, dictionary):
+    """Un solo autómata para todo el lote: diccionario global + glosarios de los eventos."""
+    keys = set(dictionary)
+    for event in events:
+        keys.update(fold_key(entry['term']) for entry in event.get('glossary') or [])
+    matcher = Matcher(keys)
+    return [build_index(event, matcher, dictionary) for event in events]
+
+# --- Diccionario global (términos ya publicados) ---
+def load_dictionary(cur):
+    """{clave: (término, definición)} a partir de todos los GlossaryTerm; ante duplicados, el más antiguo."""
+    cur.execute('SELECT term, definition FROM "GlossaryTerm" ORDER BY id')
+    dictionary = {}
+    for term, definition in cur.fetchall():
+        key = fold_key(term)
+        if key:
+            dictionary.setdefault(key, (term, definition))
+    return dictionary
+
+_dictionary = None
+_dictionary_loaded = 0.0
+_dictionary_lock = threading.Lock()
+
+def get_dictionary(cur):
+    """Diccionario global en memoria; se recarga de la BD cada DICTIONARY_TTL segundos."""
+    global _dictionary, _dictionary_loaded
+    with _dictionary_lock:
+        if _dictionary is None or time.time() - _dictionary_loaded > DICTIONARY_TTL:
+            _dictionary = load_dictionary(cur)
+            _dictionary_loaded = time.time()
+        return _dictionary
+
+def remember(events):
+    """Añade al diccionario en memoria los términos recién publicados (sin esperar a la recarga)."""
+    global _dictionary
+    with _dictionary_lock:
+        if _dictionary is None:
+            return
+        # Copia nueva en vez de modificar: otro hilo puede estar recorriendo la anterior
+        updated = dict(_dictionary)
+        for event in events:
+            for entry in event.get('glossary') or []:
+                key = fold_key(entry['term'])
+                if key:
+                    updated.setdefault(key, (entry['term'], entry['definition']))
+        _dictionary = updated
+
+# --- Backfill de los eventos ya publicados ---
+def backfill(batch_size=BACKFILL_BATCH, only_missing=False):
+    import publisher
+    from psycopg2.extras import execute_values
+
+    db_pool = publisher.get_pool()
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            dictionary = load_dictionary(cur)
+            cur.execute('SELECT "eventId", term, definition FROM "GlossaryTerm"')
+            glossaries = {}
+            for event_id, term, definition in cur.fetchall():
+                glossaries.setdefault(event_id, []).append({"term": term, "definition": definition})
+        matcher = Matcher(dictionary)   # El diccionario global ya contiene todos los términos propios
+
+        started = time.time()
+        done = 0
+        # Cursor con nombre (del lado del servidor): no se traen miles de historias a memoria de golpe
+        with conn.cursor(name="glossary_backfill") as reader, conn.cursor() as writer:
+            reader.itersize = batch_size
+            where = 'WHERE "glossaryIndex" IS NULL' if only_missing else ""
+            reader.execute(f'SELECT id, story, "funFact" FROM "Event" {where}')
+            while True:
+                rows = reader.fetchmany(batch_size)
+                if not rows:
+                    break
+                updates = []
+                for event_id, story, fun_fact in rows:
+                    event = {"story": story, "funFact": fun_fact, "glossary": glossaries.get(event_id, [])}
+                    updates.append((event_id, json.dumps(build_index(event, matcher, dictionary), ensure_ascii=False)))
+                execute_values(writer, """
+                    UPDATE "Event" AS e SET "glossaryIndex" = v.idx::jsonb
+                    FROM (VALUES %s) AS v(id, idx) WHERE e.id = v.id
+                """, updates)
+                done += len(updates)
+                print(f"   ... {done} eventos indexados")
+        conn.commit()
+        print(f"✅ Índice de glosario recalculado para {done} eventos en {time.time() - started:.1f}s "
+              f"({len(dictionary)} términos en el diccionario global).")
+        return done
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db_pool.putconn(conn)
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Recalcula Event.glossaryIndex de los eventos publicados.")
+    parser.add_argument("--batch", type=int, default=BACKFILL_BATCH, help="Eventos por UPDATE.")
+    parser.add_argument("--only-missing", action="store_true", help="Solo los eventos que aún no tienen índice.")
+    args = parser.parse_args()
+    backfill(batch_size=max(1, args.batch), only_missing=args.only_missing)
@@ -0,0 +1,243 @@
+import os
+import io
+import json
+import base64
+import atexit
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import metrics
+
+# Derivados de imagen: en vez de enlazar el original de Commons (a menudo varios MB),
+# se descarga una vez y se generan variantes WebP/AVIF a anchos estándar, un placeholder
+# borroso diminuto, el color dominante y un punto focal sugerido para 'imagePosition'.
+# - Pillow es opcional: sin él (o si algo falla) el evento se publica con la URL original, como antes.
+# - Las descargas van en hilos (E/S) y el redimensionado en un pool de procesos (CPU).
+# - Caché por hash de la URL: public/images/events/<hash>/ con un manifest.json. Si ya existe, no se repite nada.
+# - Las variantes se sirven como estáticos de la web (public/), así que se despliegan con ella.
+#   Event.imageUrl sigue siendo el original: hasta ese despliegue, la web carga el de Commons.
+
+OUTPUT_DIR = os.getenv("CHRONOS_IMAGE_DIR", os.path.join("..", "public", "images", "events"))
+PUBLIC_PREFIX = os.getenv("CHRONOS_IMAGE_PREFIX", "/images/events")
+WIDTHS = (480, 960, 1600)
+QUALITY = {"webp": 78, "avif": 55}
+PLACEHOLDER_WIDTH = 16
+FOCAL_SAMPLE = 64               # Lado de la miniatura sobre la que se busca el punto focal
+MAX_DOWNLOAD_BYTES = 40 * 1024 * 1024
+DOWNLOAD_WORKERS = 4
+WORKERS = int(os.getenv("CHRONOS_IMAGE_WORKERS", min(4, os.cpu_count() or 1)))
+TIMEOUT = 30
+MANIFEST = "manifest.json"
+
+def available():
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def url_hash(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:20]
+
+def _manifest_path(url):
+    return os.path.join(OUTPUT_DIR, url_hash(url), MANIFEST)
+
+def cached(url):
+    """Manifest ya generado para esta URL, o None."""
+    try:
+        with open(_manifest_path(url), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# --- Trabajo de CPU (se ejecuta en los procesos del pool) ---
+def _formats():
+    from PIL import features
+    formats = ["webp"]
+    try:
+        if not features.check("avif"):
+            import pillow_avif  # noqa: F401  (plugin para Pillow < 11.3)
+        formats.append("avif")
+    except ImportError:
+        pass
+    return formats
+
+def _to_rgb(img):
+    from PIL import Image, ImageOps
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+def _placeholder(img):
+    small = img.copy()
+    small.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+    buffer = io.BytesIO()
+    small.save(buffer, "WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def _dominant_color(img):
+    small = img.resize((64, 64)).quantize(colors=5)
+    palette = small.getpalette()
+    _, index = max(small.getcolors())
+    r, g, b = palette[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+def _focal_point(img):
+    """Centro de masa de los bordes (donde hay detalle), suavizado hacia el centro. Formato CSS 'x% y%'."""
+    from PIL import ImageFilter
+    w, h = img.size
+    size = (FOCAL_SAMPLE, max(1, round(FOCAL_SAMPLE * h / w))) if w >= h else (max(1, round(FOCAL_SAMPLE * w / h)), FOCAL_SAMPLE)
+    edges = img.convert("L").resize(size).filter(ImageFilter.FIND_EDGES)
+    sw, sh = edges.size
+    pixels = edges.tobytes()
+    total = sx = sy = 0
+    for y in range(1, sh - 1):          # El borde exterior de FIND_EDGES es ruido
+        row = y * sw
+        for x in range(1, sw - 1):
+            v = pixels[row + x]
+            total += v
+            sx += v * x
+            sy += v * y
+    if not total:
+        return "50% 50%"
+    # 70% detalle, 30% centro: evita encuadres extremos por un borde con mucho contraste
+    fx = 0.7 * (sx / total) / max(1, sw - 1) + 0.15
+    fy = 0.7 * (sy / total) / max(1, sh - 1) + 0.15
+    return f"{round(fx * 100)}% {round(fy * 100)}%"
+
+def render(source_path, url):
+    """Genera todas las variantes de un original ya descargado y escribe su manifest. Devuelve el manifest."""
+    from PIL import Image
+    key = url_hash(url)
+    out_dir = os.path.join(OUTPUT_DIR, key)
+    os.makedirs(out_dir, exist_ok=True)
+
+    with Image.open(source_path) as original:
+        img = _to_rgb(original)
+    width, height = img.size
+
+    variants = []
+    formats = _formats()
+    targets = sorted({min(w, width) for w in WIDTHS})   # Nunca se amplía
+    for target in targets:
+        resized = img if target == width else img.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+        for fmt in formats:
+            name = f"{target}.{fmt}"
+            options = {"quality": QUALITY[fmt]}
+            if fmt == "webp":
+                options["method"] = 6
+            resized.save(os.path.join(out_dir, name), fmt.upper(), **options)
+            variants.append({"url": f"{PUBLIC_PREFIX}/{key}/{name}", "width": resized.size[0],
+                             "height": resized.size[1], "format": fmt})
+
+    largest = max((v for v in variants if v["format"] == "webp"), key=lambda v: v["width"])
+    manifest = {
+        "source": url,
+        "width": width,
+        "height": height,
+        "src": largest["url"],
+        "variants": variants,
+        "placeholder": _placeholder(img),
+        "color": _dominant_color(img),
+        "focalPoint": _focal_point(img),
+    }
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))   # El manifest va el último: si existe, el set está completo
+    return manifest
+
+# --- Pool de procesos (uno por proceso, como el resto de singletons) ---
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 'spawn': el pipeline tiene hilos vivos y hacer fork con hilos puede dejar locks tomados
+            _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+atexit.register(shutdown)
+
+def _download(url, folder):
+    """Descarga el original con la sesión keep-alive del cliente de Commons. Devuelve la ruta o None."""
+    import commons_client
+    session = commons_client.get_client().session
+    path = os.path.join(folder, url_hash(url))
+    with session.get(url, stream=True, timeout=TIMEOUT) as r:
+        r.raise_for_status()
+        if int(r.headers.get("Content-Length") or 0) > MAX_DOWNLOAD_BYTES:
+            print(f"⚠️ Original demasiado grande, se enlaza tal cual: {url}")
+            return None
+        size = 0
+        with open(path, "wb") as f:
+            for chunk in r.iter_content(64 * 1024):
+                size += len(chunk)
+                if size > MAX_DOWNLOAD_BYTES:
+                    print(f"⚠️ Original demasiado grande, se enlaza tal cual: {url}")
+                    return None
+                f.write(chunk)
+    return path
+
+_warned = False
+
+@metrics.timed("image_derivatives", items=lambda results: sum(1 for m in results.values() if m))
+def derive_many(urls):
+    """Devuelve {url: manifest o None}. Lo que ya está en caché no se descarga ni se procesa."""
+    global _warned
+    results = {url: cached(url) for url in dict.fromkeys(urls)}
+    todo = [url for url, manifest in results.items() if manifest is None]
+    if not todo:
+        return results
+    if not available():
+        if not _warned:
+            print("ℹ️ Pillow no está instalado: las imágenes se enlazan desde Commons sin derivados.")
+            _warned = True
+        return results
+
+    executor = get_executor()
+    with tempfile.TemporaryDirectory() as folder, ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as downloads:
+        # Cada original pasa al pool de procesos en cuanto termina de bajar
+        renders = {}
+        for url, future in [(url, downloads.submit(_download, url, folder)) for url in todo]:
+            try:
+                path = future.result()
+            except Exception as e:
+                print(f"⚠️ No se pudo descargar '{url}': {e}")
+                continue
+            if path:
+                renders[url] = executor.submit(render, path, url)
+        for url, future in renders.items():
+            try:
+                results[url] = future.result()
+            except Exception as e:
+                print(f"⚠️ No se pudieron generar los derivados de '{url}': {e}")
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Genera los derivados (WebP/AVIF, placeholder, color, foco) de una o varias URLs.")
+    parser.add_argument("urls", nargs="+")
+    args = parser.parse_args()
+    for url, manifest in derive_many(args.urls).items():
+        if manifest:
+            print(f"✅ {url}\n   {manifest['src']}  {manifest['color']}  foco {manifest['focalPoint']}  "
+                  f"({len(manifest['variants'])} variantes)")
+        else:
+            print(f"❌ {url}")
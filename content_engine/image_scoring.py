@@ -0,0 +1,84 @@
+import os
+import re
+from topic_index import similarity
+
+# Puntuación automática de candidatos de Wikimedia Commons (modo --auto del artista).
+# Usa solo los metadatos que ya devuelve 'imageinfo': tamaño, mime, licencia y autor
+# de 'extmetadata', más el parecido del nombre del fichero con el término de búsqueda.
+
+AUTO_THRESHOLD = 0.6   # Por debajo, el borrador va a la lista de revisión manual
+MIN_WIDTH = 400        # Más pequeño que esto no sirve como imagen de cabecera
+IDEAL_WIDTH = 1600
+
+WEIGHTS = {
+    "similarity": 0.35,
+    "resolution": 0.25,
+    "license": 0.20,
+    "mime": 0.10,
+    "author": 0.10,
+}
+
+MIME_SCORES = {
+    "image/jpeg": 1.0,
+    "image/png": 0.8,
+    "image/webp": 0.8,
+    "image/tiff": 0.4,   # Los navegadores no lo muestran: habría que convertirlo
+    "image/gif": 0.3,
+}
+
+def license_score(license_name):
+    name = (license_name or "").lower()
+    if not name:
+        return 0.3
+    if "fair use" in name or "non-free" in name:
+        return 0.0
+    if "public domain" in name or name.startswith("pd") or "cc0" in name:
+        return 1.0
+    if "cc by-sa" in name or "cc-by-sa" in name:
+        return 0.8
+    if "cc by" in name or "cc-by" in name:
+        return 0.9
+    return 0.5
+
+def resolution_score(width, height):
+    if not width or not height or width < MIN_WIDTH:
+        return 0.0
+    score = min(1.0, width / IDEAL_WIDTH)
+    # Las tarjetas son apaisadas: penalizamos los formatos muy verticales
+    if height > width * 1.5:
+        score *= 0.6
+    return score
+
+def file_title_words(title):
+    """'File:Emu_war_1932.jpg' -> 'Emu war 1932'."""
+    name = os.path.splitext(title.replace("File:", ""))[0]
+    return re.sub(r"[_\-]+", " ", name)
+
+def score_candidate(candidate, search_term):
+    """Devuelve (puntuación 0-1, {criterio: puntuación}) de un candidato."""
+    parts = {
+        "similarity": similarity(file_title_words(candidate.get("title", "")), search_term),
+        "resolution": resolution_score(candidate.get("width"), candidate.get("height")),
+        "license": license_score(candidate.get("license")),
+        "mime": MIME_SCORES.get(candidate.get("mime"), 0.0),
+        "author": 1.0 if candidate.get("author") else 0.5,
+    }
+    total = sum(WEIGHTS[k] * v for k, v in parts.items())
+    return round(total, 3), parts
+
+def rank_candidates(candidates, search_term):
+    """Candidatos ordenados de mejor a peor, cada uno con su 'score'."""
+    ranked = []
+    for candidate in candidates:
+        score, parts = score_candidate(candidate, search_term)
+        ranked.append({**candidate, "score": score, "scoreParts": parts})
+    ranked.sort(key=lambda c: c["score"], reverse=True)
+    return ranked
+
+def pick_best(candidates, search_term, threshold=AUTO_THRESHOLD):
+    """Devuelve (mejor candidato o None, confianza, ranking completo)."""
+    ranked = rank_candidates(candidates, search_term)
+    if not ranked:
+        return None, 0.0, ranked
+    best = ranked[0]
+    return (best if best["score"] >= threshold else None), best["score"], ranked
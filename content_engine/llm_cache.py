@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import metrics
+from rate_governor import get_governor, estimate_tokens
+from llm_json import StreamingJSONRepairer, finish_parse
+
+# Caché persistente de respuestas de Gemini compartida por scout, historian y artist.
+# Clave = modelo + hash del prompt. Si el prompt es idéntico, no pagamos otra llamada.
+# google.generativeai se importa y configura en la primera llamada real al modelo:
+# un acierto de caché (o un comando que no llama a Gemini) no paga ese arranque.
+
+CACHE_FILE = os.getenv("CHRONOS_LLM_CACHE_FILE", ".llm_cache.db")
+CACHE_TTL = int(os.getenv("CHRONOS_LLM_CACHE_TTL", 30 * 24 * 3600))   # 30 días
+CACHE_MAX_ENTRIES = int(os.getenv("CHRONOS_LLM_CACHE_MAX", 5000))      # Límite LRU
+# CHRONOS_LLM_CACHE=off desactiva la caché para todos los scripts
+CACHE_BYPASS = os.getenv("CHRONOS_LLM_CACHE", "on").lower() in ("off", "0", "false", "no")
+
+def make_key(model_name, prompt):
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+class LLMCache:
+    """Caché SQLite con TTL y expulsión LRU por número de entradas."""
+
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def get(self, model_name, prompt, ttl=None):
+        key = make_key(model_name, prompt)
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= ttl:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+                metrics.record_cache(True)
+                return row[0]
+            self.misses += 1
+            metrics.record_cache(False)
+            return None
+
+    def put(self, model_name, prompt, response):
+        key = make_key(model_name, prompt)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def contains(self, model_name, prompt):
+        """Comprueba si hay respuesta vigente sin tocar los contadores ni el orden LRU."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at FROM responses WHERE key = ?", (make_key(model_name, prompt),)
+            ).fetchone()
+        return bool(row) and time.time() - row[0] <= self.ttl
+
+    def invalidate(self, model_name, prompt):
+        """Olvida una respuesta (p. ej. si resultó ser JSON inválido)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (make_key(model_name, prompt),))
+            self._conn.commit()
+
+    def _evict(self):
+        # Caducadas primero, luego las menos usadas recientemente si seguimos por encima del límite
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def stats(self):
+        total = self.hits + self.misses
+        ratio = (self.hits / total * 100) if total else 0.0
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": round(ratio, 1)}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+_genai = None
+_models = {}
+_genai_lock = threading.Lock()
+
+def get_model(model_name):
+    """GenerativeModel reutilizable. Importa y configura google.generativeai la primera vez."""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _genai = genai
+        if model_name not in _models:
+            _models[model_name] = _genai.GenerativeModel(model_name)
+        return _models[model_name]
+
+def _call_model(model_name, prompt, on_chunk_factory=None):
+    """Llamada real a Gemini a través del limitador compartido (cuota RPM/TPM y 429).
+
+    Con on_chunk_factory la respuesta se pide en streaming: cada intento crea su propio
+    consumidor (on_chunk_factory() -> función que recibe cada trozo de texto).
+    """
+    model = get_model(model_name)
+    governor = get_governor()
+    estimated = estimate_tokens(prompt) * 2  # Prompt + una respuesta de tamaño parecido
+
+    def request():
+        if on_chunk_factory is None:
+            return model.generate_content(prompt)
+        on_chunk = on_chunk_factory()
+        response = model.generate_content(prompt, stream=True)
+        for chunk in response:
+            on_chunk(chunk.text)
+        return response
+
+    started = time.perf_counter()
+    response = governor.call(request, tokens=estimated)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "total_token_count", None):
+        governor.record_usage(estimated, usage.total_token_count)
+    # Incluye la espera de cuota y los reintentos: es lo que la etapa percibe
+    metrics.record_llm_call(model_name, time.perf_counter() - started,
+                            prompt_tokens=getattr(usage, "prompt_token_count", None),
+                            response_tokens=getattr(usage, "candidates_token_count", None))
+    return response.text
+
+def generate_text(model_name, prompt, bypass=False, ttl=None):
+    """Equivalente a GenerativeModel(model_name).generate_content(prompt).text, pero cacheado."""
+    use_cache = not (bypass or CACHE_BYPASS)
+    if use_cache:
+        cached = get_cache().get(model_name, prompt, ttl=ttl)
+        if cached is not None:
+            return cached
+
+    text = _call_model(model_name, prompt)
+
+    if use_cache:
+        get_cache().put(model_name, prompt, text)
+    return text
+
+def generate_json(model_name, prompt, bypass=False, ttl=None):
+    """Pide JSON en streaming y lo repara mientras llega. Lanza ValueError si no hay JSON utilizable.
+
+    Una respuesta irreparable se borra de la caché para que el reintento vuelva a la API.
+    """
+    use_cache = not (bypass or CACHE_BYPASS)
+    text = get_cache().get(model_name, prompt, ttl=ttl) if use_cache else None
+
+    if text is not None:
+        repairer = StreamingJSONRepairer()
+        repairer.feed(text)
+    else:
+        repairers = []
+
+        def new_repairer():
+            repairers.append(StreamingJSONRepairer())
+            return repairers[-1].feed
+
+        text = _call_model(model_name, prompt, on_chunk_factory=new_repairer)
+        repairer = repairers[-1]
+        if use_cache:
+            get_cache().put(model_name, prompt, text)
+
+    try:
+        return finish_parse(repairer)
+    except ValueError:
+        invalidate(model_name, prompt)
+        raise
+
+def is_cached(model_name, prompt):
+    return not CACHE_BYPASS and get_cache().contains(model_name, prompt)
+
+def store(model_name, prompt, text):
+    """Guarda una respuesta obtenida por otra vía (p. ej. una petición multi-tema)."""
+    if not CACHE_BYPASS:
+        get_cache().put(model_name, prompt, text)
+
+def set_bypass(enabled=True):
+    """Equivalente a CHRONOS_LLM_CACHE=off (usado por el flag --no-cache)."""
+    global CACHE_BYPASS
+    CACHE_BYPASS = enabled
+
+def invalidate(model_name, prompt):
+    if not CACHE_BYPASS:
+        get_cache().invalidate(model_name, prompt)
+
+def print_stats():
+    if _cache is not None:
+        s = _cache.stats()
+        print(f"💾 Caché LLM: {s['hits']} aciertos / {s['misses']} fallos ({s['hit_ratio']}%)")
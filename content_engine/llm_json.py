@@ -0,0 +1,216 @@
+import re
+import json
+
+# Parser tolerante para el JSON que devuelve el modelo.
+# Se alimenta por trozos (streaming) y repara los fallos típicos sin volver a pagar la petición:
+#   - bloques ```json ... ``` y texto antes/después del JSON
+#   - comas finales antes de } o ]
+#   - saltos de línea y tabuladores sin escapar dentro de strings (sobre todo en 'story')
+#   - salida truncada: strings, arrays y objetos sin cerrar
+
+# Esquema de un borrador: campo -> tipos aceptados
+DRAFT_SCHEMA = {
+    "date": (str,),
+    "year": (str, int),
+    "title": (str,),
+    "description": (str,),
+    "category": (str,),
+    "story": (str,),
+    "funFact": (str,),
+    "tags": (list,),
+    "glossary": (list,),
+    "imagePrompt": (str,),
+}
+
+_CLOSERS = {"{": "}", "[": "]"}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_TRAILING_NUMBER = re.compile(r"-?\d[\d.eE+-]*$")
+
+class StreamingJSONRepairer:
+    """Consume la salida del modelo trozo a trozo y devuelve un JSON reparado al final."""
+
+    def __init__(self):
+        self.out = []
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.done = False
+        self.last_safe = None        # (longitud de out, pila) en la última coma fuera de strings
+        self.partial_depth = None    # Tras finish(): profundidad del valor a medio escribir que se cerró
+
+    def feed(self, chunk):
+        for ch in chunk:
+            if self.done:
+                return  # Todo lo que venga tras el JSON (prosa, ```) se ignora
+            if not self.started:
+                # Lo anterior al primer { o [ (```json, prosa) se descarta
+                if ch not in "{[":
+                    continue
+                self.started = True
+            self._consume(ch)
+
+    def _consume(self, ch):
+        out = self.out
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+                out.append(ch)
+            elif ch == "\\":
+                self.escape = True
+                out.append(ch)
+            elif ch == '"':
+                self.in_string = False
+                out.append(ch)
+            else:
+                out.append(_ESCAPES.get(ch, ch))
+            return
+
+        if ch == '"':
+            self.in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            self.stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            self._strip_trailing_comma()
+            if self.stack:
+                out.append(_CLOSERS[self.stack.pop()])
+            if not self.stack:
+                self.done = True
+        elif ch == ",":
+            self.last_safe = (len(out), list(self.stack))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    def _strip_trailing_comma(self):
+        while self.out and self.out[-1].isspace():
+            self.out.pop()
+        if self.out and self.out[-1] == ",":
+            self.out.pop()
+
+    def _close(self, out, stack):
+        text = "".join(out).rstrip()
+        if text.endswith(","):
+            text = text[:-1]
+        return text + "".join(_CLOSERS[c] for c in reversed(stack))
+
+    @property
+    def truncated(self):
+        return self.started and not self.done
+
+    def finish(self):
+        """Devuelve el texto JSON reparado (lanza ValueError si no hay JSON)."""
+        if not self.started:
+            raise ValueError("La respuesta no contiene JSON")
+        if self.done:
+            return "".join(self.out)
+
+        # Truncado: cerramos el string abierto y todas las estructuras pendientes
+        out = list(self.out)
+        tail = "".join(out[-64:]).rstrip()
+        if self.in_string:
+            if self.escape:
+                out.pop()
+            out.append('"')
+            partial = len(self.stack)                  # String a medio escribir
+        elif _TRAILING_NUMBER.search(tail):
+            partial = len(self.stack)                  # Número que quizá seguía ('12' de '125')
+        elif tail[-1:] in ("{", "[") and len(self.stack) > 1:
+            partial = len(self.stack) - 1              # Contenedor recién abierto, vacío
+        else:
+            partial = None                             # Tras una coma, un cierre o un string completo
+        candidate = self._close(out, self.stack)
+        try:
+            json.loads(candidate)
+            self.partial_depth = partial
+            return candidate
+        except ValueError:
+            pass
+
+        # El corte cayó a mitad de una clave o de un literal: volvemos a la última coma segura,
+        # donde todo lo escrito está completo
+        if self.last_safe is None:
+            raise ValueError("JSON truncado sin ningún elemento completo")
+        length, stack = self.last_safe
+        self.partial_depth = None
+        return self._close(self.out[:length], stack)
+
+def _last_child(value):
+    if isinstance(value, dict) and value:
+        return value[next(reversed(value))]
+    if isinstance(value, list) and value:
+        return value[-1]
+    return None
+
+def trim_truncated(value, depth):
+    """Quita el valor a medio escribir de una salida truncada (y solo ese).
+
+    depth: profundidad del contenedor que lo contiene (1 = la raíz). El valor es siempre el
+    último de su contenedor, y ese contenedor el último de su padre.
+    Si ese contenedor es un objeto dentro de un array y queda vacío o con menos claves que su
+    hermano anterior (p. ej. {"term"} sin "definition" en el glosario), se quita el objeto entero.
+    """
+    path = [value]
+    for _ in range(depth - 1):
+        path.append(_last_child(path[-1]))
+    container = path[-1]
+    if isinstance(container, list):
+        if container:
+            container.pop()
+        return value
+    if isinstance(container, dict) and container:
+        container.pop(next(reversed(container)))
+    parent = path[-2] if len(path) > 1 else None
+    if isinstance(parent, list) and parent and parent[-1] is container:
+        sibling = parent[-2] if len(parent) > 1 else None
+        if not container or (isinstance(sibling, dict) and set(sibling) - set(container)):
+            parent.pop()
+    return value
+
+def repair_json(text):
+    repairer = StreamingJSONRepairer()
+    repairer.feed(text)
+    return repairer.finish()
+
+def parse_model_json(text):
+    """json.loads tolerante: primero tal cual (sin fences) y, si falla, reparado.
+
+    Si la salida estaba truncada a mitad de un valor, ese valor se descarta (ver trim_truncated).
+    """
+    stripped = text.strip()
+    if stripped.startswith("```"):
+        stripped = stripped.split("\n", 1)[1] if "\n" in stripped else stripped[3:]
+    if stripped.endswith("```"):
+        stripped = stripped[:-3]
+    try:
+        return json.loads(stripped)
+    except ValueError:
+        return parse_stream([text])
+
+def parse_stream(chunks):
+    """Parsea un iterable de trozos de texto (p. ej. la respuesta en streaming)."""
+    repairer = StreamingJSONRepairer()
+    for chunk in chunks:
+        repairer.feed(chunk)
+    return finish_parse(repairer)
+
+def finish_parse(repairer):
+    data = json.loads(repairer.finish())
+    return trim_truncated(data, repairer.partial_depth) if repairer.partial_depth else data
+
+def validate_draft(data, schema=DRAFT_SCHEMA):
+    """Devuelve la lista de campos que faltan o tienen un tipo incorrecto."""
+    if not isinstance(data, dict):
+        return list(schema)
+    invalid = []
+    for field, types in schema.items():
+        value = data.get(field)
+        if value is None or not isinstance(value, types) or (isinstance(value, (str, list)) and not value):
+            invalid.append(field)
+    glossary = data.get("glossary")
+    if isinstance(glossary, list) and "glossary" not in invalid:
+        if not all(isinstance(g, dict) and g.get("term") and g.get("definition") for g in glossary):
+            invalid.append("glossary")
+    return invalid
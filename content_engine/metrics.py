@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import functools
+import threading
+
+# Métricas del content engine.
+# - Cada llamada a una etapa instrumentada (@timed) deja una línea JSON en metrics/events.jsonl.
+# - Al salir (o con flush()) se escribe metrics/chronos_<script>.prom en formato textfile de
+#   Prometheus (node_exporter --collector.textfile.directory=content_engine/metrics).
+# - summary() resume latencias, ritmo y tokens por evento publicado al final de cada script.
+# CHRONOS_METRICS=off lo desactiva todo.
+
+METRICS_DIR = os.getenv("CHRONOS_METRICS_DIR", "metrics")
+EVENTS_FILE = "events.jsonl"
+ENABLED = os.getenv("CHRONOS_METRICS", "on").lower() not in ("off", "0", "false", "no")
+JOB = os.path.splitext(os.path.basename(sys.argv[0]))[0] if sys.argv and sys.argv[0] else ""
+if not JOB or JOB.startswith("-"):
+    JOB = "chronos"   # python -c / intérprete interactivo
+
+# Cubetas de latencia (segundos): de una consulta a SQLite a un artículo largo de Gemini
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+PUBLISH_STAGE = "save_to_supabase"   # Sus items son los eventos publicados
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # La última es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Aproximación por cubetas (límite superior de la cubeta que contiene el cuantil)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+class Registry:
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}     # (nombre, etiquetas) -> valor
+        self.histograms = {}   # (nombre, etiquetas) -> Histogram
+        self.help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, help=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            if help:
+                self.help.setdefault(name, help)
+
+    def observe(self, name, value, help=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+            if help:
+                self.help.setdefault(name, help)
+
+    def counter(self, name, **labels):
+        """Suma de un contador sobre todas las series que casan con las etiquetas dadas."""
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(v for (n, lbl), v in self.counters.items() if n == name and wanted <= set(lbl))
+
+    def render(self):
+        """Texto en formato de exposición de Prometheus."""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+            help_texts = dict(self.help)
+
+        declared = set()
+
+        def header(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in help_texts:
+                    lines.append(f"# HELP {name} {help_texts[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), h in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(h.buckets, h.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {h.count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(h.sum)}")
+            lines.append(f"{name}_count{_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+def _labels(labels):
+    labels = (("job", JOB),) + tuple(labels)
+    inner = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for k, v in labels)
+    return "{" + inner + "}"
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+registry = Registry()
+_log_lock = threading.Lock()
+
+def log_event(event, **fields):
+    """Añade una línea JSON al log de métricas."""
+    if not ENABLED:
+        return
+    record = {"ts": round(time.time(), 3), "job": JOB, "event": event, **fields}
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _log_lock:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(os.path.join(METRICS_DIR, EVENTS_FILE), "a", encoding="utf-8") as f:
+            f.write(line)
+
+def inc(name, value=1, help=None, **labels):
+    if ENABLED:
+        registry.inc(name, value, help=help, **labels)
+
+def observe(name, value, help=None, **labels):
+    if ENABLED:
+        registry.observe(name, value, help=help, **labels)
+
+def _default_items(result):
+    return 1 if result else 0
+
+def timed(stage, items=_default_items):
+    """Decorador: latencia, resultado (ok / empty / error) e items producidos por la etapa.
+
+    `items(resultado)` dice cuántas unidades de trabajo produjo la llamada
+    (por defecto 1 si devolvió algo y 0 si devolvió None, False o vacío).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                _record_stage(stage, time.perf_counter() - started, "error", 0, error=f"{type(e).__name__}: {e}")
+                raise
+            count = items(result)
+            _record_stage(stage, time.perf_counter() - started, "ok" if count else "empty", count)
+            return result
+        return wrapper
+    return decorator
+
+def _record_stage(stage, seconds, outcome, count, error=None):
+    observe("chronos_stage_seconds", seconds, help="Latencia de cada etapa del pipeline.", stage=stage)
+    inc("chronos_stage_calls_total", help="Llamadas por etapa y resultado.", stage=stage, outcome=outcome)
+    if count:
+        inc("chronos_stage_items_total", count, help="Unidades de trabajo producidas por etapa.", stage=stage)
+    fields = {"stage": stage, "seconds": round(seconds, 4), "outcome": outcome, "items": count}
+    if error:
+        fields["error"] = error[:500]
+    log_event("stage", **fields)
+
+def record_llm_call(model, seconds, prompt_tokens=None, response_tokens=None):
+    """Una petición real a Gemini (los aciertos de caché no pasan por aquí)."""
+    inc("chronos_llm_requests_total", help="Peticiones reales a Gemini.", model=model)
+    observe("chronos_llm_seconds", seconds, help="Latencia de las peticiones a Gemini.", model=model)
+    if prompt_tokens:
+        inc("chronos_llm_tokens_total", prompt_tokens, help="Tokens consumidos en Gemini.", model=model, kind="prompt")
+    if response_tokens:
+        inc("chronos_llm_tokens_total", response_tokens, help="Tokens consumidos en Gemini.", model=model, kind="response")
+    log_event("llm", model=model, seconds=round(seconds, 4),
+              prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+
+def record_cache(hit):
+    inc("chronos_llm_cache_total", help="Consultas a la caché de respuestas LLM.", result="hit" if hit else "miss")
+
+def record_retry(reason, delay):
+    inc("chronos_llm_retries_total", help="Reintentos ante 429 o errores transitorios.", reason=reason)
+    log_event("retry", reason=reason, delay=round(delay, 2))
+
+def record_rate_wait(seconds):
+    inc("chronos_rate_wait_seconds_total", seconds, help="Tiempo bloqueado esperando cuota RPM/TPM.")
+
+def flush():
+    """Escribe el textfile de Prometheus (atómico: node_exporter nunca lee uno a medias)."""
+    if not ENABLED or not (registry.counters or registry.histograms):
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"chronos_{JOB}.prom")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+def summary():
+    """Resumen legible de la ejecución: latencias por etapa, ritmo y coste por evento publicado."""
+    if not ENABLED or not registry.histograms:
+        return
+    elapsed_min = max(time.time() - registry.started, 1e-9) / 60
+    print("⏱️  Métricas por etapa:")
+    with registry._lock:
+        stages = [(dict(lbl)["stage"], h) for (name, lbl), h in sorted(registry.histograms.items())
+                  if name == "chronos_stage_seconds"]
+    for stage, h in stages:
+        produced = registry.counter("chronos_stage_items_total", stage=stage)
+        errors = registry.counter("chronos_stage_calls_total", stage=stage, outcome="error")
+        print(f"   {stage:<28} {h.count:>4} llamadas  p50 {h.quantile(0.5):>6.2f}s  p99 {h.quantile(0.99):>6.2f}s  "
+              f"máx {h.max:>6.2f}s  {produced / elapsed_min:>6.1f} items/min  {errors} errores")
+
+    tokens = registry.counter("chronos_llm_tokens_total")
+    retries = registry.counter("chronos_llm_retries_total")
+    published = registry.counter("chronos_stage_items_total", stage=PUBLISH_STAGE)
+    line = f"   🪙 {tokens} tokens, {retries} reintentos"
+    if published:
+        line += f", {tokens // published} tokens por evento publicado"
+    print(line)
+
+atexit.register(flush)
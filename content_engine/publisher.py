@@ -0,0 +1,193 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+import glossary_index
+
+# Publicación en lote en Supabase (Postgres).
+# Una sola conexión reutilizada y un puñado de viajes a la BD por lote:
+#   1 INSERT multi-fila de Event, 1 de GlossaryTerm, 1 SELECT + 1 INSERT de Tag y 1 de _EventToTag
+#   (más la carga del diccionario global de glosario, una vez cada glossary_index.DICTIONARY_TTL).
+# psycopg2 se importa al abrir el pool, no al importar el módulo.
+# Cada evento lleva un contentHash único: reintentar un lote ya confirmado no duplica nada.
+
+POOL_MIN = 1
+POOL_MAX = int(os.getenv("CHRONOS_DB_POOL_MAX", 4))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from psycopg2 import pool
+            _pool = pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, os.getenv("DATABASE_URL"))
+        return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+def content_hash(event):
+    """Clave de idempotencia: mismo título, fecha, año e historia = mismo evento."""
+    canonical = json.dumps([event['title'].strip(), str(event['date']).strip(), str(event['year']).strip(),
+                            event['story'].strip()], ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def image_columns(img):
+    """imageUrl, imageCredit, imagePosition, imageVariants, imagePlaceholder, imageColor de un image_data.
+
+    imageUrl es siempre el original de Commons: los derivados locales (image_derivatives) solo
+    existen en la web tras el siguiente despliegue, así que van aparte en imageVariants y la web
+    vuelve al original si todavía no están (portada y OpenGraph no dependen de ellos).
+    """
+    derived = img.get('derivatives')
+    if not derived:
+        return img['url'], img['credit'], img.get('position'), None, None, None
+    return (img['url'], img['credit'], img.get('position') or derived['focalPoint'],
+            json.dumps(derived['variants']), derived['placeholder'], derived['color'])
+
+def insert_glossary(cur, event_items):
+    """Inserta el glosario de varios eventos [(id, evento)] en un solo INSERT multi-fila."""
+    from psycopg2.extras import execute_values
+    glossary_rows = [
+        (str(uuid.uuid4()), term['term'], term['definition'], event_id)
+        for event_id, e in event_items
+        for term in e.get('glossary') or []
+    ]
+    if glossary_rows:
+        execute_values(cur, 'INSERT INTO "GlossaryTerm" (id, term, definition, "eventId") VALUES %s', glossary_rows)
+
+def link_tags(cur, event_items):
+    """Enlaza los tags de varios eventos [(id, evento)], creando los que no existan."""
+    from psycopg2.extras import execute_values
+    # Tags: "Tag".name no es único en el esquema, así que resolvemos los existentes en una consulta
+    tag_names = sorted({tag for _, e in event_items for tag in e.get('tags') or []})
+    if not tag_names:
+        return
+    cur.execute('SELECT name, MIN(id) FROM "Tag" WHERE name = ANY(%s) GROUP BY name', (tag_names,))
+    tag_ids = dict(cur.fetchall())
+    new_tags = [(str(uuid.uuid4()), name) for name in tag_names if name not in tag_ids]
+    if new_tags:
+        execute_values(cur, 'INSERT INTO "Tag" (id, name) VALUES %s', new_tags)
+        tag_ids.update({name: tag_id for tag_id, name in new_tags})
+
+    # Tabla de unión implícita de Prisma: A = Event.id, B = Tag.id
+    links = {
+        (event_id, tag_ids[tag])
+        for event_id, e in event_items
+        for tag in e.get('tags') or []
+    }
+    execute_values(cur, 'INSERT INTO "_EventToTag" ("A", "B") VALUES %s ON CONFLICT DO NOTHING', list(links))
+
+def _insert_batch(cur, items):
+    """Inserta los eventos del lote que no existían, con su glosario y tags.
+
+    Devuelve [(id, ya_existía)] en el orden de items: un evento cuyo contentHash ya está en la BD
+    (p. ej. un reintento tras un commit que no llegó a confirmarse en local) no se vuelve a insertar.
+    """
+    from psycopg2.extras import execute_values
+    hashes = [content_hash(e) for e, _ in items]
+
+    # Dentro del propio lote también puede repetirse un evento: solo se inserta la primera vez
+    new_ids = {}
+    unique = []
+    for h, (e, img) in zip(hashes, items):
+        if h not in new_ids:
+            new_ids[h] = str(uuid.uuid4())
+            unique.append((h, e, img))
+
+    # Posiciones de los términos del glosario en story/funFact: un autómata para todo el lote
+    indexes = glossary_index.build_indexes([e for _, e, _ in unique], glossary_index.get_dictionary(cur))
+    rows = [(new_ids[h], h, e['date'], e['year'], e['title'], e['description'], e['category'],
+             *image_columns(img), e['story'], e['funFact'], json.dumps(index, ensure_ascii=False))
+            for (h, e, img), index in zip(unique, indexes)]
+
+    inserted = execute_values(cur, """
+        INSERT INTO "Event" (
+            id, "contentHash", date, year, title, description, category,
+            "imageUrl", "imageCredit", "imagePosition", "imageVariants", "imagePlaceholder", "imageColor",
+            "story", "funFact", "glossaryIndex",
+            "lastShownAt", "createdAt", "updatedAt"
+        ) VALUES %s
+        ON CONFLICT ("contentHash") DO NOTHING
+        RETURNING id
+    """, rows, template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s, %s, %s::jsonb, NULL, NOW(), NOW())",
+        fetch=True)
+    inserted_ids = {row[0] for row in inserted}
+
+    # Los que ya existían: recuperamos su id real
+    existing = [h for h, event_id in new_ids.items() if event_id not in inserted_ids]
+    if existing:
+        cur.execute('SELECT "contentHash", id FROM "Event" WHERE "contentHash" = ANY(%s)', (existing,))
+        new_ids.update(dict(cur.fetchall()))
+
+    # Glosario y tags solo para los eventos insertados ahora (una sola vez aunque se repitan en el lote)
+    fresh = {}
+    for h, (e, _) in zip(hashes, items):
+        if new_ids[h] in inserted_ids and new_ids[h] not in fresh:
+            fresh[new_ids[h]] = e
+    event_items = list(fresh.items())
+
+    insert_glossary(cur, event_items)
+    link_tags(cur, event_items)
+
+    return [(new_ids[h], new_ids[h] not in inserted_ids) for h in hashes]
+
+def _remember_published(items, results):
+    # Solo tras el commit: un lote deshecho no debe dejar sus términos en el diccionario en memoria
+    glossary_index.remember([e for (e, _), r in zip(items, results) if r['ok'] and not r['duplicate']])
+
+def publish_events(items):
+    """
+    Publica una lista de (event, image_data) en una sola transacción.
+    Si el lote falla, se reintenta evento a evento para saber cuál es el problemático.
+    Devuelve una lista de dicts {"title", "ok", "id", "duplicate", "error"} en el mismo orden
+    (duplicate=True: el evento ya estaba publicado y se devuelve su id sin insertar nada).
+    """
+    if not items:
+        return []
+
+    db_pool = get_pool()
+    import psycopg2
+    conn = db_pool.getconn()
+    cur = conn.cursor()
+    try:
+        try:
+            inserted = _insert_batch(cur, items)
+            conn.commit()
+            results = [{"title": e['title'], "ok": True, "id": event_id, "duplicate": duplicate, "error": None}
+                       for (event_id, duplicate), (e, _) in zip(inserted, items)]
+            _remember_published(items, results)
+            return results
+        except Exception as e:
+            conn.rollback()
+            if len(items) == 1:
+                return [{"title": items[0][0].get('title'), "ok": False, "id": None, "duplicate": False, "error": str(e)}]
+            print(f"⚠️ Falló el lote completo ({e}). Reintentando evento a evento...")
+
+        # Plan B: un SAVEPOINT por evento para aislar los que fallan sin perder el resto
+        results = []
+        for item in items:
+            cur.execute("SAVEPOINT publish_event")
+            try:
+                event_id, duplicate = _insert_batch(cur, [item])[0]
+                cur.execute("RELEASE SAVEPOINT publish_event")
+                results.append({"title": item[0]['title'], "ok": True, "id": event_id, "duplicate": duplicate, "error": None})
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT publish_event")
+                results.append({"title": item[0].get('title'), "ok": False, "id": None, "duplicate": False, "error": str(e)})
+        conn.commit()
+        _remember_published(items, results)
+        return results
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        db_pool.putconn(conn)
@@ -0,0 +1,113 @@
+import os
+import re
+import json
+from llm_json import validate_draft, DRAFT_SCHEMA
+from topic_index import fold
+
+# Control de calidad local de los borradores, antes de pagar al editor IA.
+# Lo que se puede arreglar sin modelo (títulos markdown en 'story') se arregla aquí;
+# lo demás se devuelve como lista de problemas (campo, mensaje). Un borrador sin
+# problemas se publica tal cual; uno con problemas va al editor junto con la lista.
+
+ALLOWED_CATEGORIES = ("History", "Science", "Art", "Technology", "Space", "Mystery")
+MAX_DESCRIPTION = 140
+MIN_TAGS = 2
+MAX_TAGS = 5
+
+_HEADING = re.compile(r"^ {0,3}#{1,6}(\s.*)?$")
+_DATE = re.compile(r"^(-?\d{1,4})-(\d{2})-(\d{2})$")
+
+def strip_headings(story):
+    """Quita las líneas de título markdown (# ## ###...) y las líneas en blanco que dejan al principio."""
+    lines = [line for line in story.split("\n") if not _HEADING.match(line)]
+    return "\n".join(lines).strip()
+
+def term_in_text(term, folded_text):
+    """¿Aparece el término en el texto? Sin distinguir mayúsculas ni acentos, y como palabra completa."""
+    folded_term = fold(term).strip()
+    if not folded_term:
+        return False
+    return re.search(rf"(?<!\w){re.escape(folded_term)}(?!\w)", folded_text) is not None
+
+def check_draft(data):
+    """Devuelve (borrador con los arreglos locales, lista de problemas [(campo, mensaje)])."""
+    data = dict(data)
+    issues = [(field, "falta o tiene un tipo incorrecto") for field in validate_draft(data)]
+    broken = {field for field, _ in issues}
+
+    if "story" not in broken:
+        data["story"] = strip_headings(data["story"])
+        if not data["story"]:
+            issues.append(("story", "solo contenía títulos markdown"))
+            broken.add("story")
+
+    if "glossary" not in broken and "story" not in broken:
+        story = fold(data["story"])
+        for entry in data["glossary"]:
+            if not term_in_text(entry["term"], story):
+                issues.append(("glossary", f"el término '{entry['term']}' no aparece en story"))
+
+    if "date" not in broken:
+        match = _DATE.match(data["date"].strip())
+        if not match:
+            issues.append(("date", f"'{data['date']}' no tiene el formato YYYY-MM-DD"))
+        elif "year" not in broken:
+            try:
+                if int(match.group(1)) != int(str(data["year"]).strip()):
+                    issues.append(("year", f"el año {data['year']} no coincide con la fecha {data['date']}"))
+            except ValueError:
+                issues.append(("year", f"'{data['year']}' no es un año"))
+
+    if "description" not in broken and len(data["description"]) > MAX_DESCRIPTION:
+        issues.append(("description", f"tiene {len(data['description'])} caracteres (máximo {MAX_DESCRIPTION})"))
+
+    if "category" not in broken and data["category"] not in ALLOWED_CATEGORIES:
+        issues.append(("category", f"'{data['category']}' no es una de {', '.join(ALLOWED_CATEGORIES)}"))
+
+    if "tags" not in broken and not MIN_TAGS <= len(data["tags"]) <= MAX_TAGS:
+        issues.append(("tags", f"hay {len(data['tags'])} tags (entre {MIN_TAGS} y {MAX_TAGS})"))
+
+    return data, issues
+
+def check_files(paths):
+    """Una pasada sobre varios borradores. Devuelve {ruta: (borrador, problemas)}; los ilegibles se omiten."""
+    results = {}
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                results[path] = check_draft(json.load(f))
+        except Exception as e:
+            print(f"⚠️ No se pudo leer '{path}': {e}")
+    return results
+
+def issue_fields(issues):
+    """Campos que el editor necesita ver para arreglar los problemas (sin repetir, en orden de esquema)."""
+    wanted = {field for field, _ in issues}
+    return [field for field in DRAFT_SCHEMA if field in wanted]
+
+def format_issues(issues):
+    return "\n".join(f"- {field}: {message}" for field, message in issues)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Revisa los borradores de drafts/ sin llamar al modelo.")
+    parser.add_argument("--dir", default="drafts", help="Carpeta de borradores.")
+    parser.add_argument("--fix", action="store_true", help="Guarda los arreglos locales (títulos markdown quitados).")
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.dir, n) for n in os.listdir(args.dir) if n.endswith(".json")) \
+        if os.path.isdir(args.dir) else []
+    results = check_files(paths)
+    passed = 0
+    for path, (data, issues) in results.items():
+        if issues:
+            print(f"❌ {path}")
+            for field, message in issues:
+                print(f"   - {field}: {message}")
+        else:
+            passed += 1
+        if args.fix:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"📊 {passed}/{len(results)} borradores pasan el control sin editor.")
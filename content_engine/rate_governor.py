@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import random
+import sqlite3
+import threading
+import metrics
+
+# Limitador de ritmo compartido para todas las llamadas a Gemini.
+# Token bucket doble (peticiones/minuto y tokens/minuto) cuyo estado vive en un
+# fichero SQLite, así scout, historian y artist se reparten la misma cuota aunque
+# corran en procesos distintos. Un 429 bloquea a todos hasta que pase el Retry-After.
+
+STATE_FILE = os.getenv("CHRONOS_RATE_FILE", ".rate_governor.db")
+RPM_LIMIT = float(os.getenv("CHRONOS_GEMINI_RPM", 15))
+TPM_LIMIT = float(os.getenv("CHRONOS_GEMINI_TPM", 250000))
+SAFETY_MARGIN = 0.9          # Nos quedamos un poco por debajo de la cuota real
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 2.0           # Segundos
+BACKOFF_CAP = 60.0
+
+def estimate_tokens(text):
+    # Aproximación habitual: ~4 caracteres por token
+    return max(1, len(text) // 4)
+
+TRANSIENT_STATUS = (500, 503, 504)
+_STATUS_IN_TEXT = re.compile(r"\b(429|500|503|504)\b")
+
+def error_status(error):
+    """Código HTTP del error: atributo (google.api_core: code, requests: response.status_code) o, si no
+    hay, un 429/5xx suelto en el mensaje (con límites de palabra: '1500 tokens' no es un 500)."""
+    for code in (getattr(error, "code", None), getattr(error, "status_code", None),
+                 getattr(getattr(error, "response", None), "status_code", None)):
+        # google.api_core también usa 'code' para enums de gRPC: solo vale un entero
+        if isinstance(code, int) and not isinstance(code, bool):
+            return code
+    match = _STATUS_IN_TEXT.search(str(error))
+    return int(match.group(1)) if match else None
+
+def is_rate_limit_error(error):
+    return type(error).__name__ == "ResourceExhausted" or error_status(error) == 429
+
+def is_transient_error(error):
+    name = type(error).__name__
+    return name in ("ServiceUnavailable", "InternalServerError", "DeadlineExceeded") or \
+        error_status(error) in TRANSIENT_STATUS
+
+def parse_retry_after(error):
+    """Extrae el tiempo de espera sugerido por la API (Retry-After / retry_delay), si lo hay."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("Retry-After"):
+        try:
+            return float(headers["Retry-After"])
+        except ValueError:
+            pass
+    text = str(error)
+    match = re.search(r"retry in ([\d.]+)\s*s", text, re.IGNORECASE) or \
+        re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", text)
+    return float(match.group(1)) if match else None
+
+def backoff_delay(attempt):
+    """Backoff exponencial con 'full jitter'."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+class RateGovernor:
+    def __init__(self, path=STATE_FILE, rpm=RPM_LIMIT, tpm=TPM_LIMIT):
+        # Ruta absoluta: cada conexión abre el fichero de nuevo y el proceso puede cambiar de directorio
+        self.path = os.path.abspath(path)
+        self.rpm = rpm * SAFETY_MARGIN
+        self.tpm = tpm * SAFETY_MARGIN
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS bucket (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                requests REAL NOT NULL,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                blocked_until REAL NOT NULL
+            )
+        """)
+        conn.execute("INSERT OR IGNORE INTO bucket VALUES (1, ?, ?, ?, 0)", (self.rpm, self.tpm, time.time()))
+        conn.commit()
+        conn.close()
+
+    def _transaction(self, update):
+        """Ejecuta update(estado, ahora) con el fichero bloqueado; update modifica el estado y devuelve el resultado."""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            requests, tokens, updated_at, blocked_until = conn.execute(
+                "SELECT requests, tokens, updated_at, blocked_until FROM bucket WHERE id = 1"
+            ).fetchone()
+            now = time.time()
+            elapsed = max(0.0, now - updated_at)
+            state = {
+                "requests": min(self.rpm, requests + elapsed * self.rpm / 60),
+                "tokens": min(self.tpm, tokens + elapsed * self.tpm / 60),
+                "blocked_until": blocked_until,
+            }
+            result = update(state, now)
+            conn.execute(
+                "UPDATE bucket SET requests = ?, tokens = ?, updated_at = ?, blocked_until = ? WHERE id = 1",
+                (state["requests"], state["tokens"], now, state["blocked_until"]),
+            )
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self, tokens=1):
+        """Bloquea hasta que haya cuota para una petición de `tokens` tokens."""
+        tokens = min(tokens, self.tpm)
+
+        def take(state, now):
+            waits = [state["blocked_until"] - now]
+            if state["requests"] < 1:
+                waits.append((1 - state["requests"]) * 60 / self.rpm)
+            if state["tokens"] < tokens:
+                waits.append((tokens - state["tokens"]) * 60 / self.tpm)
+            wait = max(waits)
+            if wait <= 0:
+                state["requests"] -= 1
+                state["tokens"] -= tokens
+            return wait
+
+        while True:
+            wait = self._transaction(take)
+            if wait <= 0:
+                return
+            # Un poco de jitter para que varios procesos no despierten a la vez
+            wait += random.uniform(0, 0.25)
+            metrics.record_rate_wait(wait)
+            time.sleep(wait)
+
+    def record_usage(self, estimated, actual):
+        """Corrige el cubo de tokens con el consumo real que devolvió la API."""
+        def adjust(state, now):
+            state["tokens"] -= actual - estimated
+        self._transaction(adjust)
+
+    def block_for(self, seconds):
+        """Tras un 429, nadie vuelve a llamar hasta que pasen `seconds` segundos."""
+        def block(state, now):
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+            state["requests"] = 0
+        self._transaction(block)
+
+    def call(self, fn, tokens=1, max_retries=MAX_RETRIES):
+        """Ejecuta fn() respetando la cuota, con reintentos ante 429 y errores transitorios."""
+        for attempt in range(max_retries + 1):
+            self.acquire(tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == max_retries or not (is_rate_limit_error(e) or is_transient_error(e)):
+                    raise
+                delay = backoff_delay(attempt)
+                if is_rate_limit_error(e):
+                    delay = max(delay, parse_retry_after(e) or 0)
+                    self.block_for(delay)
+                metrics.record_retry("rate_limit" if is_rate_limit_error(e) else "transient", delay)
+                print(f"⏸️  Gemini ocupado ({type(e).__name__}). Reintento {attempt + 1}/{max_retries} en {delay:.1f}s...")
+                time.sleep(delay)
+
+_governor = None
+_governor_lock = threading.Lock()
+
+def get_governor():
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = RateGovernor()
+        return _governor
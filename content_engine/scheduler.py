@@ -0,0 +1,190 @@
+import os
+import json
+import argparse
+from collections import Counter, deque
+from datetime import date, datetime, timedelta
+import publisher
+
+# Calendario de rotación diaria: qué evento sale en portada cada día.
+# Se calcula aquí, fuera de la petición web, y se guarda en la tabla "DailySchedule" (día -> evento);
+# la portada solo hace una búsqueda por clave primaria. Orden de preferencia:
+#   1. Eventos nunca mostrados (los más antiguos primero).
+#   2. Reciclaje: el que lleve más tiempo sin mostrarse (lastShownAt más antiguo).
+# Entre los BALANCE_WINDOW primeros candidatos del mismo grupo (un inédito nunca cede su turno a uno
+# reciclado) se elige la categoría menos vista en los últimos BALANCE_DAYS días, para no encadenar
+# tres días de Historia seguidos.
+# Los días son fechas locales del servidor: el scheduler y la web deben compartir zona horaria.
+
+DEFAULT_DAYS = 30
+BALANCE_WINDOW = 10
+BALANCE_DAYS = 7
+
+def day_key(d):
+    return d.strftime("%Y-%m-%d")
+
+def priority_order(events, exclude):
+    """Nuevos por antigüedad y después reciclados por lastShownAt más antiguo."""
+    fresh = [e for e in events if e['lastShownAt'] is None and e['id'] not in exclude]
+    recycled = [e for e in events if e['lastShownAt'] is not None and e['id'] not in exclude]
+    fresh.sort(key=lambda e: (e['createdAt'], e['id']))
+    recycled.sort(key=lambda e: (e['lastShownAt'], e['id']))
+    return fresh + recycled
+
+def plan_schedule(events, start, days, existing):
+    """Asigna un evento a cada día sin asignar de [start, start + days). Devuelve {día: evento}.
+
+    events: dicts con id, category, lastShownAt y createdAt.
+    existing: {día: id} ya programados (incluidos los BALANCE_DAYS anteriores a start, para el equilibrio).
+    Los días ya programados no se tocan: lo que se decidió para hoy no cambia al recalcular.
+    """
+    by_id = {e['id']: e for e in events}
+    horizon = [day_key(start + timedelta(days=i)) for i in range(days)]
+    taken = {existing[d] for d in horizon if d in existing}
+    pool = deque(priority_order(events, taken))
+
+    recent = deque(maxlen=BALANCE_DAYS)
+    for d in sorted(existing):
+        if d < horizon[0] and existing[d] in by_id:
+            recent.append(by_id[existing[d]]['category'])
+
+    plan = {}
+    used_order = []   # Para reciclar dentro del propio horizonte si hay menos eventos que días
+    for d in horizon:
+        if d in existing:
+            if existing[d] in by_id:
+                recent.append(by_id[existing[d]]['category'])
+                used_order.append(by_id[existing[d]])
+            continue
+        if not pool:
+            if not used_order:
+                break  # No hay ningún evento
+            pool.extend(used_order)
+            used_order = []
+
+        counts = Counter(recent)
+        fresh = pool[0]['lastShownAt'] is None
+        window = []
+        for candidate in pool:
+            if len(window) == BALANCE_WINDOW or (candidate['lastShownAt'] is None) != fresh:
+                break
+            window.append(candidate)
+        choice = min(range(len(window)), key=lambda i: (counts[window[i]['category']], i))
+        event = window[choice]
+        del pool[choice]
+
+        plan[d] = event
+        recent.append(event['category'])
+        used_order.append(event)
+    return plan
+
+# --- Base de datos ---
+def load_state(cur, start):
+    cur.execute('SELECT id, category, "lastShownAt", "createdAt" FROM "Event"')
+    events = [{"id": r[0], "category": r[1], "lastShownAt": r[2], "createdAt": r[3]} for r in cur.fetchall()]
+    cur.execute('SELECT day, "eventId" FROM "DailySchedule" WHERE day >= %s',
+                (day_key(start - timedelta(days=BALANCE_DAYS)),))
+    return events, dict(cur.fetchall())
+
+def save_plan(cur, plan):
+    """Guarda el plan. Devuelve {día: eventId} de los días que se insertaron de verdad."""
+    from psycopg2.extras import execute_values
+    rows = [(d, e['id']) for d, e in sorted(plan.items())]
+    if not rows:
+        return {}
+    # ON CONFLICT: si otro proceso programó ese día mientras tanto, gana el primero
+    saved = dict(execute_values(cur, """
+        INSERT INTO "DailySchedule" (day, "eventId", "createdAt") VALUES %s
+        ON CONFLICT (day) DO NOTHING
+        RETURNING day, "eventId"
+    """, rows, template="(%s, %s, NOW())", fetch=True))
+    if not saved:
+        return saved
+    # lastShownAt = el último día en que sale de los que sí quedaron programados (un id por fila:
+    # con menos eventos que días uno puede salir dos veces): así el siguiente cálculo recicla bien
+    last_day = {}
+    for day, event_id in saved.items():
+        last_day[event_id] = max(day, last_day.get(event_id, day))
+    execute_values(cur, """
+        UPDATE "Event" AS e SET "lastShownAt" = v.day::date, "updatedAt" = NOW()
+        FROM (VALUES %s) AS v(day, id)
+        WHERE e.id = v.id AND (e."lastShownAt" IS NULL OR e."lastShownAt" < v.day::date)
+    """, [(day, event_id) for event_id, day in last_day.items()])
+    return saved
+
+def load_snapshot_events(cur, event_ids):
+    """Eventos completos (con tags y glosario) en el formato que consume la web."""
+    cur.execute("""
+        SELECT id, date, year, title, description, category, "imageUrl", "imageCredit",
+               "imagePosition", "imageVariants", "imagePlaceholder", "imageColor", story, "funFact", "glossaryIndex"
+        FROM "Event" WHERE id = ANY(%s)
+    """, (event_ids,))
+    columns = [c[0] for c in cur.description]
+    events = {row[0]: dict(zip(columns, row)) | {"tags": [], "glossary": []} for row in cur.fetchall()}
+    cur.execute('SELECT et."A", t.name FROM "_EventToTag" et JOIN "Tag" t ON t.id = et."B" WHERE et."A" = ANY(%s)',
+                (event_ids,))
+    for event_id, name in cur.fetchall():
+        events[event_id]["tags"].append(name)
+    cur.execute('SELECT "eventId", term, definition FROM "GlossaryTerm" WHERE "eventId" = ANY(%s)', (event_ids,))
+    for event_id, term, definition in cur.fetchall():
+        events[event_id]["glossary"].append({"term": term, "definition": definition})
+    return events
+
+def write_snapshot(path, schedule, events):
+    snapshot = {
+        "generatedAt": datetime.now().isoformat(timespec="seconds"),
+        "days": {d: events[event_id] for d, event_id in sorted(schedule.items()) if event_id in events},
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def run_schedule(days=DEFAULT_DAYS, start=None, snapshot=None, dry_run=False):
+    start = start or date.today()
+    db_pool = publisher.get_pool()
+    conn = db_pool.getconn()
+    cur = conn.cursor()
+    try:
+        events, existing = load_state(cur, start)
+        plan = plan_schedule(events, start, days, existing)
+        new_count = sum(1 for e in plan.values() if e['lastShownAt'] is None)
+        print(f"📅 {len(plan)} días nuevos programados ({new_count} eventos inéditos), "
+              f"{sum(1 for d in existing if d >= day_key(start))} ya estaban.")
+        for d, e in sorted(plan.items()):
+            print(f"   {d}  [{e['category']}]  {e['id']}")
+
+        if dry_run:
+            conn.rollback()
+            return plan
+        saved = save_plan(cur, plan)
+        conn.commit()
+        if len(saved) < len(plan):
+            print(f"ℹ️ {len(plan) - len(saved)} días ya los había programado otro proceso: se respeta su elección.")
+
+        if snapshot:
+            # Lo que quedó en la BD (incluidos los días que ganó otro proceso), no lo que calculamos
+            cur.execute('SELECT day, "eventId" FROM "DailySchedule" WHERE day >= %s', (day_key(start),))
+            schedule = dict(cur.fetchall())
+            write_snapshot(snapshot, schedule, load_snapshot_events(cur, sorted(set(schedule.values()))))
+            conn.rollback()  # Solo lectura
+            print(f"💾 Instantánea escrita en '{snapshot}'.")
+        return plan
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        db_pool.putconn(conn)
+
+def add_arguments(parser):
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="Días a programar desde hoy.")
+    parser.add_argument("--snapshot", default=None, help="Escribe también el calendario completo en este JSON.")
+    parser.add_argument("--dry-run", action="store_true", help="Muestra el plan sin guardarlo.")
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Programa el evento de portada de los próximos días.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    run_schedule(days=max(1, args.days), snapshot=args.snapshot, dry_run=args.dry_run)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Los scripts del content engine se importan por nombre desde content_engine/
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ENGINE_DIR not in sys.path:
+    sys.path.insert(0, ENGINE_DIR)
@@ -0,0 +1,60 @@
+import os
+import json
+import gzip
+import pytest
+import archive_store
+import publisher
+from archive_store import ArchiveStore
+
+def make_draft(title, story="Historia completa."):
+    return {"title": title, "date": "1932-11-02", "year": 1932, "story": story, "funFact": "Dato."}
+
+@pytest.fixture
+def store(tmp_path):
+    return ArchiveStore(str(tmp_path / "archive"))
+
+def test_append_and_lookup_by_hash(store):
+    emu = make_draft("La Guerra del Emú")
+    first = store.append(emu, source="emu.json")
+    store.append(make_draft("El Año sin Verano"))
+    record = store.get_by_hash(publisher.content_hash(emu))
+    assert record["id"] == first
+    assert record["data"] == emu
+    assert record["source"] == "emu.json"
+    assert store.get_by_hash("0" * 64) is None
+    assert store.count() == 2
+
+def test_find_title_ignores_case_and_accents(store):
+    store.append(make_draft("La Guerra del Emú"))
+    assert [r["title"] for r in store.find_title("la guerra del emu")] == ["La Guerra del Emú"]
+
+def test_archive_file_stores_published_data(store, tmp_path):
+    # Se archiva lo que se publicó (tras el editor), no el borrador original
+    path = tmp_path / "draft.json"
+    path.write_text(json.dumps(make_draft("La Guerra del Emú", "Borrador.")), encoding="utf-8")
+    published = make_draft("La Guerra del Emú", "Versión editada.")
+    record_id = store.archive_file(str(path), published)
+    assert not path.exists()
+    assert store.get(record_id)["data"] == published
+    assert store.get_by_hash(publisher.content_hash(published))["id"] == record_id
+
+def test_segments_rotate_and_stay_readable(store, monkeypatch):
+    monkeypatch.setattr(archive_store, "SEGMENT_MAX_BYTES", 200)
+    drafts = [make_draft(f"Tema {i}", "x" * 100) for i in range(5)]
+    store.append_many([(d, None, None) for d in drafts])
+    assert len(os.listdir(store.segments_dir)) > 1
+    assert [r["data"] for r in store] == drafts
+    # Cada segmento sigue siendo un gzip válido de principio a fin
+    first = sorted(os.listdir(store.segments_dir))[0]
+    with gzip.open(os.path.join(store.segments_dir, first), "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline()) == drafts[0]
+
+def test_legacy_files_are_imported_once(tmp_path):
+    root = tmp_path / "archive"
+    root.mkdir()
+    (root / "20260118_153012_Emu.json").write_text(json.dumps(make_draft("La Guerra del Emú")), encoding="utf-8")
+    store = archive_store.open_store(str(root))
+    assert store.count() == 1
+    assert not (root / "20260118_153012_Emu.json").exists()
+    assert store.import_legacy_archive() == 0
+    assert archive_store.open_store(str(root)).count() == 1
@@ -0,0 +1,40 @@
+import pytest
+from llm_json import parse_model_json, parse_stream, trim_truncated, validate_draft
+
+def test_complete_json_with_fences():
+    assert parse_model_json('```json\n{"title": "Emú", "year": 1932}\n```') == {"title": "Emú", "year": 1932}
+
+def test_truncated_string_is_dropped():
+    assert parse_model_json('{"title": "La Guerra del Emú", "story": "En 1932 el ejérc') == {"title": "La Guerra del Emú"}
+
+def test_truncated_number_is_dropped():
+    assert parse_model_json('{"title": "Emú", "year": 19') == {"title": "Emú"}
+
+def test_complete_values_survive_truncation():
+    assert parse_model_json('{"title": "Emú", "tags": ["Australia", "Aves"], ') == {"title": "Emú", "tags": ["Australia", "Aves"]}
+
+def test_partial_glossary_entry_is_dropped():
+    text = '{"glossary": [{"term": "Lewis", "definition": "Ametralladora"}, {"term": "Emú", "definition": "Ave no vol'
+    assert parse_model_json(text) == {"glossary": [{"term": "Lewis", "definition": "Ametralladora"}]}
+
+def test_partial_batch_article_keeps_complete_fields():
+    # En un lote, el último artículo conserva lo que sí llegó entero (se completa aparte)
+    text = '[{"title": "A", "story": "a"}, {"title": "B", "story": "b", "funFact": "b'
+    assert parse_model_json(text) == [{"title": "A", "story": "a"}, {"title": "B", "story": "b"}]
+
+def test_stream_chunks_match_whole_text():
+    text = '{"title": "Emú", "tags": ["Australia", "Av'
+    assert parse_stream([text[:7], text[7:20], text[20:]]) == parse_model_json(text) == {"title": "Emú", "tags": ["Australia"]}
+
+def test_no_json_raises():
+    with pytest.raises(ValueError):
+        parse_model_json("Lo siento, no puedo ayudar con eso.")
+
+def test_trim_truncated_removes_only_last_value():
+    assert trim_truncated({"a": 1, "b": {"c": 2, "d": "x"}}, 2) == {"a": 1, "b": {"c": 2}}
+    assert trim_truncated([1, 2, 3], 1) == [1, 2]
+    assert trim_truncated([{"term": "a", "definition": "b"}, {"term": "c"}], 2) == [{"term": "a", "definition": "b"}]
+
+def test_validate_draft_reports_missing_and_bad_glossary():
+    invalid = validate_draft({"title": "Emú", "glossary": [{"term": "Lewis"}]})
+    assert "glossary" in invalid and "story" in invalid and "title" not in invalid
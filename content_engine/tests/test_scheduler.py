@@ -0,0 +1,45 @@
+from datetime import date, datetime
+import scheduler
+from scheduler import plan_schedule
+
+START = date(2026, 3, 1)
+
+def event(event_id, category="History", created=1, shown=None):
+    return {"id": event_id, "category": category, "createdAt": datetime(2026, 1, created),
+            "lastShownAt": datetime(2026, 2, shown) if shown else None}
+
+def ids(plan):
+    return [plan[d]["id"] for d in sorted(plan)]
+
+def test_fresh_events_first_then_least_recently_shown():
+    events = [event("old-shown", shown=20), event("new-2", created=2), event("older-shown", shown=5),
+              event("new-1", created=1)]
+    assert ids(plan_schedule(events, START, 4, {})) == ["new-1", "new-2", "older-shown", "old-shown"]
+
+def test_existing_days_are_kept():
+    events = [event("a", created=1), event("b", created=2), event("c", created=3)]
+    plan = plan_schedule(events, START, 3, {"2026-03-01": "c"})
+    assert "2026-03-01" not in plan
+    assert ids(plan) == ["a", "b"]
+
+def test_categories_are_balanced_within_the_window():
+    events = [event("h1", "History", 1), event("h2", "History", 2), event("s1", "Science", 3)]
+    assert ids(plan_schedule(events, START, 3, {})) == ["h1", "s1", "h2"]
+
+def test_recent_days_before_start_count_for_balance():
+    events = [event("h1", "History", 1), event("s1", "Science", 2)]
+    plan = plan_schedule(events, START, 1, {"2026-02-28": "h1"})
+    assert ids(plan) == ["s1"]
+
+def test_fresh_never_yields_to_recycled():
+    # Aunque ayer ya fue Historia, un inédito va antes que un reciclado de otra categoría
+    events = [event("shown-h", "History", shown=1), event("fresh-h", "History", 2), event("shown-s", "Science", shown=2)]
+    plan = plan_schedule(events, START, 1, {"2026-02-28": "shown-h"})
+    assert ids(plan) == ["fresh-h"]
+
+def test_fewer_events_than_days_recycles_the_horizon():
+    events = [event("a", "History", 1), event("b", "Science", 2)]
+    assert ids(plan_schedule(events, START, 5, {})) == ["a", "b", "a", "b", "a"]
+
+def test_no_events():
+    assert plan_schedule([], START, scheduler.DEFAULT_DAYS, {}) == {}
@@ -0,0 +1,39 @@
+import pytest
+import topic_queue
+from topic_queue import TopicQueue
+
+@pytest.fixture
+def queue(tmp_path):
+    return TopicQueue(str(tmp_path / "queue.db"))
+
+def test_lease_hides_topic_until_it_expires(queue):
+    queue.enqueue(["La Guerra del Emú"])
+    [(topic_id, topic, attempts)] = queue.lease()
+    assert (topic, attempts) == ("La Guerra del Emú", 1)
+    assert queue.lease() == []
+    assert queue.available() == 0
+    assert queue.count() == 1      # Sigue pendiente: alquilado, no terminado
+
+def test_expired_lease_is_leased_again(queue):
+    queue.enqueue(["La Guerra del Emú"])
+    [(topic_id, _, _)] = queue.lease(lease_seconds=-1)   # El worker murió sin ack ni nack
+    assert queue.available() == 1
+    assert queue.lease() == [(topic_id, "La Guerra del Emú", 2)]
+
+def test_expired_lease_goes_dead_after_max_attempts(queue):
+    queue.enqueue(["La Guerra del Emú"])
+    for _ in range(topic_queue.MAX_ATTEMPTS):
+        assert queue.lease(lease_seconds=-1)
+    assert queue.lease() == []
+    assert queue.available() == 0
+    [(_, topic, attempts, error)] = queue.dead_topics()
+    assert (topic, attempts, error) == ("La Guerra del Emú", topic_queue.MAX_ATTEMPTS, "lease expired")
+
+def test_ack_and_nack(queue):
+    queue.enqueue(["A", "B"])
+    (a, _, _), (b, _, _) = queue.lease(2)
+    queue.ack(a)
+    queue.nack(b, "timeout")
+    assert queue.stats()["done"] == 1
+    assert queue.pending_topics() == ["B"]
+    assert queue.lease() == [(b, "B", 2)]
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+# Cola de temas en SQLite (modo WAL) que sustituye a queue.json.
+# - Encolar y reservar son O(1) gracias al índice (status, available_at).
+# - Reservar un tema lo "alquila" durante LEASE_SECONDS: si el worker muere, vuelve a la cola solo.
+# - Cada reserva cuenta como intento; tras MAX_ATTEMPTS fallos el tema pasa a 'dead'.
+
+QUEUE_DB = os.getenv("CHRONOS_QUEUE_DB", "queue.db")
+LEGACY_QUEUE_FILE = "queue.json"
+LEASE_SECONDS = 15 * 60
+MAX_ATTEMPTS = 3
+
+# Estados posibles de un tema
+READY, LEASED, DONE, DEAD = "ready", "leased", "done", "dead"
+
+class TopicQueue:
+    def __init__(self, path=QUEUE_DB):
+        self.path = path
+        # WAL: lectores y escritores de distintos procesos no se bloquean entre sí (persistente en el fichero)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS topics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    topic TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'ready',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS topics_status_available ON topics(status, available_at, id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación: así la cola es segura entre hilos y entre procesos
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def enqueue(self, topics):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO topics (topic, status, available_at, created_at, updated_at) VALUES (?, 'ready', ?, ?, ?)",
+                [(t, now, now, now) for t in topics],
+            )
+        return len(topics)
+
+    def lease(self, n=1, lease_seconds=LEASE_SECONDS):
+        """Reserva hasta n temas. Devuelve [(id, topic, attempts)]."""
+        now = time.time()
+        leased = []
+        with self._connect() as conn:
+            # Alquileres caducados: el worker murió sin confirmar ni fallar
+            conn.execute(
+                "UPDATE topics SET status = 'dead', last_error = 'lease expired', updated_at = ? "
+                "WHERE status = 'leased' AND available_at <= ? AND attempts >= ?",
+                (now, now, MAX_ATTEMPTS),
+            )
+            rows = conn.execute(
+                "SELECT id, topic, attempts FROM topics "
+                "WHERE status IN ('ready', 'leased') AND available_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (now, n),
+            ).fetchall()
+            for topic_id, topic, attempts in rows:
+                conn.execute(
+                    "UPDATE topics SET status = 'leased', attempts = attempts + 1, available_at = ?, updated_at = ? WHERE id = ?",
+                    (now + lease_seconds, now, topic_id),
+                )
+                leased.append((topic_id, topic, attempts + 1))
+        return leased
+
+    def ack(self, topic_id):
+        """El tema se procesó con éxito."""
+        with self._connect() as conn:
+            conn.execute("UPDATE topics SET status = 'done', updated_at = ? WHERE id = ?", (time.time(), topic_id))
+
+    def nack(self, topic_id, error=None):
+        """El tema falló: vuelve a la cola o pasa a 'dead' si agotó los intentos."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE topics SET status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'ready' END, "
+                "available_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (MAX_ATTEMPTS, now, error, now, topic_id),
+            )
+
+    def count(self):
+        """Temas pendientes (listos o alquilados)."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM topics WHERE status IN ('ready', 'leased')").fetchone()[0]
+
+    def available(self):
+        """Temas que lease() entregaría ahora: listos y alquileres caducados (worker muerto)."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM topics WHERE status IN ('ready', 'leased') AND available_at <= ?",
+                (time.time(),),
+            ).fetchone()[0]
+
+    def stats(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM topics GROUP BY status").fetchall()
+        return {status: 0 for status in (READY, LEASED, DONE, DEAD)} | dict(rows)
+
+    def pending_topics(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT topic FROM topics WHERE status IN ('ready', 'leased') ORDER BY id").fetchall()
+        return [r[0] for r in rows]
+
+    def dead_topics(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT id, topic, attempts, last_error FROM topics WHERE status = 'dead' ORDER BY id").fetchall()
+
+    def retry_dead(self):
+        """Devuelve a la cola los temas muertos (reiniciando sus intentos)."""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE topics SET status = 'ready', attempts = 0, available_at = ?, updated_at = ? WHERE status = 'dead'",
+                (now, now),
+            )
+            return cur.rowcount
+
+    def import_legacy_queue(self, path=LEGACY_QUEUE_FILE):
+        """Importación única de queue.json. El fichero se renombra para no importarlo dos veces.
+
+        Lectura, inserción y una marca en 'meta' van en la misma transacción (BEGIN IMMEDIATE):
+        si varios procesos abren la cola a la vez, solo uno importa; los demás ven la marca.
+        """
+        if not os.path.exists(path):
+            return 0
+        imported = 0
+        with self._connect() as conn:
+            try:
+                stat = os.stat(path)
+                marker = f"legacy_queue:{os.path.abspath(path)}:{stat.st_mtime_ns}"
+                if conn.execute("SELECT 1 FROM meta WHERE name = ?", (marker,)).fetchone() is None:
+                    with open(path, "r", encoding="utf-8") as f:
+                        try:
+                            data = json.load(f)
+                        except ValueError:
+                            data = []
+                    topics = [t for t in data if isinstance(t, str)] if isinstance(data, list) else []
+                    now = time.time()
+                    conn.executemany(
+                        "INSERT INTO topics (topic, status, available_at, created_at, updated_at) VALUES (?, 'ready', ?, ?, ?)",
+                        [(t, now, now, now) for t in topics],
+                    )
+                    conn.execute("INSERT INTO meta (name, value) VALUES (?, ?)", (marker, str(len(topics))))
+                    imported = len(topics)
+            except FileNotFoundError:
+                return 0   # Otro proceso lo importó y renombró mientras esperábamos
+        # Renombrar después del COMMIT: si el proceso muere antes, la marca evita importarlo otra vez
+        try:
+            os.replace(path, path + ".imported")
+        except FileNotFoundError:
+            pass
+        if imported:
+            print(f"📦 Importados {imported} temas desde '{path}' a '{self.path}'.")
+        return imported
+
+def open_queue(path=QUEUE_DB):
+    """Abre la cola e importa queue.json si todavía existe."""
+    queue = TopicQueue(path)
+    queue.import_legacy_queue()
+    return queue
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspecciona la cola de temas.")
+    parser.add_argument("--dead", action="store_true", help="Lista los temas que agotaron sus intentos.")
+    parser.add_argument("--retry-dead", action="store_true", help="Devuelve los temas muertos a la cola.")
+    args = parser.parse_args()
+
+    q = open_queue()
+    if args.retry_dead:
+        print(f"🔁 {q.retry_dead()} temas devueltos a la cola.")
+    if args.dead:
+        for topic_id, topic, attempts, error in q.dead_topics():
+            print(f"   ☠️  [{topic_id}] {topic} ({attempts} intentos): {error}")
+    s = q.stats()
+    print(f"📊 Cola: {s['ready']} listos, {s['leased']} en proceso, {s['done']} hechos, {s['dead']} muertos.")
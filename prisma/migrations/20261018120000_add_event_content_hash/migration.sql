@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "Event" ADD COLUMN     "contentHash" TEXT;
+
+-- CreateIndex
+CREATE UNIQUE INDEX "Event_contentHash_key" ON "Event"("contentHash");
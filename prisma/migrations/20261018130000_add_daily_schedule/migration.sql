@@ -0,0 +1,14 @@
+-- CreateTable
+CREATE TABLE "DailySchedule" (
+    "day" TEXT NOT NULL,
+    "eventId" TEXT NOT NULL,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "DailySchedule_pkey" PRIMARY KEY ("day")
+);
+
+-- CreateIndex
+CREATE INDEX "DailySchedule_eventId_idx" ON "DailySchedule"("eventId");
+
+-- AddForeignKey
+ALTER TABLE "DailySchedule" ADD CONSTRAINT "DailySchedule_eventId_fkey" FOREIGN KEY ("eventId") REFERENCES "Event"("id") ON DELETE CASCADE ON UPDATE CASCADE;
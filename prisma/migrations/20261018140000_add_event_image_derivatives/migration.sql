@@ -0,0 +1,4 @@
+-- AlterTable
+ALTER TABLE "Event" ADD COLUMN     "imageColor" TEXT,
+ADD COLUMN     "imagePlaceholder" TEXT,
+ADD COLUMN     "imageVariants" JSONB;
@@ -10,14 +10,33 @@ import { cache } from "react"; // IMPORTANTE: Para optimizar la petición intern
 // - Pasada la hora, el primer usuario activará una regeneración silenciosa para ver si ya es "mañana".
 export const revalidate = 3600; 
 
+// Día local en formato YYYY-MM-DD: la clave de "DailySchedule" (misma zona horaria que content_engine/scheduler.py)
+function todayKey(): string {
+  const now = new Date();
+  const month = String(now.getMonth() + 1).padStart(2, "0");
+  const day = String(now.getDate()).padStart(2, "0");
+  return `${now.getFullYear()}-${month}-${day}`;
+}
+
 // Envolvemos la lógica en 'cache' para que generateMetadata y Home no hagan 2 consultas separadas en la misma visita
 const getDailyEvent = cache(async (): Promise<HistoryEvent | null> => {
+  // 1. El calendario ya está calculado por el content engine: una sola búsqueda por clave primaria
+  const scheduled = await prisma.dailySchedule.findUnique({
+    where: { day: todayKey() },
+    include: { event: { include: { tags: true, glossary: true } } },
+  });
+
+  if (scheduled) {
+    return mapEventData(scheduled.event);
+  }
+
+  // 2. Sin calendario para hoy (el scheduler no se ha ejecutado): elección al vuelo como antes
   const now = new Date();
   
   const startOfDay = new Date(now.setHours(0, 0, 0, 0));
   const endOfDay = new Date(now.setHours(23, 59, 59, 999));
 
-  // 1. ¿Ya tenemos un evento seleccionado para hoy?
+  // 2a. ¿Ya tenemos un evento seleccionado para hoy?
   const eventToday = await prisma.event.findFirst({
     where: {
       lastShownAt: {
@@ -32,7 +51,7 @@ const getDailyEvent = cache(async (): Promise<HistoryEvent | null> => {
     return mapEventData(eventToday);
   }
 
-  // 2. Si no, buscamos uno NUEVO
+  // 2b. Si no, buscamos uno NUEVO
   let nextEvent = await prisma.event.findFirst({
     where: {
       lastShownAt: null, 
@@ -40,7 +59,7 @@ const getDailyEvent = cache(async (): Promise<HistoryEvent | null> => {
     include: { tags: true, glossary: true },
   });
 
-  // 3. Si no hay nuevos, RECICLAMOS el más antiguo
+  // 2c. Si no hay nuevos, RECICLAMOS el más antiguo
   if (!nextEvent) {
     nextEvent = await prisma.event.findFirst({
       orderBy: {
@@ -52,7 +71,7 @@ const getDailyEvent = cache(async (): Promise<HistoryEvent | null> => {
 
   if (!nextEvent) return null;
 
-  // 4. Marcamos el evento elegido
+  // 2d. Marcamos el evento elegido
   await prisma.event.update({
     where: { id: nextEvent.id },
     data: { lastShownAt: new Date() },
@@ -3,7 +3,7 @@
 import { useState, useEffect } from "react";
 import Image from "next/image";
 import ReactMarkdown from "react-markdown";
-import { HistoryEvent, GlossaryTerm } from "@/types";
+import { HistoryEvent, GlossaryTerm, GlossaryIndex, GlossarySpan } from "@/types";
 import { Lightbulb, Maximize2, X } from "lucide-react";
 import { GlossaryWord } from "./GlossaryWord";
 import ShareButton from "@/components/common/ShareButton";
@@ -33,6 +33,31 @@ function parseYear(dateStr: string): number {
   return year;
 }
 
+// Si el content engine generó derivados locales, next/image elige entre ellos (loader) en vez de
+// pedir el original de Commons, y pinta el placeholder borroso mientras carga.
+// imageUrl sigue siendo el original: si los derivados aún no están desplegados, se vuelve a él.
+function derivedImageProps(event: HistoryEvent) {
+  const webp = (event.imageVariants ?? [])
+    .filter((v) => v.format === "webp")
+    .sort((a, b) => a.width - b.width);
+  if (webp.length === 0) return {};
+
+  return {
+    loader: ({ width }: { src: string; width: number }) =>
+      (webp.find((v) => v.width >= width) ?? webp[webp.length - 1]).url,
+    ...(event.imagePlaceholder
+      ? { placeholder: "blur" as const, blurDataURL: event.imagePlaceholder }
+      : {}),
+  };
+}
+
+function useDerivedImage(event: HistoryEvent) {
+  const [failed, setFailed] = useState(false);
+  const props = derivedImageProps(event);
+  if (failed || !("loader" in props)) return {};
+  return { ...props, onError: () => setFailed(true) };
+}
+
 // --- SUBCOMPONENTE TIMELINE ---
 function Timeline({ dateStr }: { dateStr: string }) {
   const year = parseYear(dateStr);
@@ -90,6 +115,7 @@ function Timeline({ dateStr }: { dateStr: string }) {
 // --- SUBCOMPONENTE MODAL ---
 function ExpandedModal({ event, onClose }: { event: HistoryEvent; onClose: (e: React.MouseEvent) => void }) {
   const [isVisible, setIsVisible] = useState(false);
+  const imageProps = useDerivedImage(event);
 
   useEffect(() => {
     const timer = requestAnimationFrame(() => setIsVisible(true));
@@ -125,6 +151,7 @@ function ExpandedModal({ event, onClose }: { event: HistoryEvent; onClose: (e: R
             className="object-contain"
             priority
             quality={100}
+            {...imageProps}
           />
         </div>
 
@@ -177,6 +204,36 @@ const createGlossaryHelpers = (glossary?: GlossaryTerm[]) => {
   return { findGlossaryTerm, TextWithGlossary };
 };
 
+// --- GLOSARIO PRECALCULADO (glossaryIndex) ---
+// Con el índice del content engine no se busca nada en el navegador: se corta el texto en las
+// posiciones guardadas (unidades UTF-16, igual que String.slice).
+const GLOSSARY_HREF = "#glosario-";
+
+// Story (markdown): cada término pasa a ser un enlace que el renderer 'a' convierte en GlossaryWord
+const linkGlossaryTerms = (markdown: string, spans: GlossarySpan[]): string => {
+  let result = "";
+  let last = 0;
+  for (const [start, end, i] of spans) {
+    const text = markdown.slice(start, end).replace(/[[\]]/g, "\\$&");
+    result += markdown.slice(last, start) + `[${text}](${GLOSSARY_HREF}${i})`;
+    last = end;
+  }
+  return result + markdown.slice(last);
+};
+
+// Fun Fact (texto plano): trozos de texto y GlossaryWord directamente
+const TextWithIndexedGlossary = ({ text, spans, terms }: { text: string; spans: GlossarySpan[]; terms: GlossaryTerm[] }) => {
+  const parts: React.ReactNode[] = [];
+  let last = 0;
+  spans.forEach(([start, end, i], idx) => {
+    parts.push(text.slice(last, start));
+    parts.push(<GlossaryWord key={idx} term={terms[i].term} definition={terms[i].definition} />);
+    last = end;
+  });
+  parts.push(text.slice(last));
+  return <>{parts}</>;
+};
+
 // --- UTILIDAD PARA ELIMINAR HEADINGS MARKDOWN ---
 const removeMarkdownHeadings = (markdown: string): string => {
   // Elimina líneas que sean h1, h2, h3, h4, h5, h6 (^#+\s)
@@ -188,9 +245,24 @@ const removeMarkdownHeadings = (markdown: string): string => {
 };
 
 // --- COMPONENTE RENDERER PERSONALIZADO PARA REACTMARKDOWN ---
-const createMarkdownComponents = (glossary?: GlossaryTerm[]) => {
+const createMarkdownComponents = (glossary?: GlossaryTerm[], glossaryIndex?: GlossaryIndex | null) => {
   const { findGlossaryTerm, TextWithGlossary } = createGlossaryHelpers(glossary);
 
+  // Con índice precalculado los términos ya vienen como enlaces: nada de escanear párrafos
+  if (glossaryIndex) {
+    return {
+      a: ({ href, children }: any) => {
+        const term = href?.startsWith(GLOSSARY_HREF)
+          ? glossaryIndex.terms[Number(href.slice(GLOSSARY_HREF.length))]
+          : undefined;
+        if (term) {
+          return <GlossaryWord term={term.term} definition={term.definition} />;
+        }
+        return <a href={href}>{children}</a>;
+      },
+    };
+  }
+
   return {
     // A) INTERCEPTOR DE NEGRITAS - Si es un término del glosario, renderiza GlossaryWord
     strong: ({ children }: any) => {
@@ -229,6 +301,7 @@ const createMarkdownComponents = (glossary?: GlossaryTerm[]) => {
 export default function DailyCard({ event }: { event: HistoryEvent }) {
   const [isExpanded, setIsExpanded] = useState(false);
   const [isVisible, setIsVisible] = useState(false);
+  const imageProps = useDerivedImage(event);
   
   // NUEVO: Estado para el tamaño de fuente (sincronizado con localStorage)
   const [fontSizeLevel, setFontSizeLevel] = useState(2); 
@@ -292,7 +365,10 @@ export default function DailyCard({ event }: { event: HistoryEvent }) {
           className="relative w-full h-96 md:h-[500px] overflow-hidden rounded-t-2xl cursor-pointer" 
           onClick={handleOpen}
         >
-          <div className="absolute inset-0 transition-transform duration-700 group-hover:scale-105">
+          <div
+            className="absolute inset-0 transition-transform duration-700 group-hover:scale-105"
+            style={event.imageColor ? { backgroundColor: event.imageColor } : undefined}
+          >
             <Image
               src={event.imageUrl}
               alt={event.title}
@@ -300,6 +376,8 @@ export default function DailyCard({ event }: { event: HistoryEvent }) {
               className="object-cover grayscale transition-all duration-500 ease-in-out group-hover:grayscale-0"
               style={{ objectPosition: event.imagePosition || "center" }}
               priority
+              sizes="(max-width: 768px) 100vw, 672px"
+              {...imageProps}
             />
             {/* Gradiente para mejorar legibilidad en transición */}
             <div className="absolute inset-0 bg-gradient-to-t from-black/60 via-transparent to-transparent" />
@@ -338,7 +416,9 @@ export default function DailyCard({ event }: { event: HistoryEvent }) {
               <Lightbulb size={18} /> ¿Sabías que...?
             </span>
             {/* Renderizado con glosario en Fun Fact */}
-            {createGlossaryHelpers(event.glossary).TextWithGlossary({ text: event.funFact })}
+            {event.glossaryIndex
+              ? <TextWithIndexedGlossary text={event.funFact} spans={event.glossaryIndex.funFact} terms={event.glossaryIndex.terms} />
+              : createGlossaryHelpers(event.glossary).TextWithGlossary({ text: event.funFact })}
           </div>
           
           {/* APLICADO: Clase dinámica para el tamaño de fuente */}
@@ -348,8 +428,10 @@ export default function DailyCard({ event }: { event: HistoryEvent }) {
             prose-strong:text-amber-600 dark:prose-strong:text-amber-500 prose-strong:font-bold
             prose-a:text-amber-600 hover:prose-a:text-amber-700 transition-all
             transition-all duration-300`}>
-            <ReactMarkdown components={createMarkdownComponents(event.glossary)}>
-              {removeMarkdownHeadings(event.story)}
+            <ReactMarkdown components={createMarkdownComponents(event.glossary, event.glossaryIndex)}>
+              {removeMarkdownHeadings(
+                event.glossaryIndex ? linkGlossaryTerms(event.story, event.glossaryIndex.story) : event.story
+              )}
             </ReactMarkdown>
           </article>
           
@@ -5,6 +5,22 @@ export interface GlossaryTerm {
   definition: string; // La explicación que saldrá en el popup
 }
 
+// Posiciones precalculadas por el content engine: [inicio, fin, índice en terms] en unidades UTF-16
+export type GlossarySpan = [number, number, number];
+
+export interface GlossaryIndex {
+  terms: GlossaryTerm[];
+  story: GlossarySpan[];
+  funFact: GlossarySpan[];
+}
+
+export interface ImageVariant {
+  url: string;
+  width: number;
+  height: number;
+  format: "webp" | "avif";
+}
+
 export interface HistoryEvent {
   id: string;
   date: string;
@@ -15,6 +31,10 @@ export interface HistoryEvent {
   imageUrl: string;
   imageCredit: string;
   imagePosition?: string;
+  // Derivados locales de la imagen (si el content engine los generó)
+  imageVariants?: ImageVariant[] | null;
+  imagePlaceholder?: string | null;
+  imageColor?: string | null;
 
   story: string;
   funFact: string;
@@ -23,4 +43,5 @@ export interface HistoryEvent {
   
   // Nuevo campo opcional para el glosario
   glossary?: GlossaryTerm[];
+  glossaryIndex?: GlossaryIndex | null;
 }
\ No newline at end of file